@@ -1,14 +1,191 @@
 import sys
 import time
+import queue
 import shutil
+import logging
 import PyQt6
 from PyQt6 import uic
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThread, pyqtSignal
 from PyQt6.QtGui import QPixmap, QImage, QIcon
 from PyQt6.QtWidgets import QApplication, QMainWindow, QFileDialog
-from telebot.apihelper import ApiTelegramException
-from bot import bot, main_schedule_parse
-from db.models import *
+from dotenv import load_dotenv
+# logs.py и модули, импортируемые фоновыми потоками, читают настройки из переменных окружения при импорте
+load_dotenv()
+from logs import setup_logging
+
+
+# как часто фоновые потоки панели проверяют очередь запросов и обновляют прогресс рассылок, секунды
+PROGRESS_INTERVAL = 1.0
+# рассылки панели выполняет обработчик очереди бота, сама панель их не отправляет
+BOT_REQUIRED = 'Рассылки отправляются, только пока запущен bot.py или async_bot.py'
+
+
+class ScheduleWorker(QThread):
+    """
+    Фоновый поток загрузки расписания админ-панели.
+
+    Поток по очереди загружает наборы файлов, выбранные в панели: каждый zip архив функцией archive_schedule_parse,
+    один файл .xlsx функцией main_schedule_parse, а несколько файлов - функцией batch_schedule_parse. Перед каждой
+    загрузкой поток отправляет сигнал progress с номером загрузки и их количеством в наборе, а после набора -
+    сигнал uploaded с отчётом и количеством файлов. Модуль ingestion вместе с django и openpyxl импортируется
+    при первой загрузке, а не при открытии панели.
+    """
+    progress = pyqtSignal(int, int)
+    uploaded = pyqtSignal(str, int)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.uploads = queue.Queue()
+
+    def add(self, file_paths: list) -> None:
+        """
+        Функция постановки набора файлов в очередь загрузки.
+
+        Аргументы:
+            file_paths (list): Пути выбранных файлов .xlsx и zip архивов.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.uploads.put(file_paths)
+
+    def upload(self, file_paths: list) -> str:
+        """
+        Функция загрузки одного набора файлов.
+
+        Аргументы:
+            file_paths (list): Пути выбранных файлов .xlsx и zip архивов.
+
+        Возвращает:
+            str: Отчёт о загрузке.
+        """
+        from ingestion import archive_schedule_parse, batch_schedule_parse, main_schedule_parse
+        archives = [file_path for file_path in file_paths if file_path.endswith('.zip')]
+        files = [file_path for file_path in file_paths if not file_path.endswith('.zip')]
+        steps, messages = len(archives) + bool(files), []
+        for step, file_path in enumerate(archives, 1):
+            self.progress.emit(step, steps)
+            with open(file_path, 'rb') as archive:
+                messages.append(archive_schedule_parse(archive.read()))
+        if files:
+            self.progress.emit(steps, steps)
+            file_names = [file_path.split('/')[-1] for file_path in files]
+            for file_path, file_name in zip(files, file_names):
+                shutil.copy(file_path, f'./uploads/{file_name}')
+            if len(file_names) == 1:
+                messages.append(main_schedule_parse(file_names[0]))
+            else:
+                messages.append(batch_schedule_parse(file_names))
+        return ' | '.join(messages).replace('\n', ' | ')
+
+    def run(self) -> None:
+        """
+        Функция потока, загружающая наборы файлов из очереди, пока панель не закрыта.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        while not self.isInterruptionRequested():
+            try:
+                file_paths = self.uploads.get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                continue
+            try:
+                from django.db import close_old_connections
+                close_old_connections()
+                report = self.upload(file_paths)
+            except Exception as ex:
+                logging.error(ex)
+                report = f'Ошибка при загрузке расписания: {ex}'
+            self.uploaded.emit(report, len(file_paths))
+
+
+class JobsWorker(QThread):
+    """
+    Фоновый поток рассылок админ-панели.
+
+    Поток ставит в очередь и отменяет рассылки по запросам панели и раз в PROGRESS_INTERVAL секунд читает прогресс
+    незавершённых и отменённых рассылок панели. Сами рассылки выполняет обработчик очереди запущенного бота (jobs.py):
+    второй обработчик в панели мог бы перехватить рассылку бота и оборвать её при закрытии окна.
+    Созданная рассылка передаётся сигналом submitted, прогресс - сигналом progress со словарём
+    {идентификатор: состояние, см. jobs_status}, а ошибки - сигналом failed.
+    """
+    submitted = pyqtSignal(int)
+    progress = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests = queue.Queue()
+        self.job_ids = []
+
+    def submit(self, recievers: str, text: str, photo: bytes) -> None:
+        """
+        Функция постановки рассылки в очередь из потока панели.
+
+        Аргументы:
+            recievers (str): Получатели рассылки: 'all' или цифра класса.
+            text (str): Текст сообщения или подпись к изображению.
+            photo (bytes): Изображение рассылки или None.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.requests.put(('submit', (recievers, text, photo)))
+
+    def cancel(self, job_id: int) -> None:
+        """
+        Функция отмены рассылки из потока панели.
+
+        Аргументы:
+            job_id (int): Идентификатор задания рассылки.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.requests.put(('cancel', (job_id,)))
+
+    def run(self) -> None:
+        """
+        Функция потока, выполняющая запросы панели и обновляющая прогресс рассылок, пока панель не закрыта.
+
+        Django и очередь рассылок импортируются в этом потоке после показа окна, поэтому их импорт
+        не задерживает открытие панели.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        try:
+            from django.db import close_old_connections
+            from jobs import JOB_STATUSES, cancel_job, jobs_status, submit_job
+        except Exception as ex:
+            logging.error(ex)
+            self.failed.emit(f'Очередь рассылок недоступна: {ex}')
+            return
+        while not self.isInterruptionRequested():
+            try:
+                action, args = self.requests.get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                action = None
+            close_old_connections()
+            try:
+                if action == 'submit':
+                    job = submit_job(*args)
+                    self.job_ids.append(job.id)
+                    self.submitted.emit(job.id)
+                elif action == 'cancel':
+                    cancel_job(*args)
+                if self.job_ids:
+                    statuses = jobs_status(self.job_ids)
+                    for job in statuses.values():
+                        job['status_text'] = JOB_STATUSES.get(job['status'], job['status'])
+                    # отменённая рассылка сохраняет счётчики после отправки текущей части, поэтому её прогресс
+                    # продолжает читаться
+                    self.job_ids = [job_id for job_id, job in statuses.items() if job['status'] != 'done']
+                    self.progress.emit(statuses)
+            except Exception as ex:
+                logging.error(ex)
+                self.failed.emit(f'Ошибка рассылки: {ex}')
 
 
 class Panel(QMainWindow):
@@ -35,8 +212,53 @@ class Panel(QMainWindow):
         self.add_photo_btn.clicked.connect(self.add_photo)
         self.send_btn.clicked.connect(self.send_message)
         self.clear_btn.clicked.connect(self.clear)
+        self.cancel_btn.clicked.connect(self.cancel_job)
+        self.jobs_edit.currentIndexChanged.connect(lambda index: self.show_job())
         self.photo_path = None
         self.initial_pos = None
+        # состояния рассылок панели и момент и количество обработанных получателей при начале их выполнения для ETA
+        self.jobs, self.job_starts = {}, {}
+        self.schedule_worker = ScheduleWorker()
+        self.schedule_worker.progress.connect(self.show_upload_progress)
+        self.schedule_worker.uploaded.connect(self.show_upload_report)
+        self.jobs_worker = JobsWorker()
+        self.jobs_worker.submitted.connect(self.add_job)
+        self.jobs_worker.progress.connect(self.show_jobs)
+        self.jobs_worker.failed.connect(lambda message: self.statusBar().showMessage(message, 5000))
+        # панель только ставит рассылки в очередь, отправляет их обработчик очереди запущенного бота
+        for widget in (self.send_btn, self.jobs_edit):
+            widget.setToolTip(BOT_REQUIRED)
+
+    def start_workers(self) -> None:
+        """
+        Функция запуска фоновых потоков загрузки расписания и рассылок.
+
+        Аргументы:
+            None: Функция ничего не принимает.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.schedule_worker.start()
+        self.jobs_worker.start()
+
+    def closeEvent(self, event: PyQt6.QtGui.QCloseEvent) -> None:
+        """
+        Обработчик закрытия окна, останавливающий фоновые потоки.
+
+        Начатая загрузка расписания дописывается до конца, чтобы не оборвать её транзакцию.
+
+        Аргументы:
+            Event: Событие закрытия окна.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        for worker in (self.schedule_worker, self.jobs_worker):
+            worker.requestInterruption()
+        for worker in (self.schedule_worker, self.jobs_worker):
+            worker.wait()
+        event.accept()
 
     def mousePressEvent(self, event: PyQt6.QtGui.QMouseEvent) -> None:
         """
@@ -103,7 +325,9 @@ class Panel(QMainWindow):
         """
         Функция рассылки сообщения пользователям.
 
-        Функция получает queryset выбранных получателей из бд, итерируется по нему и отправляет сообщение пользователям.
+        Функция передаёт рассылку выбранным получателям фоновому потоку рассылок, который ставит её в очередь
+        заданий, поэтому следующую рассылку можно поставить, не дожидаясь окончания предыдущей. Очередь выполняет
+        обработчик рассылок бота: рассылка отправляется, только пока запущен bot.py или async_bot.py.
 
         Аргументы:
             None: Функция ничего не принимает.
@@ -112,33 +336,122 @@ class Panel(QMainWindow):
             None: Функция ничего не возвращает.
         """
         text = self.text_edit.toPlainText()
-        photo_bytes = open(self.photo_path, 'rb') if self.photo_path else None
+        photo_bytes = None
+        if self.photo_path:
+            with open(self.photo_path, 'rb') as photo:
+                photo_bytes = photo.read()
         if not text and not photo_bytes:
             self.statusBar().showMessage('Введите текст, или прикрепите изображение', 2000)
         else:
-            recievers = self.recievers_edit.currentText()
-            recievers = users.objects.all() if recievers == 'all' else\
-                users.objects.filter(class_letter__startswith=recievers)
-            for user in recievers:
-                try:
-                    if photo_bytes:
-                        bot.send_photo(user.user_id, caption=text, photo=photo_bytes)
-                        break
-                    else:
-                        bot.send_message(user.user_id, text)
-                except ApiTelegramException as ex:
-                    if ex.description == 'Forbidden: bot was blocked by the user':
-                        user.delete()
-                time.sleep(0.036)
+            self.jobs_worker.submit(self.recievers_edit.currentText(), text, photo_bytes)
             self.clear()
-            self.statusBar().showMessage('Сообщение отправлено', 3000)
+            self.statusBar().showMessage('Рассылка ставится в очередь', 2000)
+
+    def add_job(self, job_id: int) -> None:
+        """
+        Функция добавления поставленной в очередь рассылки в список рассылок панели.
+
+        Аргументы:
+            job_id (int): Идентификатор задания рассылки.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.jobs_edit.insertItem(0, f'#{job_id}: в очереди', job_id)
+        self.jobs_edit.setCurrentIndex(0)
+        self.statusBar().showMessage(f'Рассылка #{job_id} поставлена в очередь. {BOT_REQUIRED}', 10000)
+
+    def show_jobs(self, statuses: dict) -> None:
+        """
+        Функция обновления состояния рассылок панели.
+
+        Аргументы:
+            statuses (dict): Словарь {идентификатор: состояние рассылки} от фонового потока рассылок.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        now = time.monotonic()
+        for job_id, job in statuses.items():
+            if job['status'] == 'running':
+                self.job_starts.setdefault(job_id, (now, job['sent'] + job['failed'] + job['blocked']))
+            self.jobs[job_id] = job
+            self.jobs_edit.setItemText(self.jobs_edit.findData(job_id), f'#{job_id}: {job["status_text"]}')
+        self.show_job()
+
+    def job_eta(self, job_id: int, job: dict) -> str:
+        """
+        Функция оценки оставшегося времени рассылки по скорости с начала её выполнения.
+
+        Аргументы:
+            job_id (int): Идентификатор задания рассылки.
+            job (dict): Состояние рассылки.
+
+        Возвращает:
+            str: Оставшееся время или состояние рассылки, если она не выполняется.
+        """
+        if job['status'] == 'pending':
+            return 'в очереди, ждёт запущенного бота'
+        if job['status'] != 'running':
+            return job['status_text']
+        started_at, started_done = self.job_starts[job_id]
+        done = job['sent'] + job['failed'] + job['blocked']
+        rate = (done - started_done) / max(time.monotonic() - started_at, 1e-3)
+        if rate <= 0:
+            return 'оставшееся время оценивается'
+        minutes, seconds = divmod(int((job['total'] - done) / rate), 60)
+        return f'осталось ~{minutes} мин {seconds} с'
+
+    def show_job(self) -> None:
+        """
+        Функция отображения прогресса выбранной рассылки: полосы прогресса, счётчиков, ETA и кнопки отмены.
+
+        Аргументы:
+            None: Функция ничего не принимает.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        job_id = self.jobs_edit.currentData()
+        job = self.jobs.get(job_id)
+        if job is None:
+            self.job_progress.reset()
+            self.job_stats.clear()
+            self.cancel_btn.setEnabled(job_id is not None)
+            return
+        done = job['sent'] + job['failed'] + job['blocked']
+        self.job_progress.setMaximum(max(job['total'], 1))
+        self.job_progress.setValue(self.job_progress.maximum() if job['status'] == 'done' else
+                                   min(done, self.job_progress.maximum()))
+        self.job_stats.setText(f'отправлено: {job["sent"]}, не доставлено: {job["failed"]}\n'
+                               f'заблокировали бота: {job["blocked"]}\n{self.job_eta(job_id, job)}')
+        self.cancel_btn.setEnabled(job['status'] in ('pending', 'running'))
+
+    def cancel_job(self) -> None:
+        """
+        Функция отмены выбранной рассылки.
+
+        Рассылка в очереди отменяется сразу, а выполняющаяся - после отправки текущей части.
+
+        Аргументы:
+            None: Функция ничего не принимает.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        job_id = self.jobs_edit.currentData()
+        if job_id is not None:
+            self.jobs_worker.cancel(job_id)
+            self.cancel_btn.setEnabled(False)
+            self.statusBar().showMessage(f'Рассылка #{job_id} отменяется', 2000)
 
     def add_schedule(self) -> None:
         """
         Функция добавления расписания.
 
-        Функция открывает диалоговое окно выбора файла в формате .xlsx, создаёт копию выбранного файла в директории
-        ./uploads и передаёт имя файла в качестве аргумента функции main_schedule_parse из файла bot.py.
+        Функция открывает диалоговое окно выбора файлов в формате .xlsx и zip архивов и передаёт выбранные файлы
+        фоновому потоку загрузки расписания, поэтому панель не замирает на время разбора, а следующий набор файлов
+        можно выбрать, не дожидаясь окончания загрузки.
 
         Аргументы:
             None: Функция ничего не принимает.
@@ -146,11 +459,38 @@ class Panel(QMainWindow):
         Возвращает:
             None: Функция ничего не возвращает.
         """
-        file_path = QFileDialog.getOpenFileName(self, 'Выбрать файл', '', 'Файл (*.xlsx)')[0]
-        if file_path:
-            file_name = file_path.split('/')[-1]
-            shutil.copy(file_path, f'./uploads/{file_name}')
-            self.statusBar().showMessage(main_schedule_parse(file_name), 3000)
+        file_paths = QFileDialog.getOpenFileNames(self, 'Выбрать файлы', '', 'Файл (*.xlsx *.zip)')[0]
+        if file_paths:
+            self.schedule_worker.add(file_paths)
+            self.statusBar().showMessage(f'Загрузка расписания поставлена в очередь, файлов: {len(file_paths)}')
+
+    def show_upload_progress(self, step: int, steps: int) -> None:
+        """
+        Функция отображения прогресса загрузки расписания в строке состояния.
+
+        Аргументы:
+            step (int): Номер текущей загрузки набора.
+            steps (int): Количество загрузок набора.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        waiting = self.schedule_worker.uploads.qsize()
+        self.statusBar().showMessage(f'Загрузка расписания: {step} из {steps}'
+                                     + (f', наборов в очереди: {waiting}' if waiting else ''))
+
+    def show_upload_report(self, report: str, files: int) -> None:
+        """
+        Функция отображения отчёта о загрузке расписания в строке состояния.
+
+        Аргументы:
+            report (str): Отчёт о загрузке.
+            files (int): Количество загруженных файлов.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.statusBar().showMessage(report, 3000 if files == 1 else 10000)
 
     def clear(self) -> None:
         """
@@ -160,7 +500,7 @@ class Panel(QMainWindow):
 
         Аргументы:
             None: Функция ничего не принимает.
-        
+
         Возвращает:
             None: Функция ничего не возвращает.
         """
@@ -170,7 +510,9 @@ class Panel(QMainWindow):
 
 
 if __name__ == '__main__':
+    setup_logging('admin_panel.log')
     app = QApplication(sys.argv)
     widget = Panel()
     widget.show()
+    widget.start_workers()
     sys.exit(app.exec())
@@ -0,0 +1,423 @@
+import os
+import asyncio
+import logging
+import argparse
+import telebot
+from aiohttp import web
+from telebot import types
+from bot import THROTTLED_TEXT, bot, missing_schedule_notice, profile_summary, schedule_day, timed_route
+from clients import make_async_bot
+from jobs import aworker_loop
+from keyboards import (class_group_keyboard, class_letter_keyboard, class_number_keyboard, confirm_profile_keyboard,
+                       schedule_days_keyboard, start_keyboard, univer_group_keyboard)
+from logs import logging_metrics
+from metrics import (METRICS_PORT, instrument_database, instrument_telegram, instrument_telegram_async, instrumented,
+                     register_collector, serve_metrics)
+from profiles import acommit_draft, aget_draft, aget_profile
+from retention import start_retention
+from routing import CallbackRouter
+from schedule import aget_schedule_text, invalidate_schedule_cache
+from throttling import callbacks_limiter, commands_limiter, throttled, throttling_metrics
+from webhook import WEBHOOK_BACKLOG
+
+
+# асинхронный бот обрабатывает обновления учеников задачами asyncio в одном потоке: запросы к Bot API выполняет
+# aiohttp, а запросы к базе данных - асинхронный API django. Обновления админа передаются синхронному боту из bot.py
+abot = make_async_bot()
+# сколько обновлений может обрабатываться одновременно, при превышении вебхук отвечает 503,
+# а long polling не запрашивает новые обновления
+MAX_UPDATES = int(os.getenv('ASYNC_MAX_UPDATES', 4096))
+POLL_TIMEOUT = 20
+
+
+def update_user(update: telebot.types.Update) -> telebot.types.User:
+    """
+    Функция, определяющая пользователя, от которого пришло обновление.
+
+    Аргументы:
+        update (telebot.types.Update): Обновление от Telegram.
+
+    Возвращает:
+        telebot.types.User: Пользователь или None, если обновление не от пользователя.
+    """
+    if update.message:
+        return update.message.from_user
+    if update.callback_query:
+        return update.callback_query.from_user
+    return None
+
+
+class UpdateRunner:
+    """
+    Обработчик обновлений асинхронного бота.
+
+    Каждое обновление обрабатывается отдельной задачей asyncio, поэтому медленный запрос к Bot API или базе данных
+    задерживает только своё обновление. Обновления админа передаются синхронному боту: загрузка и разбор файлов
+    расписания и составление рассылок с пошаговыми обработчиками выполняются в его пуле потоков.
+
+    Аргументы:
+        limit (int): Максимальное количество одновременно обрабатываемых обновлений.
+    """
+    def __init__(self, limit: int = MAX_UPDATES) -> None:
+        self.limit = limit
+        self.tasks = set()
+
+    def submit(self, update: telebot.types.Update) -> bool:
+        """
+        Функция запуска обработки обновления.
+
+        Аргументы:
+            update (telebot.types.Update): Обновление от Telegram.
+
+        Возвращает:
+            bool: False если одновременно обрабатывается limit обновлений и обновление не принято.
+        """
+        if len(self.tasks) >= self.limit:
+            return False
+        task = asyncio.create_task(self.process(update))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return True
+
+    async def process(self, update: telebot.types.Update) -> None:
+        """
+        Функция обработки обновления.
+
+        Аргументы:
+            update (telebot.types.Update): Обновление от Telegram.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        user = update_user(update)
+        try:
+            if user and str(user.id) == os.getenv('ADMIN_ID'):
+                bot.process_new_updates([update])
+            else:
+                await abot.process_new_updates([update])
+        except Exception as ex:
+            logging.error(ex)
+
+
+@abot.message_handler(commands=['get'])
+@instrumented('get')
+@throttled(commands_limiter)
+async def get(message: telebot.types.Message) -> None:
+    """
+    Асинхронная версия обработчика запроса расписания.
+
+    Аргументы:
+        message (telebot.types.Message): Сообщение отправленное пользователем.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    if await aget_profile(message.from_user.id):
+        await abot.send_message(message.from_user.id, 'выберите действие', reply_markup=schedule_days_keyboard())
+
+
+@abot.message_handler(commands=['start', 'edit'])
+@instrumented('start')
+@throttled(commands_limiter)
+async def start(message: telebot.types.Message) -> None:
+    """
+    Асинхронная версия обработчика команд /start и /edit.
+
+    Аргументы:
+        message (telebot.types.Message): Сообщение отправленное пользователем.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    command = message.text
+    if command == '/start' and not await aget_profile(message.from_user.id) or command == '/edit':
+        await abot.send_message(message.from_user.id, 'Привет, давай определимся с твоими классом и группой',
+                                reply_markup=start_keyboard())
+
+
+async def answer_throttled(callback: telebot.types.CallbackQuery) -> None:
+    """
+    Асинхронная версия ответа на нажатие кнопки, отброшенное ограничителем частоты.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк пользователя.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    await abot.answer_callback_query(callback.id, THROTTLED_TEXT)
+
+
+def throttled_route(name: str, handler: callable) -> callable:
+    """
+    Промежуточный обработчик маршрутов асинхронного бота, ограничивающий частоту нажатий пользователя на кнопки.
+    """
+    return throttled(callbacks_limiter, on_drop=answer_throttled)(handler)
+
+
+callbacks_router = CallbackRouter(middleware=[timed_route, throttled_route])
+
+
+@callbacks_router.route('choice')
+async def choose_class_number(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора цифры класса.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    await abot.edit_message_text('выберите класс', callback.from_user.id, callback.message.message_id,
+                                 reply_markup=class_number_keyboard())
+
+
+@callbacks_router.route('10', '11', name='class_number')
+async def choose_class_letter(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора буквы класса, callback_data кнопки - цифра класса.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    await abot.edit_message_text('выберите букву', callback.from_user.id, callback.message.message_id,
+                                 reply_markup=class_letter_keyboard(callback.data))
+
+
+@callbacks_router.route('class_letter')
+async def choose_class_group(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора группы класса.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Класс, например '10 Μ'.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    (await aget_draft(callback.from_user.id)).class_letter = payload
+    await abot.edit_message_text('выберите группу', callback.from_user.id, callback.message.message_id,
+                                 reply_markup=class_group_keyboard())
+
+
+@callbacks_router.route('class_group')
+async def choose_univer_group(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора группы на универ-день.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Группа класса: 'группа А' или 'группа Б'.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    user = await aget_draft(callback.from_user.id)
+    user.group_number = 0 if payload == 'группа А' else 1
+    await abot.edit_message_text('выберите группу универдня', callback.from_user.id, callback.message.message_id,
+                                 reply_markup=univer_group_keyboard(user.class_letter))
+
+
+@callbacks_router.route('univer_group')
+async def confirm_profile(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция подтверждения данных.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Номер группы универ-дня.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    user = await aget_draft(callback.from_user.id)
+    user.u_group_number = int(payload)
+    await abot.edit_message_text(profile_summary(user), callback.from_user.id, callback.message.message_id,
+                                 reply_markup=confirm_profile_keyboard())
+
+
+@callbacks_router.route('done')
+async def save_profile(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция сохранения данных одной записью в бд и уведомления об успешном сохранении записи.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    if not await acommit_draft(callback.from_user.id):
+        await abot.edit_message_text('Выбор устарел, давай заполним данные заново', callback.from_user.id,
+                                     callback.message.message_id, reply_markup=start_keyboard())
+        return
+    await abot.edit_message_text('Успешно сохранено!\n/edit - заполнить заново\n/get - получить расписание',
+                                 callback.from_user.id, callback.message.message_id)
+
+
+@callbacks_router.route('get_schedule')
+async def send_schedule(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция отправки расписания.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): День: 'today' или 'tommorow'.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    date = schedule_day(payload)
+    user = await aget_profile(callback.from_user.id)
+    if not user:
+        return
+    schedule = await aget_schedule_text(user, date)
+    if schedule:
+        kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+        kb.row('/edit', '/get')
+        await abot.send_message(callback.from_user.id, schedule, reply_markup=kb)
+        await abot.delete_message(callback.from_user.id, callback.message.id)
+    elif notice := missing_schedule_notice(callback.message.text, date):
+        await abot.edit_message_text(notice, callback.from_user.id, callback.message.message_id,
+                                     reply_markup=schedule_days_keyboard())
+
+
+@abot.callback_query_handler(func=lambda callback: True)
+async def callback_message(callback: telebot.types.CallbackQuery) -> None:
+    """
+    Функция обработки пользовательских нажатий на кнопки.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    await callbacks_router.adispatch(callback)
+
+
+async def poll_updates(runner: UpdateRunner) -> None:
+    """
+    Функция получения обновлений long polling.
+
+    Пока обрабатывается limit обновлений, новые обновления не запрашиваются и остаются в очереди Telegram.
+
+    Аргументы:
+        runner (UpdateRunner): Обработчик обновлений.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    offset = None
+    while True:
+        try:
+            updates = await abot.get_updates(offset=offset, timeout=POLL_TIMEOUT, request_timeout=POLL_TIMEOUT + 10)
+        except Exception as ex:
+            logging.error(ex)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            while not runner.submit(update):
+                await asyncio.sleep(0.05)
+            offset = update.update_id + 1
+
+
+def make_webhook_app(runner: UpdateRunner, secret_token: str = None) -> web.Application:
+    """
+    Функция, создающая aiohttp приложение вебхука.
+
+    Аргументы:
+        runner (UpdateRunner): Обработчик обновлений.
+        secret_token (str): Секрет, который Telegram передаёт в заголовке X-Telegram-Bot-Api-Secret-Token.
+
+    Возвращает:
+        web.Application: Приложение, принимающее обновления POST-запросами на любой путь.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        if secret_token and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+            return web.Response(status=403)
+        try:
+            update = telebot.types.Update.de_json(await request.text())
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400)
+        # при переполнении отвечаем 503, и Telegram повторит доставку позже
+        if runner.submit(update):
+            return web.Response()
+        return web.Response(status=503, headers={'Retry-After': '1'})
+
+    app = web.Application()
+    app.router.add_post('/{path:.*}', handle)
+    return app
+
+
+async def serve(mode: str, host: str, port: int, url: str = None, secret_token: str = None,
+                limit: int = MAX_UPDATES) -> None:
+    """
+    Функция запуска асинхронного бота вместе с обработчиком очереди рассылок.
+
+    Аргументы:
+        mode (str): Получение обновлений: 'polling' или 'webhook'.
+        host (str): Адрес, на котором слушает сервер вебхука.
+        port (int): Порт сервера вебхука.
+        url (str): Публичный адрес вебхука, без него вебхук не регистрируется в Telegram.
+        secret_token (str): Секрет для проверки запросов от Telegram.
+        limit (int): Максимальное количество одновременно обрабатываемых обновлений.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    runner = UpdateRunner(limit)
+    worker = asyncio.create_task(aworker_loop(abot))
+    app_runner = None
+    try:
+        if mode == 'webhook':
+            if url:
+                await abot.remove_webhook()
+                await abot.set_webhook(url=url, secret_token=secret_token)
+            app_runner = web.AppRunner(make_webhook_app(runner, secret_token), access_log=None)
+            await app_runner.setup()
+            await web.TCPSite(app_runner, host, port, backlog=WEBHOOK_BACKLOG).start()
+            await asyncio.Event().wait()
+        else:
+            await poll_updates(runner)
+    finally:
+        worker.cancel()
+        if app_runner:
+            await app_runner.cleanup()
+        await abot.close_session()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Асинхронный телеграм бот школьного расписания')
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default=os.getenv('BOT_MODE', 'polling'),
+                        help='получение обновлений long polling или через локальный http-сервер вебхука')
+    parser.add_argument('--host', default=os.getenv('WEBHOOK_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('WEBHOOK_PORT', 8443)))
+    parser.add_argument('--url', default=os.getenv('WEBHOOK_URL'), help='публичный адрес вебхука для Telegram')
+    parser.add_argument('--secret-token', default=os.getenv('WEBHOOK_SECRET_TOKEN'))
+    parser.add_argument('--max-updates', type=int, default=MAX_UPDATES,
+                        help='количество одновременно обрабатываемых обновлений')
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', METRICS_PORT)),
+                        help='порт локального http-сервера метрик в формате Prometheus, 0 чтобы не запускать')
+    args = parser.parse_args()
+    instrument_telegram()
+    instrument_telegram_async()
+    instrument_database()
+    register_collector(throttling_metrics)
+    register_collector(logging_metrics)
+    if args.metrics_port:
+        serve_metrics('127.0.0.1', args.metrics_port)
+    start_retention(on_purge=lambda before: invalidate_schedule_cache(before=before))
+    while True:
+        try:
+            asyncio.run(serve(args.mode, args.host, args.port, args.url, args.secret_token, args.max_updates))
+        except Exception as ex:
+            logging.error(ex, exc_info=ex)
@@ -0,0 +1,266 @@
+import json
+import time
+import queue
+import random
+import argparse
+import threading
+import itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+# методы, которые отправляют что-то пользователю: только они получают искусственную задержку и ответы 429
+SENDING_METHODS = {'sendMessage', 'editMessageText', 'sendPhoto', 'deleteMessage'}
+
+
+class FakeBotApi:
+    """
+    Локальная замена Telegram Bot API для нагрузочного тестирования.
+
+    Сервер реализует методы, которые использует бот: sendMessage, editMessageText, sendPhoto, deleteMessage,
+    getFile, getUpdates, а также скачивание файлов. Ответы отправляющих методов задерживаются на latency ± jitter
+    секунд, а с вероятностью rate_limit сервер отвечает 429 с retry_after, как настоящий Telegram.
+
+    Аргументы:
+        host (str): Адрес сервера.
+        port (int): Порт сервера, 0 чтобы выбрать свободный порт.
+        latency (float): Средняя задержка ответа отправляющих методов в секундах.
+        jitter (float): Разброс задержки в секундах.
+        rate_limit (float): Доля запросов отправляющих методов, на которые сервер отвечает 429.
+        retry_after (int): Значение retry_after в ответах 429.
+        on_call (callable): Функция, вызываемая с методом и идентификатором чата при каждом запросе к чату.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 rate_limit: float = 0.0, retry_after: int = 1, on_call: callable = None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.on_call = on_call
+        self.updates = queue.Queue()
+        self.files = {}
+        self.calls = {}
+        self.rate_limited = 0
+        self.message_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.make_request_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        Адрес сервера вида http://host:port.
+        """
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> None:
+        """
+        Функция запуска сервера в фоновом потоке.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True, name='fake-bot-api')
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        Функция остановки сервера.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def configure_telebot(self) -> None:
+        """
+        Функция, направляющая запросы синхронного и асинхронного клиентов telebot на этот сервер.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        from telebot import apihelper, asyncio_helper
+        for helper in (apihelper, asyncio_helper):
+            helper.API_URL = f'{self.url}/bot{{0}}/{{1}}'
+            helper.FILE_URL = f'{self.url}/file/bot{{0}}/{{1}}'
+
+    def push_update(self, update: dict) -> None:
+        """
+        Функция, добавляющая обновление в очередь getUpdates.
+
+        Аргументы:
+            update (dict): Обновление в формате Bot API.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.updates.put(update)
+
+    def add_file(self, content: bytes) -> str:
+        """
+        Функция, сохраняющая файл, который бот сможет получить через getFile.
+
+        Аргументы:
+            content (bytes): Содержимое файла.
+
+        Возвращает:
+            str: file_id файла.
+        """
+        with self.lock:
+            file_id = f'file{len(self.files) + 1}'
+            self.files[file_id] = content
+        return file_id
+
+    def stats(self) -> dict:
+        """
+        Функция, возвращающая счётчики сервера.
+
+        Возвращает:
+            dict: Количество запросов по методам и количество ответов 429.
+        """
+        with self.lock:
+            return {'calls': dict(self.calls), 'rate_limited': self.rate_limited}
+
+    def message(self, chat_id: int, message_id: int = None, **fields) -> dict:
+        """
+        Функция, собирающая объект Message для ответа.
+
+        Аргументы:
+            chat_id (int): Идентификатор чата.
+            message_id (int): Идентификатор сообщения, если не передан, выдаётся новый.
+            fields: Остальные поля сообщения.
+
+        Возвращает:
+            dict: Сообщение в формате Bot API.
+        """
+        return {'message_id': message_id or next(self.message_ids), 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, **fields}
+
+    def call(self, method: str, params: dict, body: bytes) -> tuple:
+        """
+        Функция выполнения метода Bot API.
+
+        Аргументы:
+            method (str): Название метода.
+            params (dict): Параметры запроса.
+            body (bytes): Тело запроса, для sendPhoto содержит загружаемое изображение.
+
+        Возвращает:
+            tuple: http-статус и тело ответа.
+        """
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        chat_id = int(params['chat_id']) if 'chat_id' in params else None
+        if method in SENDING_METHODS:
+            if chat_id is not None and self.on_call:
+                self.on_call(method, chat_id)
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+            if random.random() < self.rate_limit:
+                with self.lock:
+                    self.rate_limited += 1
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f'Too Many Requests: retry after {self.retry_after}',
+                             'parameters': {'retry_after': self.retry_after}}
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': self.get_updates(params)}
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'bot', 'username': 'bot'}}
+        if method == 'sendMessage':
+            return 200, {'ok': True, 'result': self.message(chat_id, text=params.get('text', ''))}
+        if method == 'editMessageText':
+            return 200, {'ok': True, 'result': self.message(chat_id, int(params['message_id']),
+                                                            text=params.get('text', ''))}
+        if method in ('deleteMessage', 'answerCallbackQuery'):
+            return 200, {'ok': True, 'result': True}
+        if method == 'sendPhoto':
+            # повторная отправка по file_id не загружает изображение заново
+            file_id = params.get('photo') or self.add_file(body)
+            photo = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 1280, 'height': 720}]
+            return 200, {'ok': True, 'result': self.message(chat_id, photo=photo, caption=params.get('caption'))}
+        if method == 'getFile':
+            file_id = params.get('file_id')
+            if file_id not in self.files:
+                return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: invalid file_id'}
+            return 200, {'ok': True, 'result': {'file_id': file_id, 'file_unique_id': file_id,
+                                                'file_size': len(self.files[file_id]), 'file_path': file_id}}
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+    def get_updates(self, params: dict) -> list:
+        """
+        Функция long polling: ждёт первое обновление до timeout секунд и возвращает все накопившиеся.
+
+        Аргументы:
+            params (dict): Параметры запроса getUpdates.
+
+        Возвращает:
+            list: Обновления.
+        """
+        limit = int(params.get('limit') or 100)
+        try:
+            updates = [self.updates.get(timeout=float(params.get('timeout') or 0) or 0.01)]
+        except queue.Empty:
+            return []
+        while len(updates) < limit:
+            try:
+                updates.append(self.updates.get_nowait())
+            except queue.Empty:
+                break
+        return updates
+
+    def make_request_handler(self) -> type:
+        api = self
+
+        class FakeBotApiRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # заголовки и тело уходят отдельными записями, и без TCP_NODELAY каждый ответ ждал бы delayed ACK
+            disable_nagle_algorithm = True
+
+            def handle_request(self) -> None:
+                url = urlsplit(self.path)
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                parts = url.path.strip('/').split('/')
+                if parts[0] == 'file' and len(parts) == 3:
+                    content = api.files.get(parts[2])
+                    self.respond(200 if content is not None else 404, content or b'', 'application/octet-stream')
+                    return
+                params = dict(parse_qsl(url.query))
+                if self.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+                    params.update(parse_qsl(body.decode('utf-8')))
+                if len(parts) != 2 or not parts[0].startswith('bot'):
+                    self.respond(404, b'{"ok": false, "error_code": 404, "description": "Not Found"}')
+                    return
+                status, result = api.call(parts[1], params, body)
+                self.respond(status, json.dumps(result, ensure_ascii=False).encode('utf-8'))
+
+            def respond(self, status: int, content: bytes, content_type: str = 'application/json') -> None:
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = handle_request
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return FakeBotApiRequestHandler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Локальная замена Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.05, help='средняя задержка ответа в секундах')
+    parser.add_argument('--jitter', type=float, default=0.02, help='разброс задержки в секундах')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='доля запросов, на которые отвечать 429')
+    args = parser.parse_args()
+    api = FakeBotApi(args.host, args.port, args.latency, args.jitter, args.rate_limit)
+    print(f'Bot API: {api.url}')
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        api.stop()
@@ -0,0 +1,382 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import zipfile
+import tracemalloc
+import datetime as dt
+from contextlib import contextmanager
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# сценарии: (название, дни недели загружаемых файлов, параметры make_workbook и флаги загрузки zip архивом и
+# повторной загрузки исправленного файла поверх файла без исправлений)
+SCENARIOS = [
+    ('regular', (3,), {}),
+    ('regular-dense-merges', (3,), {'shared_every': 1, 'noise_merges': 2000}),
+    ('regular-extra-sheets', (3,), {'extra_sheets': 5}),
+    ('uday-10', (0,), {}),
+    ('uday-11', (2,), {}),
+    ('batch-week', (0, 1, 2, 3, 4), {}),
+    ('archive-week', (0, 1, 2, 3, 4), {'archive': True}),
+    ('regular-reupload', (3,), {'typos': 3, 'reupload': True}),
+]
+# порядок стадий в отчёте; parse - ожидание результатов разбора из пула процессов, other - всё, что не попало
+# в стадии
+STAGES = ['load', 'times', 'regular_classes', 'uday_groups', 'uday_classes', 'parse', 'save', 'cache', 'notify',
+          'other']
+
+
+class StageProfiler:
+    """
+    Профилировщик стадий загрузки расписания.
+
+    Профилировщик подменяет функции модулей ingestion и parsing обёртками, которые засекают время, пиковую память и
+    количество запросов к базе данных. Вложенные вызовы относятся к внешней стадии, поэтому column_values внутри
+    парсеров считается частью парсера. Запросы и время вне стадий относятся к стадии other.
+
+    Когда страницы разбираются в пуле процессов, стадии load, times и парсеров выполняются в дочерних процессах
+    и не видны профилировщику: время разбора попадает в стадию parse как ожидание результатов.
+
+    Аргументы:
+        trace_memory (bool): Замерять ли пиковую память стадий через tracemalloc.
+    """
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.current = None
+        self.times = {}
+        self.queries = {}
+        self.memory = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Контекстный менеджер замера стадии.
+
+        Аргументы:
+            name (str): Название стадии.
+        """
+        if self.current:
+            yield
+            return
+        self.current = name
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0) + time.perf_counter() - start
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                self.memory[name] = max(self.memory.get(name, 0), peak)
+            self.current = None
+
+    def wrap(self, func: callable, name: str) -> callable:
+        """
+        Функция, оборачивающая функцию замером стадии.
+
+        Аргументы:
+            func (callable): Оборачиваемая функция.
+            name (str): Название стадии.
+
+        Возвращает:
+            (callable): Обёрнутая функция.
+        """
+        def wrapped(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapped
+
+    def count_query(self, execute: callable, sql: str, params, many: bool, context: dict):
+        """
+        Обёртка выполнения запросов django, считающая запросы текущей стадии.
+        """
+        name = self.current or 'other'
+        self.queries[name] = self.queries.get(name, 0) + 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def instrumented(ingestion, profiler: StageProfiler):
+    """
+    Контекстный менеджер, подменяющий функции модулей ingestion и parsing обёртками профилировщика на время
+    одного прогона.
+
+    Аргументы:
+        ingestion (module): Модуль ingestion.
+        profiler (StageProfiler): Профилировщик прогона.
+    """
+    import openpyxl
+    import parsing
+    from django.db import connection, transaction
+
+    class Transaction:
+        @staticmethod
+        def atomic(*args, **kwargs):
+            return profiled_atomic(*args, **kwargs)
+
+    @contextmanager
+    def profiled_atomic(*args, **kwargs):
+        with profiler.stage('save'), transaction.atomic(*args, **kwargs):
+            yield
+
+    patches = {
+        (openpyxl, 'load_workbook'): 'load',
+        (parsing, 'sheet_values'): 'load',
+        (parsing, 'column_values'): 'times',
+        (parsing, 'regular_classes_schedule_parsing'): 'regular_classes',
+        (parsing, 'uday_groups_schedule_parsing'): 'uday_groups',
+        (parsing, 'uday_classes_schedule_parsing'): 'uday_classes',
+        (ingestion, 'collect_schedule'): 'parse',
+        (ingestion, 'fill_schedule_cache'): 'cache',
+        (ingestion, 'submit_job'): 'notify',
+    }
+    originals = {key: getattr(*key) for key in patches}
+    original_transaction = ingestion.transaction
+    for (module, attr), name in patches.items():
+        setattr(module, attr, profiler.wrap(originals[(module, attr)], name))
+    ingestion.transaction = Transaction
+    try:
+        with connection.execute_wrapper(profiler.count_query):
+            yield
+    finally:
+        for (module, attr), func in originals.items():
+            setattr(module, attr, func)
+        ingestion.transaction = original_transaction
+
+
+def setup_database(path: str, users_count: int) -> None:
+    """
+    Функция настройки django на локальную базу SQLite и создания таблиц.
+
+    Таблицы создаются по текущим моделям, а не миграциями: в SQLite у varchar должна быть длина, а поле
+    users.class_letter объявлено без неё, как допускает PostgreSQL.
+
+    Аргументы:
+        path (str): Путь файла базы данных.
+        users_count (int): Количество пользователей, которым ставится в очередь уведомление.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    import django
+    from django.apps import apps
+    from django.conf import settings
+    from django.db import connection
+
+    settings.configure(INSTALLED_APPS=['db'],
+                       DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}})
+    django.setup()
+    models = apps.get_app_config('db').get_models()
+    with connection.schema_editor() as editor:
+        for model in models:
+            for field in model._meta.fields:
+                if field.get_internal_type() == 'CharField' and not field.max_length:
+                    field.max_length = 255
+            editor.create_model(model)
+    from db.models import users
+    users.objects.bulk_create([users(user_id=i, class_letter='10 Μ', group_number=i % 2, u_group_number=i % 12 + 1)
+                               for i in range(1, users_count + 1)], batch_size=500)
+
+
+def scenario_date(weekday: int) -> dt.date:
+    """
+    Функция выбора даты расписания с нужным днём недели.
+
+    Дата берётся на следующей неделе текущего года, чтобы её не удаляла очистка старого расписания и чтобы
+    прогоны в разные дни были сопоставимы.
+
+    Аргументы:
+        weekday (int): День недели.
+
+    Возвращает:
+        dt.date: Дата расписания.
+    """
+    date = dt.date.today() + dt.timedelta(days=7)
+    date += dt.timedelta(days=(weekday - date.weekday()) % 7)
+    if date.year != dt.date.today().year:
+        date = dt.date(dt.date.today().year, 12, 1)
+        date += dt.timedelta(days=(weekday - date.weekday()) % 7)
+    return date
+
+
+def run_scenario(ingestion, files: dict, repeats: int, archive: bool = False, previous: dict = None) -> dict:
+    """
+    Функция прогона одного сценария.
+
+    Функция repeats раз загружает файлы без замера памяти и один раз с tracemalloc, так как трассировка памяти
+    искажает время. Один файл загружается функцией main_schedule_parse, несколько - batch_schedule_parse,
+    а с флагом archive файлы упаковываются в zip архив и загружаются функцией archive_schedule_parse. Перед каждым
+    прогоном расписание удаляется из базы, а файлы previous загружаются без замера, чтобы замерить повторную загрузку.
+
+    Аргументы:
+        ingestion (module): Модуль ingestion.
+        files (dict): Словарь {имя файла в папке uploads, из которого берётся дата: путь сгенерированного файла}.
+        repeats (int): Количество прогонов для замера времени.
+        archive (bool): Загружать ли файлы одним zip архивом.
+        previous (dict): Файлы на те же даты, загружаемые перед каждым прогоном, в том же виде, что и files.
+
+    Возвращает:
+        dict: Медианное и минимальное время, количество запросов и пиковая память по стадиям.
+    """
+    data = io.BytesIO()
+    if archive:
+        with zipfile.ZipFile(data, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for filename, source in files.items():
+                zip_file.write(source, filename)
+    runs = []
+    for trace_memory in [False] * repeats + [True]:
+        ingestion.regular_schedule.objects.all().delete()
+        ingestion.uday_schedule.objects.all().delete()
+        for filename, source in (previous or {}).items():
+            shutil.copy(source, os.path.join('uploads', filename))
+            ingestion.main_schedule_parse(filename)
+        for filename, source in files.items():
+            if not archive:
+                shutil.copy(source, os.path.join('uploads', filename))
+        profiler = StageProfiler(trace_memory)
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with instrumented(ingestion, profiler):
+            if archive:
+                result, success = ingestion.archive_schedule_parse(data.getvalue()), 'Расписание сохранено успешно'
+            elif len(files) == 1:
+                result, success = ingestion.main_schedule_parse(*files), 'Расписание сохранено успешно'
+            else:
+                result, success = ingestion.batch_schedule_parse(list(files)), f'Загружено файлов: {len(files)} из'
+        total = time.perf_counter() - start
+        if trace_memory:
+            tracemalloc.stop()
+        if not result.startswith(success):
+            raise RuntimeError(result)
+        profiler.times['other'] = max(0.0, total - sum(profiler.times.values()))
+        profiler.times['total'] = total
+        runs.append(profiler)
+    timed, traced = runs[:-1], runs[-1]
+    stages = {}
+    for name in STAGES + ['total']:
+        samples = [run.times.get(name, 0) * 1000 for run in timed]
+        if not any(samples) and name not in traced.queries:
+            continue
+        stages[name] = {'median_ms': round(statistics.median(samples), 3), 'min_ms': round(min(samples), 3),
+                        'queries': traced.queries.get(name, 0) if name != 'total' else sum(traced.queries.values()),
+                        'peak_kb': round(traced.memory[name] / 1024, 1) if name in traced.memory else None}
+    return stages
+
+
+def git_revision() -> str:
+    """
+    Функция, возвращающая текущий коммит репозитория.
+
+    Возвращает:
+        str: Короткий хэш коммита с пометкой о незакоммиченных изменениях или 'unknown'.
+    """
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return f'{revision}-dirty' if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def format_report(report: dict, baseline: dict = None) -> str:
+    """
+    Функция форматирования результатов в таблицу.
+
+    Аргументы:
+        report (dict): Результаты прогона.
+        baseline (dict): Результаты прогона на другом коммите для сравнения медианного времени.
+
+    Возвращает:
+        str: Таблица результатов.
+    """
+    lines = [f'commit {report["revision"]}, python {report["python"]}, {report["repeats"]} прогонов, '
+             f'{report["users"]} пользователей, процессов разбора: {report.get("parse_workers", 0)}']
+    for scenario, stages in report['scenarios'].items():
+        lines.append(f'\n{scenario}')
+        lines.append(f'{"стадия":<16}{"медиана, мс":>12}{"мин, мс":>10}{"запросы":>9}{"пик, КБ":>10}'
+                     + (f'{"было, мс":>10}{"изм.":>8}' if baseline else ''))
+        old_stages = (baseline or {}).get('scenarios', {}).get(scenario, {})
+        for name, stage in stages.items():
+            peak = '-' if stage['peak_kb'] is None else f'{stage["peak_kb"]:.1f}'
+            line = f'{name:<16}{stage["median_ms"]:>12.2f}{stage["min_ms"]:>10.2f}{stage["queries"]:>9}{peak:>10}'
+            if baseline:
+                old = old_stages.get(name, {}).get('median_ms')
+                change = f'{(stage["median_ms"] - old) / old * 100:+.0f}%' if old else '-'
+                line += (f'{old:>10.2f}' if old is not None else f'{"-":>10}') + f'{change:>8}'
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Бенчмарк загрузки расписания по стадиям')
+    parser.add_argument('--repeats', type=int, default=5, help='количество прогонов каждого сценария')
+    parser.add_argument('--users', type=int, default=1000, help='количество пользователей в базе данных')
+    parser.add_argument('--scenario', action='append', choices=[name for name, _, _ in SCENARIOS],
+                        help='запускаемые сценарии, по умолчанию все')
+    parser.add_argument('--parse-workers', type=int,
+                        help='количество процессов разбора страниц, 0 - разбор в текущем процессе')
+    parser.add_argument('--output', help='файл, в который сохраняются результаты в формате json')
+    parser.add_argument('--compare', help='результаты другого коммита в формате json для сравнения')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+
+    # бенчмарк работает во временной папке, чтобы не трогать uploads, logs.log и базу данных проекта
+    workdir = tempfile.mkdtemp(prefix='schedule-bench-')
+    os.makedirs(os.path.join(workdir, 'uploads'))
+    sys.path.insert(0, REPO_DIR)
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN_APIKEY', '0:benchmark')
+    if args.parse_workers is not None:
+        os.environ['SCHEDULE_PARSE_WORKERS'] = str(args.parse_workers)
+    os.chdir(workdir)
+    try:
+        setup_database(os.path.join(workdir, 'bench.sqlite3'), args.users)
+        import ingestion
+        import parsing
+        from benchmarks.workbooks import make_workbook
+        # пул создаётся до замеров, чтобы запуск процессов не попадал в первый прогон
+        parsing.get_parse_pool()
+        report = {'revision': git_revision(), 'python': platform.python_version(), 'repeats': args.repeats,
+                  'users': args.users, 'parse_workers': parsing.PARSE_WORKERS, 'scenarios': {}}
+        for name, weekdays, params in SCENARIOS:
+            if args.scenario and name not in args.scenario:
+                continue
+            params, files, previous = dict(params), {}, {}
+            archive, reupload = params.pop('archive', False), params.pop('reupload', False)
+            for weekday in weekdays:
+                filename = f'{scenario_date(weekday).strftime("%d.%m")}.xlsx'
+                files[filename] = os.path.join(workdir, f'{name}-{weekday}.xlsx')
+                make_workbook(files[filename], weekday, **params)
+                if reupload:
+                    previous[filename] = os.path.join(workdir, f'{name}-{weekday}-previous.xlsx')
+                    make_workbook(previous[filename], weekday, **{**params, 'typos': 0})
+            report['scenarios'][name] = run_scenario(ingestion, files, args.repeats, archive, previous)
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = None
+    if compare:
+        with open(compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    print(format_report(report, baseline))
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,430 @@
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    Функция вычисления перцентиля методом ближайшего ранга.
+
+    Аргументы:
+        values (list): Значения.
+        q (float): Перцентиль от 0 до 100.
+
+    Возвращает:
+        float: Значение перцентиля или 0 для пустого списка.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(q / 100 * len(values)) - 1))]
+
+
+class Student:
+    """
+    Ученик, от имени которого драйвер отправляет обновления.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя Telegram.
+        grade (int): Цифра класса.
+        letter (str): Буква класса.
+        group (int): Группа класса, 0 или 1.
+        u_group (int): Группа универ-дня.
+    """
+    def __init__(self, user_id: int, grade: int, letter: str, group: int, u_group: int) -> None:
+        self.user_id = user_id
+        self.grade = grade
+        self.letter = letter
+        self.group = group
+        self.u_group = u_group
+
+    def message(self, update_id: int, text: str) -> dict:
+        """
+        Функция, собирающая обновление с командой ученика.
+
+        Аргументы:
+            update_id (int): Идентификатор обновления.
+            text (str): Текст команды.
+
+        Возвращает:
+            dict: Обновление в формате Bot API.
+        """
+        return {'update_id': update_id, 'message': {
+            'message_id': update_id, 'date': int(time.time()), 'text': text,
+            'chat': {'id': self.user_id, 'type': 'private'},
+            'from': {'id': self.user_id, 'is_bot': False, 'first_name': 'ученик'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]}}
+
+    def callback(self, update_id: int, data: str, text: str = '') -> dict:
+        """
+        Функция, собирающая обновление с нажатием кнопки под сообщением бота.
+
+        Аргументы:
+            update_id (int): Идентификатор обновления.
+            data (str): callback_data кнопки.
+            text (str): Текст сообщения, под которым нажата кнопка.
+
+        Возвращает:
+            dict: Обновление в формате Bot API.
+        """
+        return {'update_id': update_id, 'callback_query': {
+            'id': str(update_id), 'chat_instance': str(self.user_id), 'data': data,
+            'from': {'id': self.user_id, 'is_bot': False, 'first_name': 'ученик'},
+            'message': {'message_id': 1, 'date': int(time.time()), 'text': text,
+                        'chat': {'id': self.user_id, 'type': 'private'}}}}
+
+    def registration(self) -> list:
+        """
+        Функция, возвращающая шаги регистрации: команду /start и нажатия кнопок до сохранения данных.
+
+        Возвращает:
+            list: Пары (тип обновления, данные).
+        """
+        return [('message', '/start'), ('callback', 'choice'), ('callback', str(self.grade)),
+                ('callback', f'class_letter={self.grade} {self.letter}'),
+                ('callback', f'class_group=группа {"АБ"[self.group]}'),
+                ('callback', f'univer_group={self.u_group}'), ('callback', 'done')]
+
+
+def make_students(count: int) -> list:
+    """
+    Функция, создающая учеников, равномерно распределённых по классам и группам.
+
+    Аргументы:
+        count (int): Количество учеников.
+
+    Возвращает:
+        list: Ученики.
+    """
+    from benchmarks.workbooks import LETTERS_10, LETTERS_11
+    students = []
+    for i in range(count):
+        grade = 10 if i % 2 == 0 else 11
+        letters = LETTERS_10 if grade == 10 else LETTERS_11
+        students.append(Student(100000 + i, grade, letters[i // 2 % len(letters)], i // 20 % 2,
+                                i % (12 if grade == 10 else 10) + 1))
+    return students
+
+
+class LoadDriver:
+    """
+    Драйвер нагрузки, который отправляет боту обновления от имени учеников и замеряет задержку обработчиков.
+
+    Задержка обработчика - время от отправки обновления до первого запроса бота к Bot API в чат ученика.
+    Каждый ученик проходит свои шаги последовательно: следующее обновление отправляется, когда бот ответил
+    на предыдущее, как это делает живой пользователь.
+
+    Аргументы:
+        deliver (callable): Функция доставки обновления боту: через очередь getUpdates или POST на вебхук.
+    """
+    def __init__(self, deliver: callable) -> None:
+        self.deliver = deliver
+        self.update_ids = iter(range(1, sys.maxsize))
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.steps = {}
+        self.latencies = []
+        self.last_answer = None
+        self.answered = queue.Queue()
+
+    def on_call(self, method: str, chat_id: int) -> None:
+        """
+        Функция, получающая от сервера Bot API уведомления о запросах бота в чаты.
+
+        Аргументы:
+            method (str): Метод Bot API.
+            chat_id (int): Идентификатор чата.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        with self.lock:
+            sent_at = self.pending.pop(chat_id, None)
+            if sent_at is None:
+                return
+            self.last_answer = time.perf_counter()
+            self.latencies.append(self.last_answer - sent_at)
+        self.answered.put(chat_id)
+
+    def send_next(self, student: Student) -> bool:
+        """
+        Функция отправки следующего шага ученика.
+
+        Аргументы:
+            student (Student): Ученик.
+
+        Возвращает:
+            bool: False если шаги ученика закончились.
+        """
+        steps = self.steps[student.user_id]
+        if not steps:
+            return False
+        kind, data = steps.pop(0)
+        update_id = next(self.update_ids)
+        update = student.message(update_id, data) if kind == 'message' else \
+            student.callback(update_id, data, 'выберите действие')
+        with self.lock:
+            self.pending[student.user_id] = time.perf_counter()
+        self.deliver(update)
+        return True
+
+    def run_phase(self, students: list, steps: callable, timeout: float) -> dict:
+        """
+        Функция прогона фазы нагрузки.
+
+        Первые шаги всех учеников отправляются сразу, как при утреннем всплеске, а следующие по мере ответов бота.
+
+        Аргументы:
+            students (list): Ученики.
+            steps (callable): Функция, возвращающая шаги ученика.
+            timeout (float): Максимальная длительность фазы в секундах.
+
+        Возвращает:
+            dict: Количество обновлений, ответов, перцентили задержки и пропускная способность.
+        """
+        by_id = {student.user_id: student for student in students}
+        self.steps = {student.user_id: steps(student) for student in students}
+        self.latencies = []
+        self.pending = {}
+        self.answered = queue.Queue()
+        self.last_answer = None
+        total = sum(len(student_steps) for student_steps in self.steps.values())
+        active = len(students)
+        start = time.perf_counter()
+        for student in students:
+            self.send_next(student)
+        deadline = start + timeout
+        while active:
+            try:
+                chat_id = self.answered.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if not self.send_next(by_id[chat_id]):
+                active -= 1
+        # фаза, в которой часть обновлений осталась без ответа, длится до таймаута, поэтому пропускная способность
+        # считается до последнего ответа
+        elapsed = (self.last_answer or time.perf_counter()) - start
+        latencies = [latency * 1000 for latency in self.latencies]
+        return {'updates': total, 'answered': len(latencies), 'unanswered': total - len(latencies),
+                'p50_ms': round(percentile(latencies, 50), 2), 'p99_ms': round(percentile(latencies, 99), 2),
+                'max_ms': round(max(latencies, default=0), 2), 'elapsed_s': round(elapsed, 2),
+                'updates_per_s': round(len(latencies) / elapsed, 1) if elapsed else 0}
+
+
+def post_update(url: str, update: dict, statuses: dict, attempts: int = 5) -> None:
+    """
+    Функция отправки обновления на вебхук бота.
+
+    Как и Telegram, функция повторяет доставку, если вебхук ответил ошибкой или не принял соединение.
+
+    Аргументы:
+        url (str): Адрес вебхука.
+        update (dict): Обновление.
+        statuses (dict): Счётчики ответов вебхука, 'error' для неудачных соединений.
+        attempts (int): Количество попыток доставки.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    request = urllib.request.Request(url, data=json.dumps(update, ensure_ascii=False).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    for attempt in range(attempts):
+        try:
+            with urllib.request.urlopen(request) as response:
+                status = response.status
+        except urllib.error.HTTPError as ex:
+            status = ex.code
+        except OSError:
+            status = 'error'
+        statuses[status] = statuses.get(status, 0) + 1
+        if status == 200:
+            return
+        time.sleep(0.5 * (attempt + 1))
+
+
+def wait_broadcasts(api, timeout: float) -> dict:
+    """
+    Функция ожидания завершения всех рассылок в очереди.
+
+    Аргументы:
+        api (FakeBotApi): Сервер Bot API.
+        timeout (float): Максимальное время ожидания в секундах.
+
+    Возвращает:
+        dict: Количество сообщений, длительность и скорость рассылок.
+    """
+    from db.models import broadcast_job
+    before = api.stats()['calls']
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if not broadcast_job.objects.exclude(status__in=['done', 'cancelled']).exists():
+            break
+        time.sleep(0.2)
+    elapsed = time.perf_counter() - start
+    after = api.stats()['calls']
+    messages = sum(after.get(method, 0) - before.get(method, 0) for method in ('sendMessage', 'sendPhoto'))
+    jobs = list(broadcast_job.objects.values('id', 'status', 'total', 'sent', 'failed', 'blocked'))
+    return {'messages': messages, 'elapsed_s': round(elapsed, 2),
+            'messages_per_s': round(messages / elapsed, 1) if elapsed else 0, 'jobs': jobs}
+
+
+def format_report(report: dict) -> str:
+    """
+    Функция форматирования результатов нагрузочного теста.
+
+    Аргументы:
+        report (dict): Результаты.
+
+    Возвращает:
+        str: Результаты в виде текста.
+    """
+    lines = [f'commit {report["revision"]}, python {report["python"]}, режим {report["mode"]}, '
+             f'{report["students"]} учеников, задержка Bot API {report["latency_ms"]} мс, '
+             f'доля 429 {report["rate_limit"]}']
+    for name in ('registration', 'morning'):
+        phase = report[name]
+        lines.append(f'{name}: {phase["answered"]}/{phase["updates"]} обновлений за {phase["elapsed_s"]} с, '
+                     f'{phase["updates_per_s"]} обн./с, p50 {phase["p50_ms"]} мс, p99 {phase["p99_ms"]} мс, '
+                     f'max {phase["max_ms"]} мс')
+    broadcast = report['broadcast']
+    lines.append(f'broadcast: {broadcast["messages"]} сообщений за {broadcast["elapsed_s"]} с, '
+                 f'{broadcast["messages_per_s"]} сообщ./с')
+    if report['webhook']:
+        lines.append(f'ответы вебхука: {report["webhook"]}')
+    lines.append(f'Bot API: {report["api"]["calls"]}, ответов 429: {report["api"]["rate_limited"]}')
+    lines.append(f'ограничители: {report["throttling"]}')
+    for name, summary_lines in report['metrics'].items():
+        lines += [f'{name}:'] + [f'  {line}' for line in summary_lines]
+    return '\n'.join(lines)
+
+
+def free_port() -> int:
+    """
+    Функция выбора свободного порта.
+
+    Возвращает:
+        int: Номер порта.
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота на локальной замене Bot API')
+    parser.add_argument('--students', type=int, default=1000, help='количество учеников')
+    parser.add_argument('--mode', choices=['polling', 'webhook', 'async'], default='polling',
+                        help='long polling или вебхук синхронного бота либо long polling асинхронного бота')
+    parser.add_argument('--workers', type=int, default=8, help='количество обработчиков вебхука')
+    parser.add_argument('--latency', type=float, default=0.05, help='средняя задержка ответа Bot API в секундах')
+    parser.add_argument('--jitter', type=float, default=0.02, help='разброс задержки Bot API в секундах')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='доля запросов, на которые Bot API отвечает 429')
+    parser.add_argument('--broadcast-rate', type=float, default=None,
+                        help='лимит рассылки в сообщениях в секунду, по умолчанию лимит Telegram из broadcast.py')
+    parser.add_argument('--timeout', type=float, default=120, help='максимальная длительность фазы в секундах')
+    parser.add_argument('--output', help='файл, в который сохраняются результаты в формате json')
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    workdir = tempfile.mkdtemp(prefix='schedule-load-')
+    os.makedirs(os.path.join(workdir, 'uploads'))
+    sys.path.insert(0, REPO_DIR)
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN_APIKEY', '0:load')
+    os.chdir(workdir)
+    try:
+        from benchmarks.fake_api import FakeBotApi
+        from benchmarks.ingest import git_revision, setup_database
+        from benchmarks.workbooks import make_workbook
+        setup_database(os.path.join(workdir, 'load.sqlite3'), 0)
+        import bot
+        import broadcast
+        import ingestion
+        from jobs import start_worker, submit_job
+        from metrics import (db_seconds, handler_seconds, instrument_database, instrument_telegram, summary,
+                             telegram_seconds)
+        from throttling import throttling_stats
+        from webhook import serve_webhook
+
+        report = {'revision': git_revision(), 'python': platform.python_version(), 'mode': args.mode,
+                  'students': args.students, 'latency_ms': args.latency * 1000, 'rate_limit': args.rate_limit,
+                  'webhook': {}}
+        driver = LoadDriver(None)
+        api = FakeBotApi(latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                         on_call=driver.on_call)
+        api.start()
+        api.configure_telebot()
+        instrument_telegram()
+        instrument_database()
+        if args.broadcast_rate:
+            broadcast.global_bucket = broadcast.TokenBucket(args.broadcast_rate, args.broadcast_rate)
+        if args.mode == 'webhook':
+            # serve_webhook не сообщает порт, поэтому сервер вебхука поднимается на заранее выбранном свободном порту
+            port = free_port()
+            webhook = threading.Thread(target=serve_webhook, args=(bot.bot, '127.0.0.1', port), daemon=True,
+                                       kwargs={'workers': args.workers})
+            webhook.start()
+            senders = ThreadPoolExecutor(max_workers=32)
+            driver.deliver = lambda update: senders.submit(post_update, f'http://127.0.0.1:{port}/', update,
+                                                           report['webhook'])
+        elif args.mode == 'async':
+            import async_bot
+            from jobs import aworker_loop
+            from metrics import instrument_telegram_async
+            instrument_telegram_async()
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, daemon=True, name='async-bot').start()
+            asyncio.run_coroutine_threadsafe(async_bot.poll_updates(async_bot.UpdateRunner()), loop)
+            driver.deliver = api.push_update
+        else:
+            threading.Thread(target=bot.bot.polling, kwargs={'none_stop': True}, daemon=True).start()
+            driver.deliver = api.push_update
+
+        students = make_students(args.students)
+        report['registration'] = driver.run_phase(students, Student.registration, args.timeout)
+
+        # загрузка расписания на сегодня ставит в очередь уведомление всех учеников, рассылка начнётся позже
+        today = dt.date.today()
+        filename = f'{today.strftime("%d.%m")}.xlsx'
+        make_workbook(os.path.join('uploads', filename), today.weekday())
+        ingestion.main_schedule_parse(filename)
+        report['morning'] = driver.run_phase(students, lambda student: [('callback', 'get_schedule=today')],
+                                             args.timeout)
+
+        submit_job('all', 'Фото с олимпиады', photo=b'\xff\xd8\xff\xe0' + bytes(50000))
+        if args.mode == 'async':
+            asyncio.run_coroutine_threadsafe(aworker_loop(async_bot.abot), loop)
+        else:
+            start_worker(bot.bot)
+        report['broadcast'] = wait_broadcasts(api, args.timeout)
+        report['api'] = api.stats()
+        report['throttling'] = throttling_stats()
+        report['metrics'] = {'handlers': summary(handler_seconds), 'telegram': summary(telegram_seconds),
+                             'database': summary(db_seconds)}
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_report(report))
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
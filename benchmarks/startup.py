@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import importlib.util
+from benchmarks.ingest import REPO_DIR, git_revision
+
+
+# точки входа: (модуль, бюджет медианного времени импорта в мс, модули, которые не должны импортироваться при запуске).
+# Бюджеты взяты по замерам на одноядерном сервере (медианы bot ~460 мс, async_bot ~700 мс, admin_panel ~80 мс;
+# до выделения ingestion.py и отложенного импорта openpyxl и aiohttp импорт bot занимал ~700 мс) с запасом на шум
+TARGETS = [
+    ('bot', 600, ('openpyxl', 'aiohttp', 'ingestion', 'parsing')),
+    ('async_bot', 1000, ('openpyxl', 'ingestion', 'parsing')),
+    ('admin_panel', 200, ('django', 'telebot', 'openpyxl', 'aiohttp', 'ingestion')),
+]
+# код дочернего процесса: django настраивается на SQLite внутри замера, так как точки входа настраивают его
+# при импорте db.models, а настройки manage.py без реальной базы данных не проходят проверку
+CHILD = '''
+import sys, time, json
+start = time.perf_counter()
+import manage
+
+def init_django():
+    import django
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure(INSTALLED_APPS=['db'],
+                           DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}})
+        django.setup()
+
+manage.init_django = init_django
+__import__(sys.argv[1])
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({'ms': elapsed, 'modules': [name for name in sys.argv[2:] if name in sys.modules]}))
+'''
+
+
+def measure(module: str, forbidden: tuple, workdir: str) -> dict:
+    """
+    Функция замера импорта точки входа в новом процессе интерпретатора.
+
+    Аргументы:
+        module (str): Модуль точки входа.
+        forbidden (tuple): Модули, которые не должны импортироваться при запуске.
+        workdir (str): Рабочая папка процесса, в неё пишется logs.log.
+
+    Возвращает:
+        dict: Время импорта в мс (ms) и импортированные запрещённые модули (modules).
+    """
+    env = {**os.environ, 'PYTHONPATH': REPO_DIR, 'TELEGRAM_BOT_TOKEN_APIKEY': '0:benchmark',
+           'QT_QPA_PLATFORM': 'offscreen'}
+    result = subprocess.run([sys.executable, '-c', CHILD, module, *forbidden], cwd=workdir, env=env,
+                            capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f'{module}: {result.stderr.strip()}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_target(module: str, budget: float, forbidden: tuple, repeats: int, workdir: str) -> dict:
+    """
+    Функция прогона одной точки входа.
+
+    Первый запуск не замеряется: он компилирует байткод, который затем берётся из __pycache__, как при перезапуске
+    бота после падения.
+
+    Аргументы:
+        module (str): Модуль точки входа.
+        budget (float): Бюджет медианного времени импорта в мс.
+        forbidden (tuple): Модули, которые не должны импортироваться при запуске.
+        repeats (int): Количество замеряемых запусков.
+        workdir (str): Рабочая папка процессов.
+
+    Возвращает:
+        dict: Медиана, минимум и максимум времени импорта, бюджет, импортированные запрещённые модули и
+            флаг ok - уложился ли запуск в бюджет без запрещённых модулей.
+    """
+    measure(module, forbidden, workdir)
+    runs = [measure(module, forbidden, workdir) for _ in range(repeats)]
+    samples = [run['ms'] for run in runs]
+    loaded = sorted({name for run in runs for name in run['modules']})
+    median = statistics.median(samples)
+    return {'median_ms': round(median, 1), 'min_ms': round(min(samples), 1), 'max_ms': round(max(samples), 1),
+            'budget_ms': budget, 'forbidden_loaded': loaded, 'ok': median <= budget and not loaded}
+
+
+def format_report(report: dict, baseline: dict = None) -> str:
+    """
+    Функция форматирования результатов в таблицу.
+
+    Аргументы:
+        report (dict): Результаты прогона.
+        baseline (dict): Результаты прогона на другом коммите для сравнения медианного времени.
+
+    Возвращает:
+        str: Таблица результатов.
+    """
+    lines = [f'commit {report["revision"]}, python {report["python"]}, {report["repeats"]} запусков',
+             f'{"точка входа":<14}{"медиана, мс":>12}{"мин, мс":>10}{"макс, мс":>10}{"бюджет, мс":>12}'
+             + (f'{"было, мс":>10}{"изм.":>8}' if baseline else '') + '  итог']
+    for module, target in report['targets'].items():
+        if target is None:
+            lines.append(f'{module:<14}{"пропущено: PyQt6 не установлен":>44}')
+            continue
+        line = (f'{module:<14}{target["median_ms"]:>12.1f}{target["min_ms"]:>10.1f}{target["max_ms"]:>10.1f}'
+                f'{target["budget_ms"]:>12.0f}')
+        if baseline:
+            old = ((baseline.get('targets') or {}).get(module) or {}).get('median_ms')
+            change = f'{(target["median_ms"] - old) / old * 100:+.0f}%' if old else '-'
+            line += (f'{old:>10.1f}' if old is not None else f'{"-":>10}') + f'{change:>8}'
+        if target['forbidden_loaded']:
+            line += f'  импортированы {", ".join(target["forbidden_loaded"])}'
+        else:
+            line += '  ok' if target['ok'] else '  превышен бюджет'
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Бенчмарк времени запуска бота и админ-панели')
+    parser.add_argument('--repeats', type=int, default=7, help='количество замеряемых запусков каждой точки входа')
+    parser.add_argument('--target', action='append', choices=[module for module, _, _ in TARGETS],
+                        help='замеряемые точки входа, по умолчанию все')
+    parser.add_argument('--budget', action='append', default=[], metavar='МОДУЛЬ=МС',
+                        help='бюджет времени импорта точки входа вместо заданного в TARGETS')
+    parser.add_argument('--output', help='файл, в который сохраняются результаты в формате json')
+    parser.add_argument('--compare', help='результаты другого коммита в формате json для сравнения')
+    args = parser.parse_args()
+    budgets = {module: float(ms) for module, ms in (budget.split('=') for budget in args.budget)}
+
+    report = {'revision': git_revision(), 'python': platform.python_version(), 'repeats': args.repeats,
+              'targets': {}}
+    # процессы работают во временной папке, чтобы bot.py не перезаписывал logs.log проекта
+    with tempfile.TemporaryDirectory(prefix='schedule-startup-') as workdir:
+        for module, budget, forbidden in TARGETS:
+            if args.target and module not in args.target:
+                continue
+            if module == 'admin_panel' and importlib.util.find_spec('PyQt6') is None:
+                report['targets'][module] = None
+                continue
+            report['targets'][module] = run_target(module, budgets.get(module, budget), forbidden, args.repeats,
+                                                   workdir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+    print(format_report(report, baseline))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    if not all(target['ok'] for target in report['targets'].values() if target):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import openpyxl
+from openpyxl.worksheet.worksheet import Worksheet
+
+
+LETTERS_10 = ['Μ', 'Σ', 'Ξ', 'Τ', 'Ο', 'Φ', 'Π', 'Х', 'Ρ', 'Ψ']
+LETTERS_11 = ['В', 'Η', 'Ζ', 'Θ', 'Г', 'Ε', 'Ι', 'К', 'Δ', 'Λ']
+TIMES = ['8:30-9:15', '9:25-10:10', '10:20-11:05', '11:25-12:10', '12:30-13:15', '13:35-14:20', '14:30-15:15',
+         '15:25-16:10']
+
+
+def fill_regular(sheet: Worksheet, grade: int, letters: list, lessons: int = 8, shared_every: int = 3) -> None:
+    """
+    Функция заполнения страницы обычным расписанием классов.
+
+    Страница повторяет раскладку реального файла: во второй строке объединённые заголовки классов, в третьей группы,
+    далее уроки, у которых каждый shared_every-й урок общий для обеих групп и занимает объединённую клетку.
+
+    Аргументы:
+        sheet (Worksheet): Заполняемая страница.
+        grade (int): Цифра класса.
+        letters (list): Буквы классов.
+        lessons (int): Количество уроков.
+        shared_every (int): Период общих уроков, 0 если все уроки разделены по группам.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    for i in range(lessons):
+        sheet.cell(4 + i, 2, i + 1)
+        sheet.cell(4 + i, 3, TIMES[i])
+    for k, letter in enumerate(letters):
+        col = 4 + 2 * k
+        sheet.cell(2, col, f'{grade} {letter}')
+        sheet.merge_cells(start_row=2, start_column=col, end_row=2, end_column=col + 1)
+        sheet.cell(3, col, 'гр.А')
+        sheet.cell(3, col + 1, 'гр. Б')
+        for i in range(lessons):
+            if shared_every and i % shared_every == 0:
+                sheet.cell(4 + i, col, f'Общий урок {i + 1} {letter}\n\nкаб. {100 + i}')
+                sheet.merge_cells(start_row=4 + i, start_column=col, end_row=4 + i, end_column=col + 1)
+            else:
+                sheet.cell(4 + i, col, f'Урок {i + 1} гр. А {letter}\n\nкаб. {200 + i}')
+                sheet.cell(4 + i, col + 1, f'Урок {i + 1} гр. Б {letter}\n\nкаб. {300 + i}')
+
+
+def fill_uday(sheet: Worksheet, grade: int, letters: list, top: int, groups: int) -> None:
+    """
+    Функция заполнения страницы расписанием универ-дня.
+
+    Сверху расположены пары групп универ-дня, под ними заголовки классов и уроки классов после универ-дня.
+
+    Аргументы:
+        sheet (Worksheet): Заполняемая страница.
+        grade (int): Цифра класса.
+        letters (list): Буквы классов.
+        top (int): Строка заголовков групп.
+        groups (int): Количество групп универ-дня.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    for i in range(6):
+        sheet.cell(top + 1 + i, 3, TIMES[i])
+    sheet.cell(top + 8, 3, TIMES[6])
+    sheet.cell(top + 9, 3, TIMES[7])
+    for group in range(groups):
+        col = 4 + 2 * group
+        sheet.cell(top, col, f'{group + 1} группа')
+        sheet.merge_cells(start_row=top, start_column=col, end_row=top, end_column=col + 1)
+        for i in range(6):
+            if i != 3:
+                sheet.cell(top + 1 + i, col, f'Пара {i + 1} группы {group + 1}\n\nауд. {400 + group}')
+                sheet.merge_cells(start_row=top + 1 + i, start_column=col, end_row=top + 1 + i, end_column=col + 1)
+        letter = letters[group % len(letters)]
+        sheet.cell(top + 7, col, f'{grade} {letter}')
+        sheet.merge_cells(start_row=top + 7, start_column=col, end_row=top + 7, end_column=col + 1)
+        sheet.cell(top + 8, col, f'Урок после универ-дня {letter}')
+        sheet.merge_cells(start_row=top + 8, start_column=col, end_row=top + 9, end_column=col)
+
+
+def add_noise_merges(sheet: Worksheet, count: int) -> None:
+    """
+    Функция, добавляющая объединённые клетки ниже сетки расписания.
+
+    Такие клетки не попадают в расписание, но их приходится читать при разборе объединённых диапазонов страницы.
+
+    Аргументы:
+        sheet (Worksheet): Страница.
+        count (int): Количество объединённых диапазонов.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    for i in range(count):
+        row, col = 20 + i // 13, 1 + 2 * (i % 13)
+        sheet.cell(row, col, f'примечание {i}')
+        sheet.merge_cells(start_row=row, start_column=col, end_row=row, end_column=col + 1)
+
+
+def add_typos(sheet: Worksheet, count: int) -> None:
+    """
+    Функция, исправляющая кабинет в первых count уроках страницы, как при исправлении опечатки в загруженном файле.
+
+    Аргументы:
+        sheet (Worksheet): Страница с расписанием.
+        count (int): Количество исправляемых уроков.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    for row in sheet.iter_rows(min_row=4):
+        for cell in row:
+            if count and isinstance(cell.value, str) and '\n\n' in cell.value:
+                cell.value += ' (исправлено)'
+                count -= 1
+
+
+def make_workbook(path: str, weekday: int, shared_every: int = 3, noise_merges: int = 0, extra_sheets: int = 0,
+                  typos: int = 0) -> None:
+    """
+    Функция создания синтетического файла расписания в раскладке реальных файлов.
+
+    В понедельник на странице 10-х классов универ-день, в среду универ-день на странице 11-х классов,
+    в остальные дни обе страницы содержат обычное расписание.
+
+    Аргументы:
+        path (str): Путь сохраняемого файла.
+        weekday (int): День недели расписания.
+        shared_every (int): Период общих для обеих групп уроков в обычном расписании.
+        noise_merges (int): Количество объединённых клеток вне сетки расписания на каждой странице классов.
+        extra_sheets (int): Количество посторонних страниц, заполненных числами.
+        typos (int): Количество уроков на странице 10-х классов, отличающихся от файла без исправлений.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    workbook = openpyxl.Workbook()
+    sheet_10 = workbook.active
+    sheet_10.title = '10'
+    sheet_11 = workbook.create_sheet('11')
+    if weekday == 0:
+        fill_uday(sheet_10, 10, LETTERS_10, 2, 12)
+    else:
+        fill_regular(sheet_10, 10, LETTERS_10, shared_every=shared_every)
+    if weekday == 2:
+        fill_uday(sheet_11, 11, LETTERS_11, 3, 10)
+    else:
+        fill_regular(sheet_11, 11, LETTERS_11, shared_every=shared_every)
+    add_noise_merges(sheet_10, noise_merges)
+    add_noise_merges(sheet_11, noise_merges)
+    add_typos(sheet_10, typos)
+    for n in range(extra_sheets):
+        sheet = workbook.create_sheet(f'лист {n + 1}')
+        for row in range(1, 500):
+            sheet.append([row * col for col in range(1, 30)])
+    workbook.save(path)
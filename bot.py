@@ -1,332 +1,239 @@
 import datetime as dt
+import argparse
 import telebot
-import openpyxl
-import time
 import os
-from cachetools import TTLCache
+import threading
+from functools import wraps
 from dotenv import load_dotenv
-from typing import Union
-from db.models import regular_schedule
-from db.models import uday_schedule
+# модули проекта читают настройки из переменных окружения при импорте, поэтому .env загружается до них
+load_dotenv()
 from db.models import users
-from telebot.apihelper import ApiTelegramException
+from clients import make_bot
+from jobs import job_progress, start_worker, submit_job
+from keyboards import (class_group_keyboard, class_letter_keyboard, class_number_keyboard, confirm_profile_keyboard,
+                       schedule_days_keyboard, start_keyboard, univer_group_keyboard)
+from logs import logging_metrics, setup_logging
+from metrics import (METRICS_PORT, db_seconds, handler_seconds, instrument_database, instrument_telegram,
+                     instrumented, register_collector, schedule_stage_seconds, serve_metrics, summary, telegram_seconds)
+from profiles import commit_draft, get_draft, get_profile
+from routing import CallbackRouter
+from retention import start_retention
+from schedule import get_schedule_text, invalidate_schedule_cache
+from throttling import callbacks_limiter, commands_limiter, throttled, throttling_metrics, throttling_stats
+from webhook import WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS, serve_webhook
 from telebot import types
 import logging
 
 
-logs_format = '%(asctime)s - %(filename)s:%(lineno)d - %(message)s'
-logging.basicConfig(level=logging.ERROR, filename='logs.log', filemode='w', format=logs_format)
-load_dotenv()
-bot = telebot.TeleBot(os.getenv('TELEGRAM_BOT_TOKEN_APIKEY'))
-messages_cache = TTLCache(maxsize=400, ttl=5)
-errors_cache = TTLCache(maxsize=10, ttl=100)
+# ошибки пишутся в logs.log фоновым потоком (logs.py), повторы одной ошибки за окно только считаются
+setup_logging()
+bot = make_bot()
+# файлы, отправленные одним сообщением-альбомом, приходят отдельными сообщениями с общим media_group_id
+MEDIA_GROUP_DELAY = 2.0
+# ответ на нажатие кнопки, отброшенное ограничителем частоты
+THROTTLED_TEXT = 'Слишком много запросов, попробуйте позже'
+media_groups = {}
+media_groups_lock = threading.Lock()
 
 
-def caching_decorator(func: callable) -> callable:
+@instrumented('confirm_notification')
+def confirm_notification(message: telebot.types.Message, recievers: str) -> None:
     """
-    Декоратор, кэширующий запросы пользователя к боту.
-
-    Декоратор ограничивает количество запросов от пользователя,
-    если запрос не был выполнен пользователем недвано выполняется оборачиваемая функция,
-    иначе функция не выполняется.
+    Функция подтверждения содержимого рассылаемого сообщения.
+        
+    Функция запрашивает у админа подтверждение запуска рассылки и в зависимости от ответа
+    запускает или отменяет рассылки.
 
     Аргументы:
-        func (callable): Декорируемая функция.
-    
+        message (telebot.types.Message): Сообщение отправленное ранее админом.
+        recievers (str): Получатели сообщения.
+
     Возвращает:
-        (callable): Декорированная функция, принимающая сообщение пользователя.
-        """
-    def wrapped(*args):
-        message = args[0]
-        user_id = message.from_user.id
-        if not messages_cache.get(user_id):
-            messages_cache[user_id] = True
-            return func(message)
-    return wrapped
+        None: Функция ничего не возвращает.
+    """
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(types.InlineKeyboardButton('отправить', callback_data=f'send={recievers}'),
+           types.InlineKeyboardButton('отмена', callback_data='back_to_admin'))
+    if message.photo:
+        text = message.caption if message.caption else ''
+        bot.send_photo(message.from_user.id, photo=message.photo[-1].file_id,
+                       caption=f'подвердите отправку сообщения\n>получатель:\n{recievers}\n>сообщение:\n{text}',
+                       reply_markup=kb)
+    else:
+        bot.send_message(message.from_user.id,
+                         f'подвердите отправку сообщения\n>получатель:\n{recievers}\n>сообщение:\n{message.text}',
+                         reply_markup=kb)
 
 
-def parent_of_merged_cell(cell: openpyxl.cell.cell.MergedCell) -> str:
+@instrumented('schedule_adding')
+def schedule_adding(message: telebot.types.Message) -> None:
     """
-    Функция, ищущая родителя объединённой клетки таблицы.
+    Функция получения файла с расписанием.
+    
+    Функция получает сообщение от админа, если оно содержит .xlsx файл или zip архив таких файлов - вызывает функцию
+    парсинга, иначе отправляет сообщение об ошибке. Модуль загрузки расписания ingestion вместе с openpyxl
+    импортируется при первой загрузке, а не при запуске бота.
 
     Аргументы:
-        cell (openpyxl.cell.cell.MergedCell): Объединённая клетка.
+        message (telebot.types.Message): Сообщение с файлом расписания отправленное админом.
     
     Возвращает:
-        str: Координаты родительской клетки.
+        None: Функция ничего не возвращает.
     """
-    sheet = cell.parent
-    child_coord = cell.coordinate
-    for merged in sheet.merged_cells.ranges:
-        if child_coord in merged:
-            return merged.start_cell.coordinate
+    from ingestion import archive_schedule_parse, main_schedule_parse
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton('вернуться к админ-панели', callback_data='back_to_admin'))
+    if message.content_type == 'document' and message.media_group_id:
+        buffer_schedule_file(message)
+    elif message.content_type == 'document' and message.document.file_name.endswith('.xlsx'):
+        file_name = download_schedule_file(message)
+        bot.send_message(message.from_user.id, main_schedule_parse(file_name), reply_markup=kb)
+    elif message.content_type == 'document' and message.document.file_name.endswith('.zip'):
+        # архив не сохраняется на диск: файлы распаковываются в память и передаются парсеру
+        file_info = bot.get_file(message.document.file_id)
+        bot.send_message(message.from_user.id, archive_schedule_parse(bot.download_file(file_info.file_path)),
+                         reply_markup=kb)
+    else:
+        kb.add(types.InlineKeyboardButton('попробовать ещё раз', callback_data='add_schedule'))
+        bot.send_message(message.from_user.id,
+                         'Файл с расписанием должен быть формата .xlsx или zip архивом файлов .xlsx, попробуйте снова',
+                         reply_markup=kb)
 
 
-def cell_value(cell: Union[openpyxl.cell.cell.Cell, openpyxl.cell.cell.MergedCell]) -> str:
+def download_schedule_file(message: telebot.types.Message) -> str:
     """
-    Функция возвращающая значение клетки.
+    Функция сохранения присланного файла с расписанием в папку uploads.
 
-    Функция проверяет тип клетки, возвращает её значение если это обычная клетка, ищет родительскую клетку
-    и возвращает её значение если клетка совмещённая.
-    
     Аргументы:
-        cell Union[openpyxl.cell.cell.Cell, openpyxl.cell.cell.MergedCell]: Клетка с искомым значением.
+        message (telebot.types.Message): Сообщение с файлом расписания.
 
     Возвращает:
-        str: Значение клетки.
+        str: Имя сохранённого файла.
     """
-    if isinstance(cell, openpyxl.cell.cell.Cell):
-        return cell.value
-    if isinstance(cell, openpyxl.cell.cell.MergedCell):
-        coord = parent_of_merged_cell(cell)
-        parent = cell.parent[coord]
-        return parent.value
+    file_name = message.document.file_name
+    file_info = bot.get_file(message.document.file_id)
+    downloaded_file = bot.download_file(file_info.file_path)
+    with open(f'uploads/{file_name}', 'wb') as new_file:
+        new_file.write(downloaded_file)
+    return file_name
 
 
-def regular_classes_schedule_parsing(date: dt.date, worksheet: openpyxl.worksheet.worksheet.Worksheet,
-                                     times_list: list, start_row: int, start_col: int, end_row: int,
-                                     end_col: int) -> None:
+def buffer_schedule_file(message: telebot.types.Message) -> None:
     """
-    функция парсинга обычного расписания классов.
+    Функция накопления файлов расписания, отправленных одним альбомом.
 
-    Функция итерируется по столбцам и клеткам столбца, читает расписание и сохраняет его в базу данных.
+    Функция сохраняет файл и откладывает загрузку альбома на MEDIA_GROUP_DELAY секунд после последнего файла,
+    после чего все файлы альбома загружаются одной пакетной загрузкой.
 
     Аргументы:
-        date (dt.date): Дата из файла с расписанием.
-        worksheet (openpyxl.worksheet.worksheet.Worksheet): Страница эксель файла.
-        times_list (list): Список с таймингами уроков.
-        start_row (int): Начальная строка итерации.
-        start_col (int): Начальный столбец итерации.
-        end_row (int): Конечная строка итерации.
-        end_col (int): Конечный столбец итерации.
+        message (telebot.types.Message): Сообщение с файлом из альбома.
 
     Возвращает:
-        None: функция ничего не возвращает.
+        None: Функция ничего не возвращает.
     """
-    for col in worksheet.iter_cols(min_row=start_row, min_col=start_col, max_row=end_row, max_col=end_col):
-        key = cell_value(col[0])
-        groups = ('гр.А', 'гр.Б')
-        group = groups.index(''.join(cell_value(col[1]).split()))
-        for i, cell in enumerate(col[2:]):
-            if cell_value(cell):
-                lesson_info = '\n'.join((times_list[i], '\n'.join(cell_value(cell).split('\n\n'))))
-                regular_schedule.objects.create(lesson_number=i, lesson_info=lesson_info, class_letter=key,
-                                                group_number=group, date=date)
+    with media_groups_lock:
+        group = media_groups.setdefault(message.media_group_id, {'chat_id': message.from_user.id, 'files': [],
+                                                                 'rejected': [], 'timer': None})
+    if message.document.file_name.endswith('.xlsx'):
+        file_name = download_schedule_file(message)
+    else:
+        file_name = None
+    with media_groups_lock:
+        if file_name:
+            group['files'].append(file_name)
+        else:
+            group['rejected'].append(message.document.file_name)
+        if group['timer']:
+            group['timer'].cancel()
+        group['timer'] = threading.Timer(MEDIA_GROUP_DELAY, flush_media_group, args=(message.media_group_id,))
+        group['timer'].daemon = True
+        group['timer'].start()
 
 
-def uday_groups_schedule_parsing(date: dt.date, worksheet: openpyxl.worksheet.worksheet.Worksheet,
-                                 times_list: list, start_row: int, start_col: int, end_row: int, end_col: int) -> None:
+def flush_media_group(media_group_id: str) -> None:
     """
-    функция парсинга расписания для групп на универдень.
-
-    Функция итерируется по столбцам и клеткам столбца, читает расписание и сохраняет его в базу данных.
+    Функция пакетной загрузки накопленного альбома файлов расписания.
 
     Аргументы:
-        date (dt.date): Дата из файла с расписанием.
-        worksheet (openpyxl.worksheet.worksheet.Worksheet): Страница эксель файла.
-        times_list (list): Список с таймингами уроков.
-        start_row (int): Начальная строка итерации.
-        start_col (int): Начальный столбец итерации.
-        end_row (int): Конечная строка итерации.
-        end_col (int): Конечный столбец итерации.
+        media_group_id (str): Идентификатор альбома.
 
     Возвращает:
-        None: функция ничего не возвращает.
+        None: Функция ничего не возвращает.
     """
-    done = set()
-    for col in worksheet.iter_cols(min_row=start_row, min_col=start_col, max_row=end_row, max_col=end_col):
-        group = int(cell_value(col[0]).split()[0])
-        if group in done:
-            continue
-        done.add(group)
-        for i, cell in enumerate(col[1:]):
-            if cell_value(cell):
-                lesson_info = '\n'.join((times_list[i], '\n'.join(cell_value(cell).split('\n\n'))))
-                uday_schedule.objects.create(lesson_number=i, lesson_info=lesson_info, group_number=group, date=date)
+    from ingestion import batch_schedule_parse
+    with media_groups_lock:
+        group = media_groups.pop(media_group_id, None)
+    if group is None:
+        return
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton('вернуться к админ-панели', callback_data='back_to_admin'))
+    lines = [f'{file_name}: файл с расписанием должен быть формата .xlsx' for file_name in group['rejected']]
+    text = batch_schedule_parse(group['files']) if group['files'] else 'Загружено файлов: 0'
+    bot.send_message(group['chat_id'], '\n'.join([text] + lines), reply_markup=kb)
 
 
-def uday_classes_schedule_parsing(date: dt.date, worksheet: openpyxl.worksheet.worksheet.Worksheet,
-                                  times_list: list, start_row: int, start_col: int, end_row: int, end_col: int) -> None:
+@bot.message_handler(content_types=['document'], func=lambda message: message.media_group_id in media_groups)
+@instrumented('schedule_adding')
+def schedule_album_adding(message: telebot.types.Message) -> None:
     """
-    функция парсинга расписания для классов на универдень.
-
-    Функция итерируется по столбцам и клеткам столбца, читает расписание и сохраняет его в базу данных.
+    Функция получения остальных файлов альбома, первый файл которого принят функцией schedule_adding.
 
     Аргументы:
-        date (dt.date): Дата из файла с расписанием.
-        worksheet (openpyxl.worksheet.worksheet.Worksheet): Страница эксель файла.
-        times_list (list): Список с таймингами уроков.
-        start_row (int): Начальная строка итерации.
-        start_col (int): Начальный столбец итерации.
-        end_row (int): Конечная строка итерации.
-        end_col (int): Конечный столбец итерации.
+        message (telebot.types.Message): Сообщение с файлом из альбома.
 
     Возвращает:
-        None: функция ничего не возвращает.
+        None: Функция ничего не возвращает.
     """
-    done = set()
-    for col in worksheet.iter_cols(min_row=start_row, min_col=start_col, max_row=end_row, max_col=end_col):
-        key = cell_value(col[0])
-        if key in done:
-            continue
-        done.add(key)
-        for i, cell in enumerate(col[1:]):
-            if cell_value(cell):
-                lesson_info = '\n'.join((times_list[i], '\n'.join(cell_value(cell).split('\n\n'))))
-                regular_schedule.objects.create(lesson_number=i, lesson_info=lesson_info, class_letter=key,
-                                                group_number=0, date=date)
+    buffer_schedule_file(message)
 
 
-def main_schedule_parse(filename: str) -> str:
+def profile_summary(user: users) -> str:
     """
-    Основная функция парсинга расписания.
-
-    Функция открывает файл с расписанием и вызывает вспомогательные функции для парсинга расписания в зависимости
-    от дня недели. В случае успешного парсинга функция рассылает пользователям уведомление о загрузке расписания.
+    Функция, возвращающая текст подтверждения выбранных класса и групп.
 
     Аргументы:
-        filename (str): Имя открываемого файла.
-    
+        user (users): Черновик профиля пользователя.
+
     Возвращает:
-        str: Сообщение об успехе или ошибке в ходе выполнения функции.
-
-    """
-    workbook = openpyxl.load_workbook(f'./uploads/{filename}')
-    os.remove(f'./uploads/{filename}')
-    today = dt.date.today()
-    old_date = today - dt.timedelta(days=2)
-    date = dt.datetime.strptime(f'{filename.split('.xlsx')[0]}{today.year}', "%d.%m%Y").date()
-    weekday = dt.date.weekday(date)
-    regular_schedule.objects.filter(date__lt=old_date).delete()
-    uday_schedule.objects.filter(date__lt=old_date).delete()
-    sh_10, sh_11 = None, None
-    for i, sh in enumerate(workbook.sheetnames):
-        if sh.strip() == '10':
-            sh_10 = i
-        elif sh.strip() == '11':
-            sh_11 = i
-        if sh_10 and sh_11:
-            break
-
-    #  удаление записей при повторной загрузке расписания
-    if regular_schedule.objects.filter(date=date).exists():
-        regular_schedule.objects.filter(date=date).delete()
-        uday_schedule.objects.filter(date=date).delete()
-
-    # париснг расписания 10-классников
-    try:
-        # универ-день
-        if weekday == 0:
-            sheet = workbook.worksheets[0] if not sh_10 else workbook.worksheets[sh_10]
-            times_10 = [cell_value(i).replace('\n', '') for i in sheet['c'][2:9] + sheet['c'][9:11] if cell_value(i)]
-            uday_groups_schedule_parsing(date, sheet, times_10[:6], 2, 4, 8, 27)
-            uday_classes_schedule_parsing(date, sheet, times_10[6:], 9, 4, 12, 27)
-
-        # все остальные дни недели
-        else:
-            sheet = workbook.worksheets[1] if not isinstance(sh_10, int) else workbook.worksheets[sh_10]
-            ls_num = max([int(cell_value(i)) for i in sheet['B'][3:14] if str(cell_value(i)) in '123456789'])
-            times_10 = [cell_value(i).replace('\n', '') for i in sheet['c'][3:3 + ls_num]]
-            regular_classes_schedule_parsing(date, sheet, times_10, 2, 4, 11, 23)
-    except Exception as ex:
-        regular_schedule.objects.filter(date=date).delete()
-        uday_schedule.objects.filter(date=date).delete()
-        logging.error(ex)
-        return f'Ошибка при парсинге расписания 10-х классов!\nОшибка:\n{ex}'
-
-    # парсинг расписания 11-классников:
-    # универ-день
-    try:
-        if weekday == 2:
-            sheet = workbook.worksheets[0] if not sh_11 else workbook.worksheets[sh_11]
-            times_11 = [cell_value(i).replace('\n', '') for i in sheet['c'][3:9] + sheet['c'][10:12] if cell_value(i)]
-            uday_groups_schedule_parsing(date, sheet, times_11[:6], 3, 4, 9, 23)
-            uday_classes_schedule_parsing(date, sheet, times_11[6:], 10, 4, 13, 23)
-
-        # все остальные дни недели
-        else:
-            sheet = workbook.worksheets[1] if not isinstance(sh_11, int) else workbook.worksheets[sh_11]
-            times_11 = [cell_value(i).replace('\n', '') for i in sheet['c'][3:11] if cell_value(i)]
-            regular_classes_schedule_parsing(date, sheet, times_11, 2, 4, 12, 23)
-    except Exception as ex:
-        regular_schedule.objects.filter(date=date).delete()
-        uday_schedule.objects.filter(date=date).delete()
-        logging.error(ex)
-        return f'Ошибка при парсинге расписания 11-х классов!\nОшибка:\n{ex}'
-
-    # рассылка уведомления о загрузке расписания
-    for user in users.objects.all():
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton('расписание на сегодня', callback_data='get_schedule=today'))
-        kb.add(types.InlineKeyboardButton('расписание на завтра', callback_data='get_schedule=tommorow'))
-        try:
-            bot.send_message(user.user_id, f'Загружено расписание на {date}', reply_markup=kb)
-        except ApiTelegramException as ex:
-            if ex.description == 'Forbidden: bot was blocked by the user':
-                user.delete()
-        time.sleep(0.036)
-    return 'Расписание сохранено успешно!'
+        str: Текст с выбранными классом, группой и группой универ-дня.
+    """
+    cl_letter, cl_group = user.class_letter, ['Гр. А', 'Гр. Б'][user.group_number]
+    return f'вы выбрали:\n{cl_letter} класс\n{cl_group}\n{user.u_group_number} группа универдня'
 
 
-def confirm_notification(message: telebot.types.Message, recievers: str) -> None:
+def schedule_day(payload: str) -> dt.date:
     """
-    Функция подтверждения содержимого рассылаемого сообщения.
-        
-    Функция запрашивает у админа подтверждение запуска рассылки и в зависимости от ответа
-    запускает или отменяет рассылки.
+    Функция, возвращающая дату расписания по данным кнопки.
 
     Аргументы:
-        message (telebot.types.Message): Сообщение отправленное ранее админом.
-        recievers (str): Получатели сообщения.
+        payload (str): День: 'today' или 'tommorow'.
 
     Возвращает:
-        None: Функция ничего не возвращает.
+        dt.date: Дата расписания.
     """
-    kb = types.InlineKeyboardMarkup(row_width=1)
-    kb.add(types.InlineKeyboardButton('отправить', callback_data=f'send={recievers}'),
-           types.InlineKeyboardButton('отмена', callback_data='back_to_admin'))
-    if message.photo:
-        photo_bytes = bot.download_file(bot.get_file(message.photo[-1].file_id).file_path)
-        text = message.caption if message.caption else ''
-        bot.send_photo(message.from_user.id, photo=photo_bytes,
-                       caption=f'подвердите отправку сообщения\n>получатель:\n{recievers}\n>сообщение:\n{text}',
-                       reply_markup=kb)
-    else:
-        bot.send_message(message.from_user.id,
-                         f'подвердите отправку сообщения\n>получатель:\n{recievers}\n>сообщение:\n{message.text}',
-                         reply_markup=kb)
+    return dt.date.today() if payload == 'today' else dt.date.today() + dt.timedelta(days=1)
 
 
-def schedule_adding(message: telebot.types.Message) -> None:
+def missing_schedule_notice(message_text: str, date: dt.date) -> str:
     """
-    Функция получения файла с расписанием.
-    
-    Функция получает сообщение от админа, если оно содержит .xlsx файл - вызывает функцию парсинга, иначе отправляет
-    сообщение об ошибке.
+    Функция, возвращающая текст сообщения о незагруженном расписании.
 
     Аргументы:
-        message (telebot.types.Message): Сообщение с файлом расписания отправленное админом.
-    
+        message_text (str): Текст сообщения с кнопками выбора дня.
+        date (dt.date): Дата расписания.
+
     Возвращает:
-        None: Функция ничего не возвращает.
+        str: Новый текст сообщения или None если сообщение уже сообщает об отсутствии расписания на эту дату.
     """
-    kb = types.InlineKeyboardMarkup()
-    kb.add(types.InlineKeyboardButton('вернуться к админ-панели', callback_data='back_to_admin'))
-    if message.content_type == 'document' and message.document.file_name.endswith('.xlsx'):
-        file_name = message.document.file_name
-        file_info = bot.get_file(message.document.file_id)
-        downloaded_file = bot.download_file(file_info.file_path)
-        with open(f'uploads/{file_name}', 'wb') as new_file:
-            new_file.write(downloaded_file)
-        bot.send_message(message.from_user.id, main_schedule_parse(file_name), reply_markup=kb)
-    else:
-        kb.add(types.InlineKeyboardButton('попробовать ещё раз', callback_data='add_schedule'))
-        bot.send_message(message.from_user.id, 'Файл с расписанием должен быть формата .xlsx, попробуйте снова',
-                         reply_markup=kb)
+    if message_text == 'выберите действие' or date.strftime("%d.%m") != \
+            message_text.split('расписание на ')[1][:5]:
+        return f'расписание на {date.strftime("%d.%m")} ещё не добавлено\nвыберите действие'
+    return None
 
 
 @bot.message_handler(commands=['get'])
-@caching_decorator
+@instrumented('get')
+@throttled(commands_limiter)
 def get(message: telebot.types.Message) -> None:
     """
     Функция ответа на запрос расписания.
@@ -339,15 +246,13 @@ def get(message: telebot.types.Message) -> None:
     Возвращает:
         None: Функция ничего не возвращает.
     """
-    if users.objects.filter(user_id=message.from_user.id).exists():
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton('расписание на сегодня', callback_data='get_schedule=today'))
-        kb.add(types.InlineKeyboardButton('расписание на завтра', callback_data='get_schedule=tommorow'))
-        bot.send_message(message.from_user.id, 'выберите действие', reply_markup=kb)
+    if get_profile(message.from_user.id):
+        bot.send_message(message.from_user.id, 'выберите действие', reply_markup=schedule_days_keyboard())
 
 
 @bot.message_handler(commands=['start', 'edit'])
-@caching_decorator
+@instrumented('start')
+@throttled(commands_limiter)
 def start(message: telebot.types.Message) -> None:
     """
     Функция обработки команд /start и /edit.
@@ -361,13 +266,14 @@ def start(message: telebot.types.Message) -> None:
         None: Функция ничего не возвращает.
     """
     command = message.text
-    if command == '/start' and not users.objects.filter(user_id=message.from_user.id).exists() or command == '/edit':
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton('начать', callback_data='choice'))
-        bot.send_message(message.from_user.id, 'Привет, давай определимся с твоими классом и группой', reply_markup=kb)
+    if command == '/start' and not get_profile(message.from_user.id) or command == '/edit':
+        bot.send_message(message.from_user.id, 'Привет, давай определимся с твоими классом и группой',
+                         reply_markup=start_keyboard())
 
 
 @bot.message_handler(commands=['admin'])
+@instrumented('admin')
+@throttled(commands_limiter)
 def admin_panel(message: telebot.types.Message) -> None:
     """
     Функция админ-панели.
@@ -389,186 +295,358 @@ def admin_panel(message: telebot.types.Message) -> None:
                          reply_markup=kb)
 
 
-@bot.callback_query_handler(func=lambda callback: True)
-def callback_message(callback: telebot.types.CallbackQuery) -> None:
+@bot.message_handler(commands=['stats'])
+@instrumented('stats')
+def stats(message: telebot.types.Message) -> None:
     """
-    Функция обработки пользовательских нажатий на кнопки.
+    Функция, отправляющая админу счётчики ограничителей частоты запросов и сводку метрик: самые затратные
+    обработчики, запросы к Bot API и базе данных и стадии загрузки расписания.
+
+    Аргументы:
+        message (telebot.types.Message): Сообщение отправленное пользователем.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    if str(message.from_user.id) == os.getenv('ADMIN_ID'):
+        lines = [f'{name}: пропущено {counters["allowed"]}, отброшено по лимиту пользователя '
+                 f'{counters["dropped_user"]}, по общему лимиту {counters["dropped_global"]}, '
+                 f'пользователей в ограничителе {counters["tracked_users"]}'
+                 for name, counters in throttling_stats().items()]
+        for title, histogram in (('Обработчики', handler_seconds), ('Bot API', telegram_seconds),
+                                 ('База данных', db_seconds), ('Загрузка расписания', schedule_stage_seconds)):
+            lines += ['', f'{title}:'] + (summary(histogram, top=5) or ['нет данных'])
+        bot.send_message(message.from_user.id, '\n'.join(lines))
+
 
-    Функция отвечает на запросы пользователя, сделанные посредством нажатий кнопок.
+def timed_route(name: str, handler: callable) -> callable:
+    """
+    Промежуточный обработчик маршрутов, замеряющий время каждого маршрута callback_message отдельно.
+    """
+    return instrumented(f'callback_message:{name}')(handler)
+
+
+def answer_throttled(callback: telebot.types.CallbackQuery) -> None:
+    """
+    Функция ответа на нажатие кнопки, отброшенное ограничителем частоты, чтобы кнопка не оставалась в состоянии
+    загрузки.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк пользователя.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    bot.answer_callback_query(callback.id, THROTTLED_TEXT)
+
+
+def throttled_route(name: str, handler: callable) -> callable:
+    """
+    Промежуточный обработчик маршрутов, ограничивающий частоту нажатий пользователя на кнопки.
+    """
+    return throttled(callbacks_limiter, on_drop=answer_throttled)(handler)
+
+
+def admin_route(name: str, handler: callable) -> callable:
+    """
+    Промежуточный обработчик маршрутов админ-панели, игнорирующий нажатия всех пользователей кроме админа.
+    """
+    @wraps(handler)
+    def wrapped(callback, payload):
+        if str(callback.from_user.id) == os.getenv('ADMIN_ID'):
+            return handler(callback, payload)
+    return wrapped
+
+
+callbacks_router = CallbackRouter(middleware=[timed_route, throttled_route])
+
+
+@callbacks_router.route('choice')
+def choose_class_number(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора цифры класса.
 
     Аргументы:
         callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
-    
+        payload (str): Данные кнопки после '='.
+
     Возвращает:
         None: Функция ничего не возвращает.
     """
-    # выбор цифры класса
-    if callback.data == 'choice':
-        keyboard = types.InlineKeyboardMarkup(row_width=2)
-        keyboard.add(types.InlineKeyboardButton('10', callback_data='10'),
-                     types.InlineKeyboardButton('11', callback_data='11'))
-        bot.edit_message_text('выберите класс', callback.from_user.id, callback.message.message_id,
-                              reply_markup=keyboard)
-
-    # выбор буквы класса
-    elif callback.data == '10' or callback.data == '11':
-        cl_num = callback.data
-        classes_11 = [('В(бета)', 'Η(эта)'), ('Ζ(дзeта)', 'Θ(тета)'), ('Г(гамма)', 'Ε(эпсилон)'),
-                      ('Ι(йота)', 'К(каппа)'), ('Δ(дельта)', 'Λ(лямбда)')]
-        classes_10 = [('Μ(мю)', 'Σ(сигма)'), ('Ξ(кси)', 'Τ(тау)'), ('Ο(омикрон)', 'Φ(фи)'), ('Π(пи)', 'Х(хи)'),
-                      ('Ρ(ро)', 'Ψ(пси)')]
-        classes = classes_10 if cl_num == '10' else classes_11
-        keyboard = types.InlineKeyboardMarkup(row_width=2)
-        for cl1, cl2 in classes:
-            keyboard.add(types.InlineKeyboardButton(cl1, callback_data=f'class_letter={cl_num} {cl1.split('(')[0]}'),
-                         types.InlineKeyboardButton(cl2, callback_data=f'class_letter={cl_num} {cl2.split('(')[0]}'))
-        bot.edit_message_text('выберите букву', callback.from_user.id, callback.message.message_id,
-                              reply_markup=keyboard)
-
-    # выбор группы класса
-    elif callback.data.startswith('class_letter'):
-        cl_letter = callback.data.split('=')[1]
-        user = users.objects.get_or_create(user_id=callback.from_user.id, defaults={'class_letter': ''})[0]
-        user.class_letter = cl_letter
-        user.save(update_fields=['class_letter'])
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(types.InlineKeyboardButton('группа А', callback_data='class_group=группа А'),
-                     types.InlineKeyboardButton('группа Б', callback_data='class_group=группа Б'))
-        bot.edit_message_text('выберите группу', callback.from_user.id, callback.message.message_id,
-                              reply_markup=keyboard)
-
-    # выбор группы на универ-день
-    elif callback.data.startswith('class_group'):
-        cl_group = callback.data.split('=')[1]
-        cl_group = 0 if cl_group == 'группа А' else 1
-        user = users.objects.get(user_id=callback.from_user.id)
-        user.group_number = cl_group
-        user.save(update_fields=['group_number'])
-        cl = user.class_letter.split()[0]
-        i, j = (6, 5) if cl == '11' else (7, 6)
-        keyboard = types.InlineKeyboardMarkup(row_width=2)
-        for i in range(1, i):
-            keyboard.add(types.InlineKeyboardButton(str(i), callback_data=f'univer_group={str(i)}'),
-                         types.InlineKeyboardButton(str(i + j), callback_data=f'univer_group={str(i + j)}'))
-        bot.edit_message_text('выберите группу универдня', callback.from_user.id, callback.message.message_id,
-                              reply_markup=keyboard)
-
-    # подтверждение данных
-    elif callback.data.startswith('univer_group'):
-        univer_group = int(callback.data.split('=')[1])
-        user = users.objects.get(user_id=callback.from_user.id)
-        user.u_group_number = univer_group
-        user.save(update_fields=['u_group_number'])
-        cl_letter, cl_group = user.class_letter, ['Гр. А', 'Гр. Б'][user.group_number]
-        kb = types.InlineKeyboardMarkup(row_width=1)
-        kb.add(types.InlineKeyboardButton('заполнить заново', callback_data='choice'),
-               types.InlineKeyboardButton('сохранить', callback_data='done'))
-        bot.edit_message_text(f'вы выбрали:\n{cl_letter} класс\n{cl_group}\n{univer_group} группа универдня',
+    bot.edit_message_text('выберите класс', callback.from_user.id, callback.message.message_id,
+                          reply_markup=class_number_keyboard())
+
+
+@callbacks_router.route('10', '11', name='class_number')
+def choose_class_letter(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора буквы класса, callback_data кнопки - цифра класса.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    bot.edit_message_text('выберите букву', callback.from_user.id, callback.message.message_id,
+                          reply_markup=class_letter_keyboard(callback.data))
+
+
+@callbacks_router.route('class_letter')
+def choose_class_group(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора группы класса.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Класс, например '10 Μ'.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    get_draft(callback.from_user.id).class_letter = payload
+    bot.edit_message_text('выберите группу', callback.from_user.id, callback.message.message_id,
+                          reply_markup=class_group_keyboard())
+
+
+@callbacks_router.route('class_group')
+def choose_univer_group(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора группы на универ-день.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Группа класса: 'группа А' или 'группа Б'.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    user = get_draft(callback.from_user.id)
+    user.group_number = 0 if payload == 'группа А' else 1
+    bot.edit_message_text('выберите группу универдня', callback.from_user.id, callback.message.message_id,
+                          reply_markup=univer_group_keyboard(user.class_letter))
+
+
+@callbacks_router.route('univer_group')
+def confirm_profile(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция подтверждения данных.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Номер группы универ-дня.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    user = get_draft(callback.from_user.id)
+    user.u_group_number = int(payload)
+    bot.edit_message_text(profile_summary(user), callback.from_user.id, callback.message.message_id,
+                          reply_markup=confirm_profile_keyboard())
+
+
+@callbacks_router.route('done')
+def save_profile(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция сохранения данных одной записью в бд и уведомления об успешном сохранении записи.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    if not commit_draft(callback.from_user.id):
+        bot.edit_message_text('Выбор устарел, давай заполним данные заново', callback.from_user.id,
+                              callback.message.message_id, reply_markup=start_keyboard())
+        return
+    bot.edit_message_text('Успешно сохранено!\n/edit - заполнить заново\n/get - получить расписание',
+                          callback.from_user.id, callback.message.message_id)
+
+
+@callbacks_router.route('add_schedule', middleware=(admin_route,))
+def request_schedule_file(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция запроса файла с расписанием.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton('назад', callback_data='back_to_admin'))
+    bot.edit_message_text('Отправьте файл чтобы добавить расписание', callback.from_user.id,
+                          callback.message.message_id, reply_markup=kb)
+    bot.register_next_step_handler(callback.message, schedule_adding)
+
+
+@callbacks_router.route('back_to_admin', middleware=(admin_route,))
+def back_to_admin(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция возврата к админ-панели.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    bot.clear_step_handler_by_chat_id(callback.message.chat.id)
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(types.InlineKeyboardButton('Добавить расписание', callback_data='add_schedule'),
+           types.InlineKeyboardButton('Сделать рассылку', callback_data='make_notification'))
+    if callback.message.photo:
+        bot.delete_message(callback.from_user.id, callback.message.id)
+        bot.send_message(callback.from_user.id,
+                         'Добро пожаловать в админ-панель! Выберите действие на клавиатуре', reply_markup=kb)
+    else:
+        bot.edit_message_text('Добро пожаловать в админ-панель! Выберите действие на клавиатуре',
                               callback.from_user.id, callback.message.message_id, reply_markup=kb)
 
-    # уведомление об успешном сохранении записи
-    elif callback.data == 'done':
-        kb = types.ReplyKeyboardMarkup()
+
+@callbacks_router.route('make_notification', middleware=(admin_route,))
+def choose_recievers(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция выбора адресатов рассылки.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Данные кнопки после '='.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    kb = types.InlineKeyboardMarkup(row_width=2)
+    kb.add(types.InlineKeyboardButton('10е классы', callback_data='ntf=10'),
+           types.InlineKeyboardButton('11е классы', callback_data='ntf=11'))
+    kb.add(types.InlineKeyboardButton('отправить всем', callback_data='ntf=all'))
+    kb.add(types.InlineKeyboardButton('назад', callback_data='back_to_admin'))
+    bot.edit_message_text('выберите получателя', callback.from_user.id, callback.message.message_id,
+                          reply_markup=kb)
+
+
+@callbacks_router.route('ntf', middleware=(admin_route,))
+def request_notification(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция запроса сообщения для рассылки.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Получатели рассылки: 'all' или цифра класса.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton('назад', callback_data='back_to_admin'))
+    bot.edit_message_text('Отправьте сообщение чтобы сделать рассылку', callback.from_user.id,
+                          callback.message.message_id, reply_markup=kb)
+    bot.register_next_step_handler(callback.message, confirm_notification, payload)
+
+
+@callbacks_router.route('send', middleware=(admin_route,))
+def send_notification(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция постановки рассылки в очередь.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): Получатели рассылки: 'all' или цифра класса.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    bot.delete_message(callback.from_user.id, callback.message.message_id)
+    message = callback.message
+    # изображение уже загружено в Telegram, поэтому рассылается по file_id без повторной загрузки
+    if message.photo:
+        text = message.caption.split('>сообщение:')[1] if message.caption else ''
+        photo_file_id = message.photo[-1].file_id
+    else:
+        text, photo_file_id = message.text.split('>сообщение:')[1], ''
+    progress = bot.send_message(callback.from_user.id, 'Рассылка ставится в очередь')
+    job = submit_job(payload, text, photo_file_id=photo_file_id, admin_id=callback.from_user.id,
+                     progress_message_id=progress.message_id)
+    bot.edit_message_text(job_progress(job), callback.from_user.id, progress.message_id)
+
+
+@callbacks_router.route('get_schedule')
+def send_schedule(callback: telebot.types.CallbackQuery, payload: str) -> None:
+    """
+    Функция отправки расписания.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+        payload (str): День: 'today' или 'tommorow'.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    date = schedule_day(payload)
+    user = get_profile(callback.from_user.id)
+    if not user:
+        return
+    schedule = get_schedule_text(user, date)
+    if schedule:
+        kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
         kb.row('/edit', '/get')
-        bot.edit_message_text('Успешно сохранено!\n/edit - заполнить заново\n/get - получить расписание',
-                              callback.from_user.id, callback.message.message_id)
-
-    # получение файла с расписанием
-    elif callback.data == 'add_schedule':
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton('назад', callback_data='back_to_admin'))
-        bot.edit_message_text('Отправьте файл чтобы добавить расписание', callback.from_user.id,
-                              callback.message.message_id, reply_markup=kb)
-        bot.register_next_step_handler(callback.message, schedule_adding)
-
-    # возврат к админ-панели
-    elif callback.data == 'back_to_admin':
-        bot.clear_step_handler_by_chat_id(callback.message.chat.id)
-        kb = types.InlineKeyboardMarkup(row_width=1)
-        kb.add(types.InlineKeyboardButton('Добавить расписание', callback_data='add_schedule'),
-               types.InlineKeyboardButton('Сделать рассылку', callback_data='make_notification'))
-        if callback.message.photo:
-            bot.delete_message(callback.from_user.id, callback.message.id)
-            bot.send_message(callback.from_user.id,
-                             'Добро пожаловать в админ-панель! Выберите действие на клавиатуре', reply_markup=kb)
-        else:
-            bot.edit_message_text('Добро пожаловать в админ-панель! Выберите действие на клавиатуре',
-                                  callback.from_user.id, callback.message.message_id, reply_markup=kb)
-
-    # выбор адресатов рассылки
-    elif callback.data == 'make_notification':
-        kb = types.InlineKeyboardMarkup(row_width=2)
-        kb.add(types.InlineKeyboardButton('10е классы', callback_data='ntf=10'),
-               types.InlineKeyboardButton('11е классы', callback_data='ntf=11'))
-        kb.add(types.InlineKeyboardButton('отправить всем', callback_data='ntf=all'))
-        kb.add(types.InlineKeyboardButton('назад', callback_data='back_to_admin'))
-        bot.edit_message_text('выберите получателя', callback.from_user.id, callback.message.message_id,
-                              reply_markup=kb)
-
-    # запрос сообщения для рассылки
-    elif callback.data.startswith('ntf'):
-        recievers = callback.data.split('=')[1]
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton('назад', callback_data='back_to_admin'))
-        bot.edit_message_text('Отправьте сообщение чтобы сделать рассылку', callback.from_user.id,
-                              callback.message.message_id, reply_markup=kb)
-        bot.register_next_step_handler(callback.message, confirm_notification, recievers)
-
-    # рассылка сообщения
-    elif callback.data.startswith('send'):
-        bot.delete_message(callback.from_user.id, callback.message.message_id)
-        recievers = users.objects.all() if callback.data.split('=')[1] == 'all' else users.objects.filter(
-            class_letter__startswith=callback.data.split('=')[1])
-        message = callback.message
-        text = message.caption.split('>сообщение:')[1] if message.photo and message.caption else ''
-        photo_bytes = bot.download_file(bot.get_file(message.photo[-1].file_id).file_path) if message.photo else None
-        for user in recievers:
-            try:
-                if photo_bytes:
-                    bot.send_photo(user.user_id, caption=text, photo=photo_bytes)
-                else:
-                    bot.send_message(user.user_id, message.text.split('>сообщение:')[1])
-            except ApiTelegramException as ex:
-                if ex.description == 'Forbidden: bot was blocked by the user':
-                    user.delete()
-            time.sleep(0.036)
-
-    # отправка расписания
-    elif callback.data.startswith('get_schedule'):
-        day = callback.data.split('=')[1]
-        kb = types.InlineKeyboardMarkup()
-        kb.add(types.InlineKeyboardButton('расписание на сегодня', callback_data='get_schedule=today'))
-        kb.add(types.InlineKeyboardButton('расписание на завтра', callback_data='get_schedule=tommorow'))
-        date = dt.date.today() if day == 'today' else dt.date.today() + dt.timedelta(days=1)
-        user = users.objects.get(user_id=callback.from_user.id)
-        uday_flag = True if user.class_letter.startswith('11') and date.weekday() == 2 or user.class_letter.startswith(
-            '10') and date.weekday() == 0 else False
-        gr_num = 0 if uday_flag else user.group_number
-        schedule_list = []
-        if uday_schedule.objects.filter(date=date).exists() and uday_flag:
-            schedule_list.append('\n\n'.join(
-                [row.lesson_info for row in uday_schedule.objects.filter(group_number=user.u_group_number, date=date)]))
-        if regular_schedule.objects.filter(date=date).exists():
-            schedule_list.append('\n\n'.join([row.lesson_info for row in
-                                              regular_schedule.objects.filter(class_letter=user.class_letter,
-                                                                              group_number=gr_num, date=date)]))
-        if schedule_list:
-            kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
-            kb.row('/edit', '/get')
-            bot.send_message(callback.from_user.id, '\n\n'.join(schedule_list), reply_markup=kb)
-            bot.delete_message(callback.from_user.id, callback.message.id)
-        elif callback.message.text == 'выберите действие' or date.strftime("%d.%m") != \
-                callback.message.text.split('расписание на ')[1][:5]:
-            bot.edit_message_text(f'расписание на {date.strftime("%d.%m")} ещё не добавлено\nвыберите действие',
-                                  callback.from_user.id, callback.message.message_id, reply_markup=kb)
+        bot.send_message(callback.from_user.id, schedule, reply_markup=kb)
+        bot.delete_message(callback.from_user.id, callback.message.id)
+    elif notice := missing_schedule_notice(callback.message.text, date):
+        bot.edit_message_text(notice, callback.from_user.id, callback.message.message_id,
+                              reply_markup=schedule_days_keyboard())
+
+
+@bot.callback_query_handler(func=lambda callback: True)
+def callback_message(callback: telebot.types.CallbackQuery) -> None:
+    """
+    Функция обработки пользовательских нажатий на кнопки.
+
+    Функция передаёт нажатие обработчику маршрута из callbacks_router, который замеряет время и ограничивает
+    частоту нажатий каждого маршрута.
+
+    Аргументы:
+        callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    callbacks_router.dispatch(callback)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Телеграм бот школьного расписания')
+    parser.add_argument('--mode', choices=['polling', 'webhook'], default=os.getenv('BOT_MODE', 'polling'),
+                        help='получение обновлений long polling или через локальный http-сервер вебхука')
+    parser.add_argument('--host', default=os.getenv('WEBHOOK_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('WEBHOOK_PORT', 8443)))
+    parser.add_argument('--url', default=os.getenv('WEBHOOK_URL'), help='публичный адрес вебхука для Telegram')
+    parser.add_argument('--secret-token', default=os.getenv('WEBHOOK_SECRET_TOKEN'))
+    parser.add_argument('--workers', type=int, default=WEBHOOK_WORKERS, help='количество обработчиков обновлений')
+    parser.add_argument('--queue-size', type=int, default=WEBHOOK_QUEUE_SIZE,
+                        help='ёмкость очереди обновлений, при переполнении сервер отвечает 503')
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('METRICS_PORT', METRICS_PORT)),
+                        help='порт локального http-сервера метрик в формате Prometheus, 0 чтобы не запускать')
+    args = parser.parse_args()
+    instrument_telegram()
+    instrument_database()
+    register_collector(throttling_metrics)
+    register_collector(logging_metrics)
+    if args.metrics_port:
+        serve_metrics('127.0.0.1', args.metrics_port)
+    start_worker(bot)
+    start_retention(on_purge=lambda before: invalidate_schedule_cache(before=before))
     while True:
         try:
-            bot.polling(none_stop=True)
+            if args.mode == 'webhook':
+                serve_webhook(bot, args.host, args.port, args.workers, args.queue_size, args.url, args.secret_token)
+            else:
+                bot.polling(none_stop=True)
         except Exception as ex:
-            error_name = ex.__class__.__name__
-            if not errors_cache.get(error_name):
-                errors_cache[error_name] = True
-                logging.error(ex)
+            logging.error(ex, exc_info=ex)
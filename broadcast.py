@@ -0,0 +1,297 @@
+import time
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from telebot.apihelper import ApiTelegramException
+
+
+# лимиты Telegram: около 30 сообщений в секунду на бота и не чаще одного сообщения в секунду в один чат
+GLOBAL_RATE = 30
+CHAT_INTERVAL = 1.0
+SENDERS = 8
+# отправители асинхронной рассылки - корутины, а не потоки, поэтому их может быть столько, сколько сообщений
+# успевает уйти за время ответа Telegram
+ASYNC_SENDERS = 64
+MAX_RETRIES = 3
+BLOCKED_DESCRIPTIONS = ('Forbidden: bot was blocked by the user', 'Forbidden: user is deactivated')
+
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты запросов по алгоритму token bucket.
+
+    Аргументы:
+        rate (float): Скорость пополнения корзины, токенов в секунду.
+        capacity (float): Ёмкость корзины, максимальный размер всплеска запросов.
+    """
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Функция, забирающая токен из корзины без ожидания.
+
+        Возвращает:
+            float: 0 если токен забран, иначе время в секундах, через которое стоит попробовать снова.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now < self.updated:
+                return self.updated - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self) -> None:
+        """
+        Функция ожидания свободного токена.
+
+        Функция блокирует вызывающий поток, пока в корзине не появится токен, и забирает его.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        while wait := self.reserve():
+            time.sleep(wait)
+
+    async def aacquire(self) -> None:
+        """
+        Асинхронная версия acquire, ожидающая токен без блокировки цикла событий.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        while wait := self.reserve():
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Функция приостановки выдачи токенов.
+
+        Используется при ответе 429 от Telegram: все отправители ждут retry_after секунд.
+
+        Аргументы:
+            seconds (float): Длительность паузы в секундах.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        with self.lock:
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+
+class ChatLimiter:
+    """
+    Ограничитель частоты сообщений в отдельный чат.
+
+    Аргументы:
+        interval (float): Минимальный интервал между сообщениями в один чат в секундах.
+    """
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.next_time = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, chat_id: int) -> float:
+        """
+        Функция, занимающая ближайшее свободное время отправки сообщения в чат.
+
+        Аргументы:
+            chat_id (int): Идентификатор чата.
+
+        Возвращает:
+            float: Время в секундах, через которое можно отправить сообщение.
+        """
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time.get(chat_id, 0))
+            self.next_time[chat_id] = start + self.interval
+            if len(self.next_time) > 10000:
+                self.next_time = {key: value for key, value in self.next_time.items() if value > now}
+        return start - now
+
+    def acquire(self, chat_id: int) -> None:
+        """
+        Функция ожидания возможности отправить сообщение в чат.
+
+        Аргументы:
+            chat_id (int): Идентификатор чата.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        wait = self.reserve(chat_id)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, chat_id: int) -> None:
+        """
+        Асинхронная версия acquire.
+
+        Аргументы:
+            chat_id (int): Идентификатор чата.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        wait = self.reserve(chat_id)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+chat_limiter = ChatLimiter(CHAT_INTERVAL)
+
+
+def deliver(chat_id: int, send: callable) -> str:
+    """
+    Функция отправки одного сообщения с соблюдением лимитов.
+
+    Функция ждёт разрешения глобального и чатового ограничителей и вызывает send. При ответе 429 вся рассылка
+    приостанавливается на retry_after секунд, после чего отправка повторяется.
+
+    Аргументы:
+        chat_id (int): Идентификатор чата получателя.
+        send (callable): Функция, отправляющая сообщение в чат с переданным идентификатором.
+
+    Возвращает:
+        str: Результат отправки: 'sent', 'blocked' или 'failed'.
+    """
+    for _ in range(MAX_RETRIES + 1):
+        chat_limiter.acquire(chat_id)
+        global_bucket.acquire()
+        try:
+            send(chat_id)
+            return 'sent'
+        except ApiTelegramException as ex:
+            if ex.error_code == 429:
+                pause_on_429(ex)
+                continue
+            return 'blocked' if ex.description in BLOCKED_DESCRIPTIONS else 'failed'
+        except Exception as ex:
+            logging.error(ex)
+            return 'failed'
+    return 'failed'
+
+
+async def adeliver(chat_id: int, send: callable) -> str:
+    """
+    Асинхронная версия deliver: ожидание ограничителей и отправка не блокируют цикл событий.
+
+    Аргументы:
+        chat_id (int): Идентификатор чата получателя.
+        send (callable): Корутинная функция, отправляющая сообщение в чат с переданным идентификатором.
+
+    Возвращает:
+        str: Результат отправки: 'sent', 'blocked' или 'failed'.
+    """
+    # асинхронный клиент telebot тянет за собой aiohttp, который не нужен синхронному боту и админ-панели
+    from telebot import asyncio_helper
+    for _ in range(MAX_RETRIES + 1):
+        await chat_limiter.aacquire(chat_id)
+        await global_bucket.aacquire()
+        try:
+            await send(chat_id)
+            return 'sent'
+        except asyncio_helper.ApiTelegramException as ex:
+            if ex.error_code == 429:
+                pause_on_429(ex)
+                continue
+            return 'blocked' if ex.description in BLOCKED_DESCRIPTIONS else 'failed'
+        except Exception as ex:
+            logging.error(ex)
+            return 'failed'
+    return 'failed'
+
+
+def pause_on_429(ex: Exception) -> None:
+    """
+    Функция приостановки всей рассылки на retry_after секунд из ответа 429.
+
+    Аргументы:
+        ex (Exception): Исключение ApiTelegramException синхронного или асинхронного клиента telebot.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    global_bucket.pause((ex.result_json or {}).get('parameters', {}).get('retry_after', 1))
+
+
+def broadcast(chat_ids: list, send: callable, on_blocked: callable = None, senders: int = SENDERS) -> dict:
+    """
+    Функция рассылки сообщения пулом параллельных отправителей.
+
+    Аргументы:
+        chat_ids (list): Идентификаторы чатов получателей.
+        send (callable): Функция, отправляющая сообщение в чат с переданным идентификатором.
+        on_blocked (callable): Функция, получающая список чатов, заблокировавших бота или удалённых из Telegram.
+        senders (int): Количество параллельных отправителей.
+
+    Возвращает:
+        dict: Статистика рассылки: sent, failed, blocked, elapsed (секунды) и rate (сообщений в секунду).
+    """
+    chat_ids = list(chat_ids)
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=senders) as executor:
+        results = list(executor.map(lambda chat_id: deliver(chat_id, send), chat_ids))
+    blocked = [chat_id for chat_id, result in zip(chat_ids, results) if result == 'blocked']
+    if blocked and on_blocked:
+        on_blocked(blocked)
+    return broadcast_stats(results, start)
+
+
+async def abroadcast(chat_ids: list, send: callable, on_blocked: callable = None,
+                     senders: int = ASYNC_SENDERS) -> dict:
+    """
+    Асинхронная версия broadcast: сообщения отправляют до senders корутин в одном потоке.
+
+    Аргументы:
+        chat_ids (list): Идентификаторы чатов получателей.
+        send (callable): Корутинная функция, отправляющая сообщение в чат с переданным идентификатором.
+        on_blocked (callable): Корутинная функция, получающая список чатов, заблокировавших бота.
+        senders (int): Количество одновременных отправок.
+
+    Возвращает:
+        dict: Статистика рассылки, см. broadcast.
+    """
+    chat_ids = list(chat_ids)
+    start = time.monotonic()
+    semaphore = asyncio.Semaphore(senders)
+
+    async def deliver_limited(chat_id):
+        async with semaphore:
+            return await adeliver(chat_id, send)
+
+    results = await asyncio.gather(*(deliver_limited(chat_id) for chat_id in chat_ids))
+    blocked = [chat_id for chat_id, result in zip(chat_ids, results) if result == 'blocked']
+    if blocked and on_blocked:
+        await on_blocked(blocked)
+    return broadcast_stats(results, start)
+
+
+def broadcast_stats(results: list, start: float) -> dict:
+    """
+    Функция подсчёта статистики рассылки.
+
+    Аргументы:
+        results (list): Результаты отправки каждому получателю: 'sent', 'blocked' или 'failed'.
+        start (float): Время начала рассылки time.monotonic().
+
+    Возвращает:
+        dict: Статистика рассылки: sent, failed, blocked, elapsed (секунды) и rate (сообщений в секунду).
+    """
+    stats = {'sent': 0, 'failed': 0, 'blocked': 0}
+    for result in results:
+        stats[result] += 1
+    stats['elapsed'] = time.monotonic() - start
+    stats['rate'] = stats['sent'] / stats['elapsed'] if stats['elapsed'] else 0
+    return stats
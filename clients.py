@@ -0,0 +1,38 @@
+import os
+import telebot
+
+
+def make_bot() -> telebot.TeleBot:
+    """
+    Функция создания синхронного бота.
+
+    Адрес Bot API можно подменить переменной окружения TELEGRAM_API_URL, например локальным сервером
+    benchmarks/fake_api.py для нагрузочного тестирования.
+
+    Возвращает:
+        telebot.TeleBot: Бот с токеном из TELEGRAM_BOT_TOKEN_APIKEY.
+    """
+    api_url = os.getenv('TELEGRAM_API_URL')
+    if api_url:
+        telebot.apihelper.API_URL = f'{api_url}/bot{{0}}/{{1}}'
+        telebot.apihelper.FILE_URL = f'{api_url}/file/bot{{0}}/{{1}}'
+    return telebot.TeleBot(os.getenv('TELEGRAM_BOT_TOKEN_APIKEY'))
+
+
+def make_async_bot() -> 'telebot.async_telebot.AsyncTeleBot':
+    """
+    Функция создания асинхронного бота.
+
+    Асинхронный клиент telebot импортируется только здесь, так как он тянет за собой aiohttp, который не нужен
+    синхронному боту и админ-панели.
+
+    Возвращает:
+        telebot.async_telebot.AsyncTeleBot: Асинхронный бот с токеном из TELEGRAM_BOT_TOKEN_APIKEY.
+    """
+    from telebot import asyncio_helper
+    from telebot.async_telebot import AsyncTeleBot
+    api_url = os.getenv('TELEGRAM_API_URL')
+    if api_url:
+        asyncio_helper.API_URL = f'{api_url}/bot{{0}}/{{1}}'
+        asyncio_helper.FILE_URL = f'{api_url}/file/bot{{0}}/{{1}}'
+    return AsyncTeleBot(os.getenv('TELEGRAM_BOT_TOKEN_APIKEY'))
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='regular_schedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lesson_number', models.IntegerField()),
+                ('lesson_info', models.TextField()),
+                ('class_letter', models.CharField(max_length=255)),
+                ('group_number', models.IntegerField()),
+                ('date', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='uday_schedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lesson_number', models.IntegerField()),
+                ('lesson_info', models.TextField()),
+                ('group_number', models.IntegerField()),
+                ('date', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='users',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('class_letter', models.CharField(blank=True, default=None)),
+                ('group_number', models.IntegerField(blank=True, default=0)),
+                ('u_group_number', models.IntegerField(blank=True, default=0)),
+            ],
+        ),
+    ]
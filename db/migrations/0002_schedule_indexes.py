@@ -0,0 +1,29 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='regular_schedule',
+            options={'ordering': ['lesson_number']},
+        ),
+        migrations.AlterModelOptions(
+            name='uday_schedule',
+            options={'ordering': ['lesson_number']},
+        ),
+        migrations.AddIndex(
+            model_name='regular_schedule',
+            index=models.Index(fields=['date', 'class_letter', 'group_number'], name='regular_date_class_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uday_schedule',
+            index=models.Index(fields=['date', 'group_number'], name='uday_date_group_idx'),
+        ),
+    ]
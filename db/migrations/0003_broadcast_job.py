@@ -0,0 +1,36 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0002_schedule_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='broadcast_job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recievers', models.CharField(max_length=255)),
+                ('text', models.TextField(blank=True, default='')),
+                ('photo', models.BinaryField(blank=True, null=True)),
+                ('reply_markup', models.TextField(blank=True, default='')),
+                ('admin_id', models.BigIntegerField(blank=True, null=True)),
+                ('progress_message_id', models.IntegerField(blank=True, null=True)),
+                ('status', models.CharField(default='pending', max_length=16)),
+                ('cursor', models.BigIntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('sent', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('blocked', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0003_broadcast_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast_job',
+            name='photo_file_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
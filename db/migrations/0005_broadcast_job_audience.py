@@ -0,0 +1,18 @@
+# Generated by Django 4.2.13 on 2026-10-17 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0004_broadcast_job_photo_file_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='broadcast_job',
+            name='audience',
+            field=models.TextField(blank=True, default=''),
+        ),
+    ]
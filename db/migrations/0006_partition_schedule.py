@@ -0,0 +1,76 @@
+# Секционирование таблиц расписания по дате в PostgreSQL: одна секция на день создаётся при загрузке расписания
+# (partitions.ensure_partitions), а устаревшие секции удаляются целиком фоновой очисткой (retention.py).
+# В остальных СУБД миграция ничего не делает.
+
+from django.db import migrations
+
+
+# таблица: (индекс модели, поля индекса)
+SCHEDULE_TABLES = {
+    'db_regular_schedule': ('regular_date_class_idx', 'date, class_letter, group_number'),
+    'db_uday_schedule': ('uday_date_group_idx', 'date, group_number'),
+}
+
+
+def replace_table(cursor, table: str, partitioned: bool) -> None:
+    """
+    Функция пересоздания таблицы расписания секционированной по дате или обычной с переносом строк.
+    """
+    index, fields = SCHEDULE_TABLES[table]
+    old = f'{table}_old'
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+    sequence, = cursor.fetchone()
+    cursor.execute(f'ALTER TABLE {table} RENAME TO {old}')
+    cursor.execute(f'ALTER INDEX {index} RENAME TO {index}_old')
+    cursor.execute(f'ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey')
+    if partitioned:
+        # первичный ключ секционированной таблицы обязан включать ключ секционирования
+        cursor.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY) '
+                       f'PARTITION BY RANGE (date)')
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, date)')
+        cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        cursor.execute(f'SELECT DISTINCT date FROM {old}')
+        for date, in cursor.fetchall():
+            cursor.execute(f'CREATE TABLE {table}_p{date.strftime("%Y%m%d")} PARTITION OF {table} '
+                           f'FOR VALUES FROM (%s) TO (%s::date + 1)', [date, date])
+    else:
+        cursor.execute(f'CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY)')
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+    cursor.execute(f'CREATE INDEX {index} ON {table} ({fields})')
+    cursor.execute(f'INSERT INTO {table} SELECT * FROM {old}')
+    # столбец id новой таблицы продолжает нумерацию старой: последовательность serial передаётся новой
+    # таблице, а новая identity-последовательность сдвигается за последний id
+    cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, 'id'])
+    new_sequence, = cursor.fetchone()
+    if new_sequence:
+        cursor.execute(f'SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)', [new_sequence])
+    elif sequence:
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+    cursor.execute(f'DROP TABLE {old} CASCADE')
+
+
+def partition_tables(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in SCHEDULE_TABLES:
+            replace_table(cursor, table, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in SCHEDULE_TABLES:
+            replace_table(cursor, table, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0005_broadcast_job_audience'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
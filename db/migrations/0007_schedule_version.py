@@ -0,0 +1,20 @@
+# Generated by Django 4.2.13 on 2026-10-17 03:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0006_partition_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='schedule_version',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('version', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -11,6 +11,10 @@ class regular_schedule(models.Model):
     group_number = models.IntegerField(blank=False)
     date = models.DateField(blank=False)
 
+    class Meta:
+        ordering = ['lesson_number']
+        indexes = [models.Index(fields=['date', 'class_letter', 'group_number'], name='regular_date_class_idx')]
+
 
 class uday_schedule(models.Model):
     lesson_number = models.IntegerField(blank=False)
@@ -18,9 +22,40 @@ class uday_schedule(models.Model):
     group_number = models.IntegerField(blank=False)
     date = models.DateField(blank=False)
 
+    class Meta:
+        ordering = ['lesson_number']
+        indexes = [models.Index(fields=['date', 'group_number'], name='uday_date_group_idx')]
+
 
 class users(models.Model):
     user_id = models.BigIntegerField(blank=False, primary_key=True)
     class_letter = models.CharField(blank=True, default=None)
     group_number = models.IntegerField(blank=True, default=0)
     u_group_number = models.IntegerField(blank=True, default=0)
+
+
+class broadcast_job(models.Model):
+    recievers = models.CharField(max_length=255, blank=False)
+    text = models.TextField(blank=True, default='')
+    photo = models.BinaryField(blank=True, null=True)
+    photo_file_id = models.CharField(max_length=255, blank=True, default='')
+    reply_markup = models.TextField(blank=True, default='')
+    audience = models.TextField(blank=True, default='')
+    admin_id = models.BigIntegerField(blank=True, null=True)
+    progress_message_id = models.IntegerField(blank=True, null=True)
+    status = models.CharField(max_length=16, blank=False, default='pending')
+    cursor = models.BigIntegerField(blank=False, default=0)
+    total = models.IntegerField(blank=False, default=0)
+    sent = models.IntegerField(blank=False, default=0)
+    failed = models.IntegerField(blank=False, default=0)
+    blocked = models.IntegerField(blank=False, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'updated_at'], name='job_status_idx')]
+
+
+class schedule_version(models.Model):
+    date = models.DateField(primary_key=True)
+    version = models.IntegerField(blank=False, default=0)
@@ -0,0 +1,438 @@
+import os
+import zipfile
+import logging
+import datetime as dt
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+from django.db import DatabaseError, transaction
+from db.models import regular_schedule
+from db.models import uday_schedule
+from db.models import users
+from db.models import broadcast_job
+from jobs import submit_job
+from keyboards import schedule_days_keyboard
+from metrics import schedule_stage_seconds
+from parsing import archive_members, reset_parse_pool, submit_schedule_parsing
+from partitions import ensure_partitions
+from schedule import bump_schedule_version, fill_schedule_cache, is_uday
+
+
+BULK_BATCH_SIZE = 500
+# уроки сравниваются при повторной загрузке расписания на дату по этим полям
+REGULAR_LESSON_KEY = ('class_letter', 'group_number', 'lesson_number')
+UDAY_LESSON_KEY = ('group_number', 'lesson_number')
+DIFF_REPORT_LINES = 20
+MESSAGE_MAX_LENGTH = 4096
+# включать ли изменившиеся уроки в уведомление об исправлении расписания
+NOTIFY_CHANGED_LESSONS = os.getenv('SCHEDULE_NOTIFY_LESSONS', '1') == '1'
+
+
+def schedule_date(filename: str, today: dt.date) -> dt.date:
+    """
+    Функция, определяющая дату расписания по имени файла вида дд.мм.xlsx.
+
+    Аргументы:
+        filename (str): Имя файла.
+        today (dt.date): Текущая дата, из которой берётся год.
+
+    Возвращает:
+        dt.date: Дата расписания.
+    """
+    return dt.datetime.strptime(f'{filename.split('.xlsx')[0]}{today.year}', "%d.%m%Y").date()
+
+
+def collect_schedule(futures: dict, date: dt.date) -> tuple:
+    """
+    Функция получения результатов разбора страниц файла.
+
+    Аргументы:
+        futures (dict): Словарь {цифра класса: Future}, возвращённый submit_schedule_parsing.
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        tuple: Несохранённые записи regular_schedule и uday_schedule и сообщение об ошибке или None.
+    """
+    wait(futures.values())
+    regular_rows, uday_rows = [], []
+    for grade, future in futures.items():
+        try:
+            grade_regular, grade_uday = future.result()
+        except Exception as ex:
+            if isinstance(ex, BrokenProcessPool):
+                reset_parse_pool()
+            logging.error(ex)
+            return [], [], f'Ошибка при парсинге расписания {grade}-х классов!\nОшибка:\n{ex}'
+        regular_rows += [regular_schedule(date=date, **row) for row in grade_regular]
+        uday_rows += [uday_schedule(date=date, **row) for row in grade_uday]
+    return regular_rows, uday_rows, None
+
+
+def apply_schedule_diff(model: type, date: dt.date, rows: list, key_fields: tuple) -> dict:
+    """
+    Функция записи в базу данных только изменившихся уроков одной модели на дату.
+
+    Функция сравнивает новые записи с сохранёнными по ключу key_fields и удаляет исчезнувшие уроки, обновляет
+    lesson_info изменившихся и добавляет новые. Если в файле или базе ключи повторяются, записи на дату
+    заменяются целиком.
+
+    Аргументы:
+        model (type): Модель regular_schedule или uday_schedule.
+        date (dt.date): Дата расписания.
+        rows (list): Несохранённые записи модели на дату.
+        key_fields (tuple): Поля, однозначно определяющие урок.
+
+    Возвращает:
+        dict: Ключи добавленных, изменённых и удалённых уроков, новые описания добавленных и изменённых уроков
+            и количество уроков до загрузки.
+    """
+    stored_rows = list(model.objects.filter(date=date).only('id', 'lesson_info', *key_fields))
+    stored = {tuple(getattr(row, field) for field in key_fields): row for row in stored_rows}
+    new = {tuple(getattr(row, field) for field in key_fields): row for row in rows}
+    if len(stored) != len(stored_rows) or len(new) != len(rows):
+        model.objects.filter(date=date).delete()
+        model.objects.bulk_create(rows, batch_size=BULK_BATCH_SIZE)
+        return {'added': list(new), 'changed': [], 'removed': list(stored), 'stored': len(stored_rows),
+                'lessons': {key: row.lesson_info for key, row in new.items()}}
+
+    removed = [key for key in stored if key not in new]
+    added = [key for key in new if key not in stored]
+    changed = [key for key in new if key in stored and stored[key].lesson_info != new[key].lesson_info]
+    if removed and len(removed) == len(stored):
+        model.objects.filter(date=date).delete()
+    else:
+        removed_ids = [stored[key].id for key in removed]
+        for start in range(0, len(removed_ids), BULK_BATCH_SIZE):
+            model.objects.filter(id__in=removed_ids[start:start + BULK_BATCH_SIZE]).delete()
+    for key in changed:
+        stored[key].lesson_info = new[key].lesson_info
+    model.objects.bulk_update([stored[key] for key in changed], ['lesson_info'], batch_size=BULK_BATCH_SIZE)
+    model.objects.bulk_create([new[key] for key in added], batch_size=BULK_BATCH_SIZE)
+    return {'added': added, 'changed': changed, 'removed': removed, 'stored': len(stored_rows),
+            'lessons': {key: new[key].lesson_info for key in added + changed}}
+
+
+def save_schedule(parsed: dict) -> tuple:
+    """
+    Функция сохранения разобранного расписания.
+
+    Расписание на все даты сохраняется одной транзакцией, поэтому пользователи никогда не видят частично
+    загруженное расписание, а при ошибке изменения откатываются целиком. При повторной загрузке файла на ту же
+    дату в базу записываются только изменившиеся уроки.
+
+    Аргументы:
+        parsed (dict): Словарь вида {дата: (записи regular_schedule, записи uday_schedule)}.
+
+    Возвращает:
+        tuple: Словарь вида {дата: {'regular': изменения, 'uday': изменения}}, см. apply_schedule_diff,
+            и сообщение об ошибке или None если расписание сохранено.
+    """
+    diffs, versions = {}, {}
+    try:
+        with schedule_stage_seconds.time(stage='save'):
+            # секции создаются до транзакции сохранения: откат сохранения не должен откатывать секцию,
+            # которую ensure_partitions уже запомнила
+            ensure_partitions(regular_schedule, list(parsed))
+            ensure_partitions(uday_schedule, list(parsed))
+            with transaction.atomic():
+                for date, (regular_rows, uday_rows) in parsed.items():
+                    diffs[date] = {
+                        'regular': apply_schedule_diff(regular_schedule, date, regular_rows, REGULAR_LESSON_KEY),
+                        'uday': apply_schedule_diff(uday_schedule, date, uday_rows, UDAY_LESSON_KEY),
+                    }
+                    # новая версия сбрасывает кэш расписания на дату во всех процессах бота
+                    if schedule_changed(diffs[date]):
+                        versions[date] = bump_schedule_version(date)
+    except DatabaseError as ex:
+        logging.error(ex)
+        return {}, f'Ошибка при сохранении расписания!\nОшибка:\n{ex}'
+    with schedule_stage_seconds.time(stage='cache'):
+        for date, (regular_rows, uday_rows) in parsed.items():
+            if date in versions:
+                fill_schedule_cache(date, regular_rows, uday_rows, versions[date])
+    return diffs, None
+
+
+def schedule_changed(diff: dict) -> bool:
+    """
+    Функция проверки, изменила ли загрузка расписание на дату.
+
+    Аргументы:
+        diff (dict): Изменения расписания на дату, см. save_schedule.
+
+    Возвращает:
+        bool: True если хотя бы один урок добавлен, изменён или удалён.
+    """
+    return any(changes[kind] for changes in diff.values() for kind in ('added', 'changed', 'removed'))
+
+
+def format_schedule_diff(date: dt.date, diff: dict) -> str:
+    """
+    Функция форматирования изменений повторно загруженного расписания для админа.
+
+    Аргументы:
+        date (dt.date): Дата расписания.
+        diff (dict): Изменения расписания на дату, см. save_schedule.
+
+    Возвращает:
+        str: Количество добавленных, изменённых и удалённых уроков и первые DIFF_REPORT_LINES из них.
+    """
+    counts = {kind: sum(len(changes[kind]) for changes in diff.values()) for kind in ('added', 'changed', 'removed')}
+    lines = [f'Изменения расписания на {date}: добавлено {counts["added"]}, изменено {counts["changed"]}, '
+             f'удалено {counts["removed"]}']
+    marks = {'added': '+', 'changed': '~', 'removed': '-'}
+    for kind, mark in marks.items():
+        for class_letter, group_number, lesson_number in diff['regular'][kind]:
+            lines.append(f'{mark} {class_letter}, гр. {group_number}, урок {lesson_number + 1}')
+        for group_number, lesson_number in diff['uday'][kind]:
+            lines.append(f'{mark} универ-группа {group_number}, пара {lesson_number + 1}')
+    if len(lines) > DIFF_REPORT_LINES + 1:
+        lines = lines[:DIFF_REPORT_LINES + 1] + [f'и ещё {len(lines) - DIFF_REPORT_LINES - 1}']
+    return '\n'.join(lines)
+
+
+def ingest_schedule(filenames: list) -> list:
+    """
+    Функция загрузки файлов с расписанием в базу данных.
+
+    Функция сразу ставит разбор всех файлов в пул процессов: страницы 10-х и 11-х классов каждого файла
+    разбираются параллельно. Расписание каждого файла сохраняется отдельно функцией
+    save_schedule.
+
+    Аргументы:
+        filenames (list): Имена файлов в папке uploads.
+
+    Возвращает:
+        list: Результаты по файлам в исходном порядке: кортежи (имя файла, дата, сообщение об ошибке или None,
+            изменения расписания на дату или None), см. save_schedule.
+    """
+    today = dt.date.today()
+    submitted = []
+    for filename in filenames:
+        try:
+            date = schedule_date(filename, today)
+        except ValueError:
+            submitted.append((filename, None, None))
+            continue
+        submitted.append((filename, date, submit_schedule_parsing(f'./uploads/{filename}', date)))
+
+    results = []
+    for filename, date, futures in submitted:
+        if futures is None:
+            os.remove(f'./uploads/{filename}')
+            results.append((filename, None, 'Имя файла должно быть датой расписания вида дд.мм.xlsx', None))
+            continue
+        try:
+            with schedule_stage_seconds.time(stage='parse'):
+                regular_rows, uday_rows, error = collect_schedule(futures, date)
+        finally:
+            os.remove(f'./uploads/{filename}')
+        if error:
+            results.append((filename, date, error, None))
+            continue
+        diffs, error = save_schedule({date: (regular_rows, uday_rows)})
+        results.append((filename, date, error, diffs.get(date)))
+    return results
+
+
+def changed_lessons(diff: dict) -> tuple:
+    """
+    Функция группировки изменившихся уроков по классам и группам универ-дня.
+
+    Аргументы:
+        diff (dict): Изменения расписания на дату, см. save_schedule.
+
+    Возвращает:
+        tuple: Словари вида {(класс, группа): [строки об изменениях]} и {группа универ-дня: [строки об изменениях]}.
+    """
+    regular, uday = {}, {}
+    marks = {'added': ('добавлен', 'добавлена'), 'changed': ('изменён', 'изменена'), 'removed': ('отменён', 'отменена')}
+    for kind, (mark, uday_mark) in marks.items():
+        for key in diff['regular'][kind]:
+            class_letter, group_number, lesson_number = key
+            info = diff['regular']['lessons'].get(key, '').replace('\n', ' ')
+            regular.setdefault((class_letter, group_number), []).append(
+                (lesson_number, f'урок {lesson_number + 1} {mark}' + (f': {info}' if info else '')))
+        for key in diff['uday'][kind]:
+            group_number, lesson_number = key
+            info = diff['uday']['lessons'].get(key, '').replace('\n', ' ')
+            uday.setdefault(group_number, []).append(
+                (lesson_number, f'пара {lesson_number + 1} {uday_mark}' + (f': {info}' if info else '')))
+    return ({key: [line for _, line in sorted(lines)] for key, lines in regular.items()},
+            {key: [line for _, line in sorted(lines)] for key, lines in uday.items()})
+
+
+def affected_profiles(diffs: dict) -> dict:
+    """
+    Функция, определяющая пользователей, у которых изменилось расписание, и текст уведомления для каждого из них.
+
+    Пользователи различаются комбинацией класса, группы и группы универ-дня, как в кэше расписаний. Для даты,
+    загруженной впервые, уведомление сообщает о загрузке расписания, а для повторно загруженной - перечисляет
+    изменившиеся уроки, если включено SCHEDULE_NOTIFY_LESSONS.
+
+    Аргументы:
+        diffs (dict): Изменения расписания по датам, см. save_schedule.
+
+    Возвращает:
+        dict: Словарь вида {(класс, группа, группа универ-дня): текст уведомления}.
+    """
+    changes = {date: changed_lessons(diff) for date, diff in sorted(diffs.items()) if schedule_changed(diff)}
+    texts = {}
+    for class_letter, group_number, u_group_number in users.objects.values_list(
+            'class_letter', 'group_number', 'u_group_number').distinct():
+        if not class_letter:
+            continue
+        sections = []
+        for date, (regular, uday) in changes.items():
+            uday_flag = is_uday(class_letter, date)
+            lines = regular.get((class_letter, 0 if uday_flag else group_number), [])
+            lines = (uday.get(u_group_number, []) if uday_flag else []) + lines
+            if not lines:
+                continue
+            if not any(model_diff['stored'] for model_diff in diffs[date].values()):
+                sections.append(f'Загружено расписание на {date}')
+            elif NOTIFY_CHANGED_LESSONS:
+                extra = [f'и ещё {len(lines) - DIFF_REPORT_LINES}'] if len(lines) > DIFF_REPORT_LINES else []
+                sections.append('\n'.join([f'Изменилось расписание на {date}:'] + lines[:DIFF_REPORT_LINES] + extra))
+            else:
+                sections.append(f'Изменилось расписание на {date}')
+        if sections:
+            texts[(class_letter, group_number, u_group_number)] = '\n\n'.join(sections)[:MESSAGE_MAX_LENGTH]
+    return texts
+
+
+def notify_schedule(diffs: dict) -> broadcast_job:
+    """
+    Функция постановки в очередь адресной рассылки уведомления о загрузке или изменении расписания.
+
+    Аргументы:
+        diffs (dict): Изменения расписания по датам, см. save_schedule.
+
+    Возвращает:
+        broadcast_job: Задание рассылки или None если изменения не затрагивают ни одного пользователя.
+    """
+    with schedule_stage_seconds.time(stage='notify'):
+        audience = affected_profiles(diffs)
+        if not audience:
+            return None
+        return submit_job('all', f'Загружено расписание на {", ".join(str(date) for date in sorted(diffs))}',
+                          reply_markup=schedule_days_keyboard().to_json(), audience=audience)
+
+
+def schedule_upload_report(diffs: dict) -> str:
+    """
+    Функция, ставящая в очередь уведомление о загруженном расписании и составляющая отчёт для админа.
+
+    Уведомление отправляется только пользователям, расписание которых изменилось, а для повторно загруженных дат
+    в отчёт добавляются изменения.
+
+    Аргументы:
+        diffs (dict): Изменения расписания по датам, см. save_schedule.
+
+    Возвращает:
+        str: Отчёт о загрузке.
+    """
+    lines = [format_schedule_diff(date, diff) for date, diff in sorted(diffs.items())
+             if any(changes['stored'] for changes in diff.values())]
+    changed = {date: diff for date, diff in diffs.items() if schedule_changed(diff)}
+    job = notify_schedule(changed) if changed else None
+    if job:
+        lines.append(f'Уведомление пользователей поставлено в очередь, рассылка #{job.id}')
+    elif changed:
+        lines.append('Изменения не затрагивают зарегистрированных пользователей, уведомление не отправлено')
+    else:
+        lines.append('Расписание не изменилось, уведомление пользователей не отправлено')
+    return '\n'.join(lines)
+
+
+def main_schedule_parse(filename: str) -> str:
+    """
+    Основная функция парсинга расписания.
+
+    Функция загружает файл с расписанием функцией ingest_schedule и в случае успешного сохранения ставит в очередь
+    рассылку уведомления о загрузке расписания. Если расписание на эту дату уже было загружено, админ получает
+    список изменившихся уроков.
+
+    Аргументы:
+        filename (str): Имя открываемого файла.
+
+    Возвращает:
+        str: Сообщение об успехе или ошибке в ходе выполнения функции.
+
+    """
+    [(_, date, error, diff)] = ingest_schedule([filename])
+    if error:
+        return error
+    return f'Расписание сохранено успешно!\n{schedule_upload_report({date: diff})}'
+
+
+def batch_schedule_parse(filenames: list) -> str:
+    """
+    Функция пакетной загрузки расписания на несколько дней, например на неделю перед каникулами.
+
+    Файлы разбираются параллельно, каждый файл сохраняется независимо от остальных, а об успешно загруженных
+    днях пользователи получают одно общее уведомление.
+
+    Аргументы:
+        filenames (list): Имена файлов в папке uploads.
+
+    Возвращает:
+        str: Общий отчёт о загрузке всех файлов.
+    """
+    results = ingest_schedule(filenames)
+    lines = [f'{filename}: ' + (error.replace('\n', ' ') if error else 'сохранено')
+             for filename, _, error, _ in results]
+    diffs = {date: diff for _, date, error, diff in results if not error}
+    if diffs:
+        lines.append(schedule_upload_report(diffs))
+    return f'Загружено файлов: {len(diffs)} из {len(results)}\n' + '\n'.join(lines)
+
+
+def archive_schedule_parse(data: bytes) -> str:
+    """
+    Функция загрузки zip архива с файлами расписания на несколько дней.
+
+    Архив распаковывается в память, и до разбора проверяются имена всех файлов. Содержимое файлов передаётся
+    в пул процессов без сохранения на диск, а расписание на все дни сохраняется одной транзакцией: если хотя бы
+    один файл не разобран, не сохраняется ничего. Пользователи получают одно уведомление обо всех днях.
+
+    Аргументы:
+        data (bytes): Содержимое архива.
+
+    Возвращает:
+        str: Сообщение об успехе или ошибке в ходе выполнения функции.
+    """
+    try:
+        members = archive_members(data)
+    except (zipfile.BadZipFile, ValueError) as ex:
+        return f'Ошибка при чтении архива!\nОшибка:\n{ex}'
+    today = dt.date.today()
+    dates = {}
+    for filename in members:
+        try:
+            date = schedule_date(filename, today) if filename.endswith('.xlsx') else None
+        except ValueError:
+            date = None
+        if date is None:
+            return f'Ошибка в архиве!\nИмя файла {filename} должно быть датой расписания вида дд.мм.xlsx'
+        if date in dates.values():
+            return f'Ошибка в архиве!\nРасписание на {date} встречается в архиве несколько раз'
+        dates[filename] = date
+    if not dates:
+        return 'Ошибка в архиве!\nВ архиве нет файлов с расписанием'
+
+    submitted = {filename: submit_schedule_parsing(members.pop(filename), date) for filename, date in dates.items()}
+    parsed = {}
+    for filename, futures in submitted.items():
+        with schedule_stage_seconds.time(stage='parse'):
+            regular_rows, uday_rows, error = collect_schedule(futures, dates[filename])
+        if error:
+            for other in submitted.values():
+                for future in other.values():
+                    future.cancel()
+            return f'{filename}: {error}\nРасписание из архива не сохранено'
+        parsed[dates[filename]] = (regular_rows, uday_rows)
+
+    diffs, error = save_schedule(parsed)
+    if error:
+        return error
+    return f'Расписание сохранено успешно!\nЗагружено дней: {len(parsed)}\n{schedule_upload_report(diffs)}'
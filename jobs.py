@@ -0,0 +1,564 @@
+import time
+import json
+import asyncio
+import itertools
+import threading
+import logging
+import datetime as dt
+from contextlib import contextmanager
+import telebot
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from django.db.models import Count
+from django.utils import timezone
+from telebot.apihelper import ApiTelegramException
+from broadcast import abroadcast, broadcast
+from db.models import broadcast_job
+from db.models import users
+from profiles import forget_profiles
+
+
+JOB_CHUNK_SIZE = 200
+POLL_INTERVAL = 2
+# задание, не обновлявшееся дольше этого времени, считается брошенным упавшим обработчиком и продолжается заново.
+# Пока задание выполняется, его updated_at обновляется раз в HEARTBEAT_INTERVAL секунд, в том числе во время
+# отправки части и паузы после ответа 429, поэтому живое задание не перехватывается другим обработчиком
+STALE_AFTER = dt.timedelta(minutes=1)
+HEARTBEAT_INTERVAL = 15
+JOB_STATUSES = {'pending': 'в очереди', 'running': 'выполняется', 'done': 'завершена', 'cancelled': 'отменена'}
+JOB_PROGRESS_FIELDS = ['cursor', 'sent', 'failed', 'blocked', 'photo', 'photo_file_id', 'updated_at']
+
+
+def delete_users(user_ids: list) -> None:
+    """
+    Функция удаления пользователей, заблокировавших бота или удалённых из Telegram, одним запросом.
+
+    Аргументы:
+        user_ids (list): Идентификаторы пользователей.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    users.objects.filter(user_id__in=user_ids).delete()
+    forget_profiles(user_ids)
+
+
+def job_recipients(recievers: str):
+    """
+    Функция, возвращающая queryset получателей рассылки.
+
+    Аргументы:
+        recievers (str): Получатели рассылки: 'all' или цифра класса.
+
+    Возвращает:
+        QuerySet: Пользователи, которым адресована рассылка.
+    """
+    return users.objects.all() if recievers == 'all' else users.objects.filter(class_letter__startswith=recievers)
+
+
+def job_audience(job: broadcast_job) -> dict:
+    """
+    Функция чтения адресной аудитории рассылки.
+
+    Аргументы:
+        job (broadcast_job): Задание рассылки.
+
+    Возвращает:
+        dict: Словарь вида {(класс, группа, группа универ-дня): текст сообщения} или None если рассылка не адресная.
+    """
+    if not job.audience:
+        return None
+    return {(profile['class_letter'], profile['group_number'], profile['u_group_number']): profile['text']
+            for profile in json.loads(job.audience)}
+
+
+def audience_size(recievers: str, audience: dict) -> int:
+    """
+    Функция подсчёта получателей адресной рассылки одним запросом с группировкой по классу и группам.
+
+    Аргументы:
+        recievers (str): Получатели рассылки: 'all' или цифра класса.
+        audience (dict): Адресная аудитория, см. job_audience.
+
+    Возвращает:
+        int: Количество пользователей, которым будет отправлено сообщение.
+    """
+    profiles = job_recipients(recievers).filter(class_letter__in={profile[0] for profile in audience})\
+        .values_list('class_letter', 'group_number', 'u_group_number').annotate(count=Count('user_id')).order_by()
+    return sum(count for *profile, count in profiles if tuple(profile) in audience)
+
+
+def submit_job(recievers: str, text: str = '', photo: bytes = None, photo_file_id: str = '', reply_markup: str = '',
+               admin_id: int = None, progress_message_id: int = None, audience: dict = None) -> broadcast_job:
+    """
+    Функция постановки рассылки в очередь.
+
+    Адресная рассылка отправляется только пользователям, чьи класс, группа и группа универ-дня есть в audience,
+    причём каждому - текст его комбинации.
+
+    Аргументы:
+        recievers (str): Получатели рассылки: 'all' или цифра класса.
+        text (str): Текст сообщения или подпись к изображению.
+        photo (bytes): Изображение рассылки, ещё не загруженное в Telegram.
+        photo_file_id (str): file_id изображения, уже загруженного в Telegram.
+        reply_markup (str): Клавиатура сообщения в формате json.
+        admin_id (int): Чат админа, в котором показывается прогресс рассылки.
+        progress_message_id (int): Сообщение, которое редактируется по мере выполнения рассылки.
+        audience (dict): Словарь вида {(класс, группа, группа универ-дня): текст сообщения} для адресной рассылки.
+
+    Возвращает:
+        broadcast_job: Созданное задание рассылки.
+    """
+    total = job_recipients(recievers).count() if audience is None else audience_size(recievers, audience)
+    if audience is not None:
+        audience = json.dumps([{'class_letter': class_letter, 'group_number': group_number,
+                                'u_group_number': u_group_number, 'text': profile_text}
+                               for (class_letter, group_number, u_group_number), profile_text in audience.items()],
+                              ensure_ascii=False)
+    return broadcast_job.objects.create(recievers=recievers, text=text, photo=photo, photo_file_id=photo_file_id,
+                                        reply_markup=reply_markup, admin_id=admin_id,
+                                        progress_message_id=progress_message_id, audience=audience or '', total=total)
+
+
+def job_progress(job: broadcast_job) -> str:
+    """
+    Функция форматирования прогресса рассылки.
+
+    Аргументы:
+        job (broadcast_job): Задание рассылки.
+
+    Возвращает:
+        str: Прогресс рассылки в виде текста.
+    """
+    done = job.sent + job.failed + job.blocked
+    return (f'Рассылка #{job.id}: {JOB_STATUSES.get(job.status, job.status)}, {done} из {job.total}\n'
+            f'отправлено: {job.sent}, не доставлено: {job.failed}, заблокировали бота: {job.blocked}')
+
+
+def jobs_status(job_ids: list) -> dict:
+    """
+    Функция чтения состояния рассылок.
+
+    Аргументы:
+        job_ids (list): Идентификаторы заданий рассылки.
+
+    Возвращает:
+        dict: Словарь вида {идентификатор: {'status', 'total', 'sent', 'failed', 'blocked'}}.
+    """
+    return {row.pop('id'): row for row in broadcast_job.objects.filter(pk__in=job_ids)
+            .values('id', 'status', 'total', 'sent', 'failed', 'blocked')}
+
+
+def cancel_job(job_id: int) -> bool:
+    """
+    Функция отмены рассылки.
+
+    Задание в очереди отменяется сразу, а выполняющееся задание останавливает обработчик после отправки текущей
+    части: сохранение прогресса отменённого задания не проходит, см. save_progress.
+
+    Аргументы:
+        job_id (int): Идентификатор задания рассылки.
+
+    Возвращает:
+        bool: True если задание было в очереди или выполнялось.
+    """
+    return bool(broadcast_job.objects.filter(pk=job_id, status__in=['pending', 'running'])
+                .update(status='cancelled', updated_at=timezone.now()))
+
+
+def claim_job() -> broadcast_job:
+    """
+    Функция захвата задания обработчиком.
+
+    Функция выбирает самое старое задание в очереди или брошенное выполняющееся задание и помечает его
+    выполняющимся условным обновлением, поэтому одно задание не достанется двум обработчикам.
+
+    Возвращает:
+        broadcast_job: Захваченное задание или None если заданий нет.
+    """
+    stale = timezone.now() - STALE_AFTER
+    candidates = broadcast_job.objects.filter(status='pending') | broadcast_job.objects.filter(
+        status='running', updated_at__lt=stale)
+    for job in candidates.order_by('id')[:5]:
+        claimed = broadcast_job.objects.filter(pk=job.pk, status=job.status, updated_at=job.updated_at)\
+            .update(status='running', updated_at=timezone.now())
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def show_progress(bot: telebot.TeleBot, job: broadcast_job) -> None:
+    """
+    Функция обновления сообщения с прогрессом рассылки у админа.
+
+    Аргументы:
+        bot (telebot.TeleBot): Бот, выполняющий рассылку.
+        job (broadcast_job): Задание рассылки.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    if not job.admin_id or not job.progress_message_id:
+        return
+    try:
+        bot.edit_message_text(job_progress(job), job.admin_id, job.progress_message_id)
+    except ApiTelegramException:
+        pass
+
+
+def upload_photo(bot: telebot.TeleBot, job: broadcast_job, chat_id: int) -> None:
+    """
+    Функция первой отправки изображения рассылки.
+
+    Функция отправляет изображение получателю, запоминает в задании file_id, который Telegram присвоил
+    загруженному изображению, и освобождает байты изображения. Задание сохраняет run_job.
+
+    Аргументы:
+        bot (telebot.TeleBot): Бот, выполняющий рассылку.
+        job (broadcast_job): Задание рассылки.
+        chat_id (int): Идентификатор чата получателя.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    message = bot.send_photo(chat_id, photo=bytes(job.photo), caption=job.text)
+    job.photo_file_id = message.photo[-1].file_id
+    job.photo = None
+
+
+def job_recipient_rows(job: broadcast_job, audience: dict):
+    """
+    Функция, возвращающая queryset ещё не обработанных получателей рассылки в порядке user_id.
+
+    Аргументы:
+        job (broadcast_job): Задание рассылки.
+        audience (dict): Адресная аудитория рассылки, см. job_audience.
+
+    Возвращает:
+        QuerySet: Идентификаторы получателей, а для адресной рассылки - кортежи
+            (идентификатор, класс, группа, группа универ-дня).
+    """
+    recipients = job_recipients(job.recievers).filter(user_id__gt=job.cursor).order_by('user_id')
+    if audience is None:
+        return recipients.values_list('user_id', flat=True)
+    return recipients.filter(class_letter__in={profile[0] for profile in audience})\
+        .values_list('user_id', 'class_letter', 'group_number', 'u_group_number')
+
+
+def job_chunk_size(job: broadcast_job) -> int:
+    """
+    Функция, возвращающая размер следующей части рассылки.
+
+    Пока изображение рассылки не загружено в Telegram, получатели обрабатываются по одному.
+
+    Аргументы:
+        job (broadcast_job): Задание рассылки.
+
+    Возвращает:
+        int: Количество получателей в следующей части.
+    """
+    return 1 if job.photo and not job.photo_file_id else JOB_CHUNK_SIZE
+
+
+def count_sent(job: broadcast_job, chunk: list, stats: dict) -> None:
+    """
+    Функция, сдвигающая курсор задания за отправленную часть и добавляющая её статистику к счётчикам.
+
+    Аргументы:
+        job (broadcast_job): Задание рассылки.
+        chunk (list): Идентификаторы получателей отправленной части.
+        stats (dict): Статистика рассылки части.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    job.cursor = chunk[-1]
+    job.sent += stats['sent']
+    job.failed += stats['failed']
+    job.blocked += stats['blocked']
+
+
+def save_progress(job: broadcast_job, fields: list = JOB_PROGRESS_FIELDS) -> bool:
+    """
+    Функция сохранения прогресса выполняющегося задания.
+
+    Поля сохраняются условным обновлением, поэтому прогресс задания, отменённого функцией cancel_job,
+    не перезаписывает отмену, а счётчики отправленной части сохраняются без статуса.
+
+    Аргументы:
+        job (broadcast_job): Выполняющееся задание рассылки.
+        fields (list): Сохраняемые поля.
+
+    Возвращает:
+        bool: False если задание отменено и рассылку нужно остановить.
+    """
+    job.updated_at = timezone.now()
+    values = {field: getattr(job, field) for field in fields}
+    if broadcast_job.objects.filter(pk=job.pk, status='running').update(**values):
+        return True
+    values.pop('status', None)
+    broadcast_job.objects.filter(pk=job.pk).update(**values)
+    job.status = 'cancelled'
+    return False
+
+
+def heartbeat_loop(job_id: int, stop: threading.Event) -> None:
+    """
+    Функция потока, обновляющего время последнего изменения выполняющегося задания.
+
+    Аргументы:
+        job_id (int): Идентификатор задания рассылки.
+        stop (threading.Event): Событие окончания выполнения задания.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    try:
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                broadcast_job.objects.filter(pk=job_id, status='running').update(updated_at=timezone.now())
+            except Exception as ex:
+                logging.error(ex)
+    finally:
+        connection.close()
+
+
+@contextmanager
+def job_heartbeat(job: broadcast_job):
+    """
+    Контекстный менеджер, обновляющий время последнего изменения задания в отдельном потоке, пока выполняется
+    рассылка. Используется и асинхронной рассылкой: поток не зависит от цикла событий.
+
+    Аргументы:
+        job (broadcast_job): Выполняющееся задание рассылки.
+    """
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=heartbeat_loop, args=(job.pk, stop), daemon=True,
+                                 name=f'broadcast-heartbeat-{job.pk}')
+    heartbeat.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        heartbeat.join()
+
+
+def run_job(bot: telebot.TeleBot, job: broadcast_job) -> None:
+    """
+    Функция выполнения задания рассылки.
+
+    Функция постранично читает идентификаторы получателей в порядке user_id, рассылает сообщение частями
+    по JOB_CHUNK_SIZE получателей, одним запросом удаляет заблокировавших бота в каждой части и после неё сохраняет
+    курсор и счётчики, поэтому после перезапуска рассылка продолжается с последнего получателя, а отменённая
+    рассылка останавливается после текущей части.
+    Изображение загружается в Telegram только один раз: пока его file_id неизвестен, получатели обрабатываются
+    по одному, а после загрузки изображение рассылается по file_id. Получатели адресной рассылки отбираются
+    по классу и группам при чтении, и каждому отправляется текст его комбинации.
+
+    Аргументы:
+        bot (telebot.TeleBot): Бот, выполняющий рассылку.
+        job (broadcast_job): Захваченное задание рассылки.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    audience = job_audience(job)
+    texts = {}
+
+    def send(chat_id):
+        if job.photo_file_id:
+            bot.send_photo(chat_id, photo=job.photo_file_id, caption=job.text)
+        elif job.photo:
+            upload_photo(bot, job, chat_id)
+        else:
+            bot.send_message(chat_id, texts.get(chat_id, job.text), reply_markup=job.reply_markup or None)
+
+    def recipient_rows():
+        # получатели читаются постранично по user_id, а не одним iterator(): открытый курсор держал бы блокировку
+        # чтения, пока часть рассылки ждёт отправки, и в SQLite обновление задания потоком job_heartbeat
+        # и сохранение прогресса заканчивались бы ошибкой database is locked
+        rows, last = job_recipient_rows(job, audience), job.cursor
+        while True:
+            page = list(rows.filter(user_id__gt=last)[:JOB_CHUNK_SIZE])
+            yield from page
+            if len(page) < JOB_CHUNK_SIZE:
+                return
+            last = page[-1] if audience is None else page[-1][0]
+
+    def audience_recipients(rows):
+        for user_id, *profile in rows:
+            if tuple(profile) in audience:
+                texts[user_id] = audience[tuple(profile)]
+                yield user_id
+
+    recipients = recipient_rows()
+    if audience is not None:
+        recipients = audience_recipients(recipients)
+    while True:
+        chunk = list(itertools.islice(recipients, job_chunk_size(job)))
+        if not chunk:
+            job.status = 'done'
+            save_progress(job, ['status', 'updated_at'])
+            break
+        count_sent(job, chunk, broadcast(chunk, send, on_blocked=delete_users))
+        # тексты удаляются только после части: при ответе 429 deliver повторяет send с тем же текстом
+        for chat_id in chunk:
+            texts.pop(chat_id, None)
+        if not save_progress(job):
+            break
+        show_progress(bot, job)
+    show_progress(bot, job)
+
+
+async def ashow_progress(bot: 'telebot.async_telebot.AsyncTeleBot', job: broadcast_job) -> None:
+    """
+    Асинхронная версия show_progress.
+
+    Аргументы:
+        bot (telebot.async_telebot.AsyncTeleBot): Асинхронный бот, выполняющий рассылку.
+        job (broadcast_job): Задание рассылки.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    from telebot import asyncio_helper
+    if not job.admin_id or not job.progress_message_id:
+        return
+    try:
+        await bot.edit_message_text(job_progress(job), job.admin_id, job.progress_message_id)
+    except asyncio_helper.ApiTelegramException:
+        pass
+
+
+async def arun_job(bot: 'telebot.async_telebot.AsyncTeleBot', job: broadcast_job) -> None:
+    """
+    Асинхронная версия run_job.
+
+    Получатели читаются асинхронными запросами django, сообщения отправляются функцией abroadcast, а курсор
+    и счётчики сохраняются после каждой части так же, как в run_job.
+
+    Аргументы:
+        bot (telebot.async_telebot.AsyncTeleBot): Асинхронный бот, выполняющий рассылку.
+        job (broadcast_job): Захваченное задание рассылки.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    audience = job_audience(job)
+    texts = {}
+
+    async def send(chat_id):
+        if job.photo_file_id:
+            await bot.send_photo(chat_id, photo=job.photo_file_id, caption=job.text)
+        elif job.photo:
+            message = await bot.send_photo(chat_id, photo=bytes(job.photo), caption=job.text)
+            job.photo_file_id = message.photo[-1].file_id
+            job.photo = None
+        else:
+            await bot.send_message(chat_id, texts.get(chat_id, job.text), reply_markup=job.reply_markup or None)
+
+    async def recipient_rows():
+        # получатели читаются постранично по user_id, а не одним values_list(...).aiterator(): так соединение
+        # с базой данных не держит открытый курсор, пока часть рассылки ждёт отправки
+        rows, last = job_recipient_rows(job, audience), job.cursor
+        while True:
+            page = [row async for row in rows.filter(user_id__gt=last)[:JOB_CHUNK_SIZE]]
+            for row in page:
+                yield row
+            if len(page) < JOB_CHUNK_SIZE:
+                return
+            last = page[-1] if audience is None else page[-1][0]
+
+    async def audience_recipients(rows):
+        async for user_id, *profile in rows:
+            if tuple(profile) in audience:
+                texts[user_id] = audience[tuple(profile)]
+                yield user_id
+
+    async def take(iterator, count):
+        chunk = []
+        for _ in range(count):
+            try:
+                chunk.append(await anext(iterator))
+            except StopAsyncIteration:
+                break
+        return chunk
+
+    recipients = recipient_rows()
+    if audience is not None:
+        recipients = audience_recipients(recipients)
+    while True:
+        chunk = await take(recipients, job_chunk_size(job))
+        if not chunk:
+            job.status = 'done'
+            await sync_to_async(save_progress)(job, ['status', 'updated_at'])
+            break
+        count_sent(job, chunk, await abroadcast(chunk, send, on_blocked=sync_to_async(delete_users)))
+        for chat_id in chunk:
+            texts.pop(chat_id, None)
+        if not await sync_to_async(save_progress)(job):
+            break
+        await ashow_progress(bot, job)
+    await ashow_progress(bot, job)
+
+
+async def aworker_loop(bot: 'telebot.async_telebot.AsyncTeleBot') -> None:
+    """
+    Асинхронная версия worker_loop, выполняющая рассылки в цикле событий асинхронного бота.
+
+    Аргументы:
+        bot (telebot.async_telebot.AsyncTeleBot): Асинхронный бот, выполняющий рассылки.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    while True:
+        await sync_to_async(close_old_connections)()
+        try:
+            job = await sync_to_async(claim_job)()
+            if job:
+                with job_heartbeat(job):
+                    await arun_job(bot, job)
+                continue
+        except Exception as ex:
+            logging.error(ex)
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def worker_loop(bot: telebot.TeleBot) -> None:
+    """
+    Функция фонового обработчика очереди рассылок.
+
+    Аргументы:
+        bot (telebot.TeleBot): Бот, выполняющий рассылки.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    while True:
+        close_old_connections()
+        try:
+            job = claim_job()
+            if job:
+                with job_heartbeat(job):
+                    run_job(bot, job)
+                continue
+        except Exception as ex:
+            logging.error(ex)
+        time.sleep(POLL_INTERVAL)
+
+
+def start_worker(bot: telebot.TeleBot) -> threading.Thread:
+    """
+    Функция запуска фонового обработчика рассылок.
+
+    Аргументы:
+        bot (telebot.TeleBot): Бот, выполняющий рассылки.
+
+    Возвращает:
+        threading.Thread: Поток обработчика.
+    """
+    worker = threading.Thread(target=worker_loop, args=(bot,), daemon=True, name='broadcast-worker')
+    worker.start()
+    return worker
@@ -0,0 +1,92 @@
+from telebot import types
+
+
+def schedule_days_keyboard() -> types.InlineKeyboardMarkup:
+    """
+    Функция, возвращающая клавиатуру выбора дня расписания.
+    """
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton('расписание на сегодня', callback_data='get_schedule=today'))
+    kb.add(types.InlineKeyboardButton('расписание на завтра', callback_data='get_schedule=tommorow'))
+    return kb
+
+
+def start_keyboard() -> types.InlineKeyboardMarkup:
+    """
+    Функция, возвращающая клавиатуру начала заполнения данных.
+    """
+    kb = types.InlineKeyboardMarkup()
+    kb.add(types.InlineKeyboardButton('начать', callback_data='choice'))
+    return kb
+
+
+def class_number_keyboard() -> types.InlineKeyboardMarkup:
+    """
+    Функция, возвращающая клавиатуру выбора цифры класса.
+    """
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    keyboard.add(types.InlineKeyboardButton('10', callback_data='10'),
+                 types.InlineKeyboardButton('11', callback_data='11'))
+    return keyboard
+
+
+def class_letter_keyboard(cl_num: str) -> types.InlineKeyboardMarkup:
+    """
+    Функция, возвращающая клавиатуру выбора буквы класса.
+
+    Аргументы:
+        cl_num (str): Цифра класса: '10' или '11'.
+
+    Возвращает:
+        types.InlineKeyboardMarkup: Клавиатура с буквами классов параллели.
+    """
+    classes_11 = [('В(бета)', 'Η(эта)'), ('Ζ(дзeта)', 'Θ(тета)'), ('Г(гамма)', 'Ε(эпсилон)'),
+                  ('Ι(йота)', 'К(каппа)'), ('Δ(дельта)', 'Λ(лямбда)')]
+    classes_10 = [('Μ(мю)', 'Σ(сигма)'), ('Ξ(кси)', 'Τ(тау)'), ('Ο(омикрон)', 'Φ(фи)'), ('Π(пи)', 'Х(хи)'),
+                  ('Ρ(ро)', 'Ψ(пси)')]
+    classes = classes_10 if cl_num == '10' else classes_11
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    for cl1, cl2 in classes:
+        keyboard.add(types.InlineKeyboardButton(cl1, callback_data=f'class_letter={cl_num} {cl1.split('(')[0]}'),
+                     types.InlineKeyboardButton(cl2, callback_data=f'class_letter={cl_num} {cl2.split('(')[0]}'))
+    return keyboard
+
+
+def class_group_keyboard() -> types.InlineKeyboardMarkup:
+    """
+    Функция, возвращающая клавиатуру выбора группы класса.
+    """
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(types.InlineKeyboardButton('группа А', callback_data='class_group=группа А'),
+                 types.InlineKeyboardButton('группа Б', callback_data='class_group=группа Б'))
+    return keyboard
+
+
+def univer_group_keyboard(class_letter: str) -> types.InlineKeyboardMarkup:
+    """
+    Функция, возвращающая клавиатуру выбора группы универ-дня.
+
+    Аргументы:
+        class_letter (str): Класс пользователя, например '10 Μ'.
+
+    Возвращает:
+        types.InlineKeyboardMarkup: Клавиатура с группами универ-дня параллели.
+    """
+    cl = class_letter.split()[0]
+    i, j = (6, 5) if cl == '11' else (7, 6)
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
+    for i in range(1, i):
+        keyboard.add(types.InlineKeyboardButton(str(i), callback_data=f'univer_group={str(i)}'),
+                     types.InlineKeyboardButton(str(i + j), callback_data=f'univer_group={str(i + j)}'))
+    return keyboard
+
+
+def confirm_profile_keyboard() -> types.InlineKeyboardMarkup:
+    """
+    Функция, возвращающая клавиатуру подтверждения данных.
+    """
+    kb = types.InlineKeyboardMarkup(row_width=1)
+    kb.add(types.InlineKeyboardButton('заполнить заново', callback_data='choice'),
+           types.InlineKeyboardButton('сохранить', callback_data='done'))
+    return kb
+
@@ -0,0 +1,235 @@
+import os
+import json
+import copy
+import queue
+import atexit
+import time
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+# записи журнала пишутся в файл фоновым потоком: обработчик обновлений только кладёт запись в очередь
+LOG_FILE = os.getenv('LOG_FILE', 'logs.log')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', 5))
+# при переполнении очереди новые записи отбрасываются, а не задерживают обработчик
+LOG_QUEUE_SIZE = 10000
+# одинаковые ошибки (тип исключения, обработчик и место ошибки) записываются не чаще раза в окно,
+# повторы только считаются
+DEDUP_WINDOW = float(os.getenv('LOG_DEDUP_WINDOW', 60))
+DEDUP_MAX_KEYS = 1024
+# поля записи, которые передаются через extra, например instrumented в metrics.py
+RECORD_FIELDS = ('handler', 'user_id', 'latency_ms', 'raised_at', 'suppressed', 'dropped')
+log_stats = {'written': 0, 'suppressed': 0, 'dropped': 0}
+listener = None
+listener_lock = threading.Lock()
+
+
+def exception_type(record: logging.LogRecord) -> str:
+    """
+    Функция, возвращающая тип исключения записи.
+
+    Аргументы:
+        record (logging.LogRecord): Запись журнала, в том числе вида logging.error(ex).
+
+    Возвращает:
+        str: Имя класса исключения или None если запись не об исключении.
+    """
+    if record.exc_info and record.exc_info[0]:
+        return record.exc_info[0].__name__
+    if isinstance(record.msg, BaseException):
+        return type(record.msg).__name__
+    return getattr(record, 'exc_type', None)
+
+
+def error_site(record: logging.LogRecord) -> tuple:
+    """
+    Функция, возвращающая место, где было выброшено исключение записи.
+
+    Ошибки обработчиков записываются в журнал из одного места (log_handler_error в metrics.py), поэтому место вызова
+    logging не различает ошибки разных обработчиков - вместо него берётся последний кадр трассировки.
+
+    Аргументы:
+        record (logging.LogRecord): Запись журнала.
+
+    Возвращает:
+        tuple: Путь к файлу и номер строки, где было выброшено исключение, или место вызова logging, если запись
+            не об исключении или трассировки нет.
+    """
+    error = record.exc_info[1] if record.exc_info else None
+    if error is None and isinstance(record.msg, BaseException):
+        error = record.msg
+    traceback = getattr(error, '__traceback__', None)
+    if traceback is None:
+        return record.pathname, record.lineno
+    while traceback.tb_next:
+        traceback = traceback.tb_next
+    return traceback.tb_frame.f_code.co_filename, traceback.tb_lineno
+
+
+class WindowedDedup(logging.Filter):
+    """
+    Фильтр, пропускающий одну запись на тип исключения, обработчик и место ошибки за окно.
+
+    Местом ошибки считается строка, где было выброшено исключение, а для записей не об исключениях - место вызова
+    logging.
+
+    Повторы внутри окна отбрасываются, а их количество добавляется полем suppressed к первой записи
+    следующего окна.
+
+    Аргументы:
+        window (float): Длина окна в секундах.
+    """
+    def __init__(self, window: float = DEDUP_WINDOW) -> None:
+        super().__init__()
+        self.window = window
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        site = error_site(record)
+        key = (exception_type(record), getattr(record, 'handler', None), *site)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.seen.get(key)
+            if entry and now - entry[0] < self.window:
+                entry[1] += 1
+                log_stats['suppressed'] += 1
+                return False
+            if len(self.seen) >= DEDUP_MAX_KEYS:
+                self.seen = {seen_key: seen for seen_key, seen in self.seen.items() if now - seen[0] < self.window}
+            self.seen[key] = [now, 0]
+        if site != (record.pathname, record.lineno):
+            record.raised_at = f'{os.path.basename(site[0])}:{site[1]}'
+        if entry and entry[1]:
+            record.suppressed = entry[1]
+        return True
+
+
+class StructuredQueueHandler(QueueHandler):
+    """
+    Обработчик журнала, кладущий записи в очередь без записи в файл.
+
+    В отличие от QueueHandler запись не форматируется в потоке вызова: текст трассировки собирается потоком
+    записи, так как чтение исходников для неё - обращение к диску. При переполнении очереди запись отбрасывается,
+    а количество отброшенных записей добавляется полем dropped к следующей записи.
+    """
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.exc_type = exception_type(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if self.dropped:
+            record.dropped, self.dropped = self.dropped, 0
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # отброшенная запись могла нести счётчик предыдущих отброшенных записей
+            self.dropped += 1 + getattr(record, 'dropped', 0)
+            log_stats['dropped'] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Форматирование записи журнала в одну строку json с полями обработчика, пользователя, задержки и исключения.
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'time': self.formatTime(record), 'level': record.levelname,
+                 'site': f'{record.filename}:{record.lineno}', 'thread': record.threadName,
+                 'message': record.getMessage()}
+        if getattr(record, 'exc_type', None):
+            entry['exc_type'] = record.exc_type
+        for field in RECORD_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['traceback'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class CountingListener(QueueListener):
+    """
+    Поток записи журнала, считающий записанные записи для logging_metrics.
+    """
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        log_stats['written'] += 1
+
+
+def setup_logging(filename: str = LOG_FILE, level: int = logging.ERROR) -> QueueListener:
+    """
+    Функция настройки журнала: записи корневого логгера через очередь пишет в файл с ротацией по размеру
+    фоновый поток QueueListener.
+
+    Повторный вызов ничего не меняет, поэтому модули, импортирующие bot.py, могут вызывать функцию сами.
+
+    Аргументы:
+        filename (str): Файл журнала. Файл дописывается, а при превышении LOG_MAX_BYTES переименовывается
+            в filename.1, ... и хранится LOG_BACKUPS старых файлов.
+        level (int): Минимальный уровень записей.
+
+    Возвращает:
+        QueueListener: Поток записи журнала.
+    """
+    global listener
+    with listener_lock:
+        if listener:
+            return listener
+        file_handler = RotatingFileHandler(filename, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                           encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        queue_handler = StructuredQueueHandler(log_queue)
+        queue_handler.addFilter(WindowedDedup())
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+        listener = CountingListener(log_queue, file_handler)
+        listener.start()
+        # при выходе поток записи дописывает оставшиеся в очереди записи
+        atexit.register(stop_logging)
+        return listener
+
+
+def stop_logging() -> None:
+    """
+    Функция остановки журнала: поток записи дописывает оставшиеся в очереди записи, обработчик очереди снимается
+    с корневого логгера, файл журнала закрывается. Повторный вызов ничего не делает.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    global listener
+    with listener_lock:
+        if not listener:
+            return
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            if isinstance(handler, StructuredQueueHandler) and handler.queue is listener.queue:
+                root.removeHandler(handler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        listener = None
+
+
+def logging_metrics() -> list:
+    """
+    Функция вывода счётчиков журнала в текстовом формате Prometheus для сервера метрик.
+
+    Возвращает:
+        list: Строки метрик.
+    """
+    lines = ['# HELP bot_log_records_total Записи журнала: записанные, подавленные как повторы и отброшенные '
+             'при переполнении очереди',
+             '# TYPE bot_log_records_total counter']
+    return lines + [f'bot_log_records_total{{result="{result}"}} {count}' for result, count in log_stats.items()]
@@ -0,0 +1,464 @@
+import re
+import time
+import logging
+import bisect
+import inspect
+import threading
+from contextlib import ContextDecorator
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# границы корзин гистограмм в секундах
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRICS_PORT = 9108
+
+
+class Counter:
+    """
+    Счётчик с метками в духе Prometheus.
+
+    Аргументы:
+        name (str): Имя метрики.
+        description (str): Описание метрики.
+        labels (tuple): Имена меток.
+    """
+    def __init__(self, name: str, description: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def inc(self, value: float = 1, **labels) -> None:
+        """
+        Функция увеличения счётчика.
+
+        Аргументы:
+            value (float): Величина увеличения.
+            labels: Значения меток.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self) -> list:
+        """
+        Функция вывода счётчика в текстовом формате Prometheus.
+
+        Возвращает:
+            list: Строки метрики.
+        """
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    Гистограмма с метками в духе Prometheus.
+
+    Для каждого набора меток хранятся только счётчики корзин, сумма и количество наблюдений, поэтому память
+    не зависит от количества наблюдений.
+
+    Аргументы:
+        name (str): Имя метрики.
+        description (str): Описание метрики.
+        labels (tuple): Имена меток.
+        buckets (tuple): Верхние границы корзин.
+    """
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        """
+        Функция добавления наблюдения.
+
+        Аргументы:
+            value (float): Наблюдаемое значение.
+            labels: Значения меток.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        key = tuple(str(labels[label]) for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels) -> 'timed':
+        """
+        Функция, возвращающая замер времени, который можно использовать как контекстный менеджер или декоратор.
+
+        Аргументы:
+            labels: Значения меток.
+
+        Возвращает:
+            timed: Замер времени.
+        """
+        return timed(self, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        Функция, возвращающая копию состояния гистограммы.
+
+        Возвращает:
+            dict: Словарь вида {значения меток: (счётчики корзин, сумма, количество)}.
+        """
+        with self.lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+
+    def quantile(self, q: float, counts: list) -> float:
+        """
+        Функция оценки квантиля по корзинам линейной интерполяцией, как histogram_quantile в Prometheus.
+
+        Аргументы:
+            q (float): Квантиль от 0 до 1.
+            counts (list): Счётчики корзин.
+
+        Возвращает:
+            float: Оценка квантиля.
+        """
+        rank = q * sum(counts)
+        seen = 0
+        for i, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return 0.0
+
+    def render(self) -> list:
+        """
+        Функция вывода гистограммы в текстовом формате Prometheus.
+
+        Возвращает:
+            list: Строки метрики.
+        """
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for key, (counts, total, count) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = format_labels(self.labels + ('le',), key + (str(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labels, key)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.labels, key)} {count}')
+        return lines
+
+
+class timed(ContextDecorator):
+    """
+    Замер времени выполнения блока или функции с записью в гистограмму.
+
+    Аргументы:
+        histogram (Histogram): Гистограмма.
+        labels: Значения меток.
+    """
+    def __init__(self, histogram: Histogram, **labels) -> None:
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def _recreate_cm(self) -> 'timed':
+        # при использовании как декоратора каждый вызов получает свой замер, иначе потоки затирали бы start
+        return timed(self.histogram, **self.labels)
+
+    def __enter__(self) -> 'timed':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    """
+    Функция форматирования меток метрики.
+
+    Аргументы:
+        names (tuple): Имена меток.
+        values (tuple): Значения меток.
+
+    Возвращает:
+        str: Метки вида {name="value"} или пустая строка.
+    """
+    if not names:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+registry = []
+collectors = []
+handler_seconds = Histogram('bot_handler_seconds', 'Время обработчиков обновлений', ('handler',))
+handler_errors = Counter('bot_handler_errors_total', 'Исключения в обработчиках обновлений', ('handler',))
+telegram_seconds = Histogram('bot_telegram_request_seconds', 'Время запросов к Bot API', ('method',))
+telegram_errors = Counter('bot_telegram_errors_total', 'Ошибки запросов к Bot API', ('method', 'code'))
+db_seconds = Histogram('bot_db_query_seconds', 'Время запросов к базе данных', ('operation', 'table'))
+schedule_stage_seconds = Histogram('bot_schedule_stage_seconds', 'Время стадий загрузки расписания', ('stage',))
+
+
+def log_handler_error(ex: Exception, handler: str, update, start: float) -> None:
+    """
+    Функция записи в журнал исключения обработчика обновлений с именем обработчика, пользователем и задержкой.
+
+    Аргументы:
+        ex (Exception): Исключение обработчика.
+        handler (str): Имя обработчика.
+        update: Сообщение или коллбэк, переданный обработчику.
+        start (float): Время начала обработки по time.perf_counter.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    user = getattr(update, 'from_user', None)
+    logging.error(ex, exc_info=ex, extra={'handler': handler, 'user_id': getattr(user, 'id', None),
+                                          'latency_ms': round((time.perf_counter() - start) * 1000, 1)})
+
+
+def instrumented(name: str) -> callable:
+    """
+    Декоратор, замеряющий время обработчика обновлений, считающий исключения в нём и записывающий их в журнал.
+
+    Обработчики асинхронного бота (async_bot.py) оборачиваются корутиной, и время замеряется до её завершения.
+
+    Аргументы:
+        name (str): Имя обработчика.
+
+    Возвращает:
+        (callable): Декоратор обработчика.
+    """
+    def decorator(func: callable) -> callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapped_async(update, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(update, *args, **kwargs)
+                except Exception as ex:
+                    handler_errors.inc(handler=name)
+                    log_handler_error(ex, name, update, start)
+                    raise
+                finally:
+                    handler_seconds.observe(time.perf_counter() - start, handler=name)
+            return wrapped_async
+
+        @wraps(func)
+        def wrapped(update, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(update, *args, **kwargs)
+            except Exception as ex:
+                handler_errors.inc(handler=name)
+                log_handler_error(ex, name, update, start)
+                raise
+            finally:
+                handler_seconds.observe(time.perf_counter() - start, handler=name)
+        return wrapped
+    return decorator
+
+
+def instrument_telegram() -> None:
+    """
+    Функция, включающая замер запросов telebot к Bot API.
+
+    Все методы telebot выполняют запросы через apihelper._make_request, поэтому достаточно обернуть её.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    from telebot import apihelper
+    from telebot.apihelper import ApiTelegramException
+    make_request = apihelper._make_request
+    if getattr(make_request, 'instrumented', False):
+        return
+
+    @wraps(make_request)
+    def wrapped(token, method_name, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return make_request(token, method_name, *args, **kwargs)
+        except ApiTelegramException as ex:
+            telegram_errors.inc(method=method_name, code=ex.error_code)
+            raise
+        except Exception as ex:
+            telegram_errors.inc(method=method_name, code=ex.__class__.__name__)
+            raise
+        finally:
+            telegram_seconds.observe(time.perf_counter() - start, method=method_name)
+
+    wrapped.instrumented = True
+    apihelper._make_request = wrapped
+
+
+def instrument_telegram_async() -> None:
+    """
+    Функция, включающая замер запросов асинхронного клиента telebot к Bot API.
+
+    Все методы AsyncTeleBot выполняют запросы через asyncio_helper._process_request, поэтому достаточно обернуть её.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    from telebot import asyncio_helper
+    from telebot.asyncio_helper import ApiTelegramException
+    process_request = asyncio_helper._process_request
+    if getattr(process_request, 'instrumented', False):
+        return
+
+    @wraps(process_request)
+    async def wrapped(token, method_name, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await process_request(token, method_name, *args, **kwargs)
+        except ApiTelegramException as ex:
+            telegram_errors.inc(method=method_name, code=ex.error_code)
+            raise
+        except Exception as ex:
+            telegram_errors.inc(method=method_name, code=ex.__class__.__name__)
+            raise
+        finally:
+            telegram_seconds.observe(time.perf_counter() - start, method=method_name)
+
+    wrapped.instrumented = True
+    asyncio_helper._process_request = wrapped
+
+
+TABLE_PATTERN = re.compile(r'(?:FROM|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def query_timer(execute: callable, sql: str, params, many: bool, context: dict):
+    """
+    Обёртка выполнения запросов django, замеряющая время запроса по операции и таблице.
+    """
+    operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'UNKNOWN'
+    table = TABLE_PATTERN.search(sql)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        db_seconds.observe(time.perf_counter() - start, operation=operation,
+                           table=table.group(1) if table else '')
+
+
+def instrument_database() -> None:
+    """
+    Функция, включающая замер запросов к базе данных во всех потоках.
+
+    Соединения django создаются отдельно для каждого потока, поэтому обёртка добавляется каждому новому соединению
+    по сигналу connection_created, а также уже открытому соединению текущего потока.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    def install(sender, connection, **kwargs):
+        if query_timer not in connection.execute_wrappers:
+            connection.execute_wrappers.append(query_timer)
+
+    connection_created.connect(install, weak=False, dispatch_uid='metrics_query_timer')
+    install(None, connection)
+
+
+def register_collector(collector: callable) -> None:
+    """
+    Функция регистрации источника дополнительных метрик, например счётчиков ограничителей.
+
+    Аргументы:
+        collector (callable): Функция без аргументов, возвращающая строки в текстовом формате Prometheus.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    collectors.append(collector)
+
+
+def render() -> str:
+    """
+    Функция вывода всех метрик в текстовом формате Prometheus.
+
+    Возвращает:
+        str: Метрики.
+    """
+    lines = []
+    for metric in registry:
+        lines += metric.render()
+    for collector in collectors:
+        lines += collector()
+    return '\n'.join(lines) + '\n'
+
+
+def summary(histogram: Histogram, top: int = 8) -> list:
+    """
+    Функция краткой сводки гистограммы для админа.
+
+    Аргументы:
+        histogram (Histogram): Гистограмма.
+        top (int): Количество наборов меток с наибольшим суммарным временем.
+
+    Возвращает:
+        list: Строки вида 'метки: количество, среднее, p50, p99'.
+    """
+    lines = []
+    rows = sorted(histogram.snapshot().items(), key=lambda item: item[1][1], reverse=True)[:top]
+    for key, (counts, total, count) in rows:
+        lines.append(f'{" ".join(key) or "всего"}: {count} шт., ср. {total / count * 1000:.1f} мс, '
+                     f'p50 {histogram.quantile(0.5, counts) * 1000:.1f} мс, '
+                     f'p99 {histogram.quantile(0.99, counts) * 1000:.1f} мс')
+    return lines
+
+
+def serve_metrics(host: str = '127.0.0.1', port: int = METRICS_PORT) -> ThreadingHTTPServer:
+    """
+    Функция запуска http-сервера, отдающего метрики по адресу /metrics, в фоновом потоке.
+
+    Аргументы:
+        host (str): Адрес сервера.
+        port (int): Порт сервера.
+
+    Возвращает:
+        ThreadingHTTPServer: Запущенный сервер.
+    """
+    class MetricsRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-server').start()
+    return server
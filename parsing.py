@@ -0,0 +1,384 @@
+import io
+import os
+import zipfile
+import datetime as dt
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING
+from xml.etree import ElementTree
+
+# openpyxl импортируется при первом разборе файла, а не при импорте модуля: его импорт заметно замедляет запуск
+if TYPE_CHECKING:
+    from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+
+SHEET_MAX_ROW, SHEET_MAX_COL = 14, 27
+# страницы 10-х и 11-х классов разбираются параллельно в отдельных процессах, 0 или 1 - разбор в текущем процессе;
+# на одноядерном сервере процессы не ускоряют разбор, поэтому по умолчанию он там идёт в текущем процессе
+PARSE_WORKERS = int(os.getenv('SCHEDULE_PARSE_WORKERS', min(2, os.cpu_count() or 1)))
+parse_pool = None
+parse_pool_lock = threading.Lock()
+# ограничения архива с расписанием: распакованный файл дня весит десятки килобайт
+ARCHIVE_MAX_FILES = 31
+ARCHIVE_MAX_FILE_SIZE = 10 * 1024 * 1024
+
+
+def merged_ranges(worksheet: 'ReadOnlyWorksheet') -> list:
+    """
+    Функция, читающая объединённые диапазоны страницы напрямую из её xml.
+
+    Страница в режиме read_only не хранит объединённые клетки, поэтому функция потоково проходит по xml страницы,
+    освобождая прочитанные строки, и собирает атрибуты ref элементов mergeCell. Открытого api для xml страницы
+    в openpyxl нет, поэтому используется закрытый метод _get_source, а версия openpyxl закреплена в requirements.txt.
+
+    Аргументы:
+        worksheet (ReadOnlyWorksheet): Страница эксель файла, открытого в режиме read_only.
+
+    Возвращает:
+        list: Список границ диапазонов вида (min_col, min_row, max_col, max_row).
+    """
+    from openpyxl.utils.cell import range_boundaries
+    from openpyxl.xml.constants import SHEET_MAIN_NS
+    if not hasattr(worksheet, '_get_source'):
+        raise RuntimeError('openpyxl не предоставляет xml страницы, проверьте версию из requirements.txt')
+    ranges = []
+    with worksheet._get_source() as source:
+        for _, element in ElementTree.iterparse(source):
+            if element.tag == f'{{{SHEET_MAIN_NS}}}row':
+                element.clear()
+            elif element.tag == f'{{{SHEET_MAIN_NS}}}mergeCell':
+                ranges.append(range_boundaries(element.get('ref')))
+            elif element.tag == f'{{{SHEET_MAIN_NS}}}mergeCells':
+                break
+    return ranges
+
+
+def sheet_values(worksheet: 'ReadOnlyWorksheet', max_row: int = SHEET_MAX_ROW, max_col: int = SHEET_MAX_COL) -> dict:
+    """
+    Функция, читающая значения клеток страницы в пределах сетки расписания.
+
+    Функция читает только значения клеток с A1 по (max_row, max_col) и проставляет каждой объединённой клетке
+    значение её родительской (левой верхней) клетки.
+
+    Аргументы:
+        worksheet (ReadOnlyWorksheet): Страница эксель файла, открытого в режиме read_only.
+        max_row (int): Последняя читаемая строка.
+        max_col (int): Последний читаемый столбец.
+
+    Возвращает:
+        dict: Словарь вида {(строка, столбец): значение клетки}, пустые клетки в словарь не попадают.
+    """
+    values = {}
+    rows = worksheet.iter_rows(min_row=1, max_row=max_row, min_col=1, max_col=max_col, values_only=True)
+    for row, row_values in enumerate(rows, 1):
+        for col, value in enumerate(row_values, 1):
+            if value is not None:
+                values[(row, col)] = value
+    for min_col, min_row, max_col_, max_row_ in merged_ranges(worksheet):
+        if min_row > max_row or min_col > max_col:
+            continue
+        value = values.get((min_row, min_col))
+        for row in range(min_row, min(max_row_, max_row) + 1):
+            for col in range(min_col, min(max_col_, max_col) + 1):
+                if value is None:
+                    values.pop((row, col), None)
+                else:
+                    values[(row, col)] = value
+    return values
+
+
+def column_values(values: dict, col: int, start_row: int, end_row: int) -> list:
+    """
+    Функция, возвращающая значения клеток столбца.
+
+    Аргументы:
+        values (dict): Значения клеток страницы, см. sheet_values.
+        col (int): Номер столбца.
+        start_row (int): Начальная строка.
+        end_row (int): Конечная строка.
+
+    Возвращает:
+        list: Значения клеток столбца с start_row по end_row включительно.
+    """
+    return [values.get((row, col)) for row in range(start_row, end_row + 1)]
+
+
+def regular_classes_schedule_parsing(values: dict, times_list: list, start_row: int, start_col: int,
+                                     end_row: int, end_col: int) -> list:
+    """
+    функция парсинга обычного расписания классов.
+
+    Функция итерируется по столбцам и клеткам столбца и возвращает уроки в виде словарей полей записей, которые
+    затем пакетно записываются в базу данных функцией save_schedule из ingestion.py.
+
+    Аргументы:
+        values (dict): Значения клеток страницы эксель файла, см. sheet_values.
+        times_list (list): Список с таймингами уроков.
+        start_row (int): Начальная строка итерации.
+        start_col (int): Начальный столбец итерации.
+        end_row (int): Конечная строка итерации.
+        end_col (int): Конечный столбец итерации.
+
+    Возвращает:
+        list: Список словарей полей записей regular_schedule без даты.
+    """
+    rows = []
+    for col_num in range(start_col, end_col + 1):
+        col = column_values(values, col_num, start_row, end_row)
+        key = col[0]
+        groups = ('гр.А', 'гр.Б')
+        group = groups.index(''.join(col[1].split()))
+        for i, value in enumerate(col[2:]):
+            if value:
+                lesson_info = '\n'.join((times_list[i], '\n'.join(value.split('\n\n'))))
+                rows.append({'lesson_number': i, 'lesson_info': lesson_info, 'class_letter': key,
+                             'group_number': group})
+    return rows
+
+
+def uday_groups_schedule_parsing(values: dict, times_list: list, start_row: int, start_col: int,
+                                 end_row: int, end_col: int) -> list:
+    """
+    функция парсинга расписания для групп на универдень.
+
+    Функция итерируется по столбцам и клеткам столбца и возвращает уроки в виде словарей полей записей, которые
+    затем пакетно записываются в базу данных функцией save_schedule из ingestion.py.
+
+    Аргументы:
+        values (dict): Значения клеток страницы эксель файла, см. sheet_values.
+        times_list (list): Список с таймингами уроков.
+        start_row (int): Начальная строка итерации.
+        start_col (int): Начальный столбец итерации.
+        end_row (int): Конечная строка итерации.
+        end_col (int): Конечный столбец итерации.
+
+    Возвращает:
+        list: Список словарей полей записей uday_schedule без даты.
+    """
+    rows = []
+    done = set()
+    for col_num in range(start_col, end_col + 1):
+        col = column_values(values, col_num, start_row, end_row)
+        group = int(col[0].split()[0])
+        if group in done:
+            continue
+        done.add(group)
+        for i, value in enumerate(col[1:]):
+            if value:
+                lesson_info = '\n'.join((times_list[i], '\n'.join(value.split('\n\n'))))
+                rows.append({'lesson_number': i, 'lesson_info': lesson_info, 'group_number': group})
+    return rows
+
+
+def uday_classes_schedule_parsing(values: dict, times_list: list, start_row: int, start_col: int,
+                                  end_row: int, end_col: int) -> list:
+    """
+    функция парсинга расписания для классов на универдень.
+
+    Функция итерируется по столбцам и клеткам столбца и возвращает уроки в виде словарей полей записей, которые
+    затем пакетно записываются в базу данных функцией save_schedule из ingestion.py.
+
+    Аргументы:
+        values (dict): Значения клеток страницы эксель файла, см. sheet_values.
+        times_list (list): Список с таймингами уроков.
+        start_row (int): Начальная строка итерации.
+        start_col (int): Начальный столбец итерации.
+        end_row (int): Конечная строка итерации.
+        end_col (int): Конечный столбец итерации.
+
+    Возвращает:
+        list: Список словарей полей записей regular_schedule без даты.
+    """
+    rows = []
+    done = set()
+    for col_num in range(start_col, end_col + 1):
+        col = column_values(values, col_num, start_row, end_row)
+        key = col[0]
+        if key in done:
+            continue
+        done.add(key)
+        for i, value in enumerate(col[1:]):
+            if value:
+                lesson_info = '\n'.join((times_list[i], '\n'.join(value.split('\n\n'))))
+                rows.append({'lesson_number': i, 'lesson_info': lesson_info, 'class_letter': key, 'group_number': 0})
+    return rows
+
+
+def grade_sheet_index(sheetnames: list, grade: int, weekday: int) -> int:
+    """
+    Функция выбора страницы с расписанием классов одной параллели.
+
+    Страница ищется по названию '10' или '11', а если её нет, берётся первая страница в универ-день параллели
+    и вторая в остальные дни.
+
+    Аргументы:
+        sheetnames (list): Названия страниц файла.
+        grade (int): Цифра класса.
+        weekday (int): День недели расписания.
+
+    Возвращает:
+        int: Номер страницы.
+    """
+    sh_10, sh_11 = None, None
+    for i, sh in enumerate(sheetnames):
+        if sh.strip() == '10':
+            sh_10 = i
+        elif sh.strip() == '11':
+            sh_11 = i
+        if sh_10 and sh_11:
+            break
+    if grade == 10:
+        if weekday == 0:
+            return 0 if not sh_10 else sh_10
+        return 1 if not isinstance(sh_10, int) else sh_10
+    if weekday == 2:
+        return 0 if not sh_11 else sh_11
+    return 1 if not isinstance(sh_11, int) else sh_11
+
+
+def parse_grade(source: str | bytes, grade: int, weekday: int) -> tuple:
+    """
+    Функция разбора страницы с расписанием классов одной параллели.
+
+    Функция открывает файл, потоково читает сетку расписания со страницы параллели и вызывает вспомогательные
+    функции парсинга в зависимости от дня недели. Функция выполняется в процессе пула parse_pool, поэтому
+    принимает и возвращает только простые объекты.
+
+    Аргументы:
+        source (str | bytes): Путь файла с расписанием или содержимое файла, распакованного из архива.
+        grade (int): Цифра класса: 10 или 11.
+        weekday (int): День недели расписания.
+
+    Возвращает:
+        tuple: Списки словарей полей записей regular_schedule и uday_schedule.
+    """
+    import openpyxl
+    workbook = openpyxl.load_workbook(io.BytesIO(source) if isinstance(source, bytes) else source, read_only=True,
+                                      data_only=True)
+    try:
+        values = sheet_values(workbook.worksheets[grade_sheet_index(workbook.sheetnames, grade, weekday)])
+    finally:
+        workbook.close()
+
+    regular_rows, uday_rows = [], []
+    if grade == 10:
+        # универ-день
+        if weekday == 0:
+            times = [i.replace('\n', '') for i in column_values(values, 3, 3, 11) if i]
+            uday_rows += uday_groups_schedule_parsing(values, times[:6], 2, 4, 8, 27)
+            regular_rows += uday_classes_schedule_parsing(values, times[6:], 9, 4, 12, 27)
+
+        # все остальные дни недели
+        else:
+            ls_num = max([int(i) for i in column_values(values, 2, 4, 14) if str(i) in '123456789'])
+            times = [i.replace('\n', '') for i in column_values(values, 3, 4, 3 + ls_num)]
+            regular_rows += regular_classes_schedule_parsing(values, times, 2, 4, 11, 23)
+    else:
+        # универ-день
+        if weekday == 2:
+            times = [i.replace('\n', '') for i in column_values(values, 3, 4, 9) + column_values(values, 3, 11, 12)
+                     if i]
+            uday_rows += uday_groups_schedule_parsing(values, times[:6], 3, 4, 9, 23)
+            regular_rows += uday_classes_schedule_parsing(values, times[6:], 10, 4, 13, 23)
+
+        # все остальные дни недели
+        else:
+            times = [i.replace('\n', '') for i in column_values(values, 3, 4, 11) if i]
+            regular_rows += regular_classes_schedule_parsing(values, times, 2, 4, 12, 23)
+    return regular_rows, uday_rows
+
+
+def get_parse_pool() -> ProcessPoolExecutor:
+    """
+    Функция, возвращающая пул процессов для разбора страниц.
+
+    Пул создаётся при первой загрузке расписания и переиспользуется. Процессы запускаются через spawn, а не fork:
+    к первой загрузке бот и админ-панель уже многопоточны (поток журнала, очистка расписания, обработчик рассылок,
+    сервер метрик, потоки telebot или Qt), а дочерний процесс fork наследует блокировки, захваченные другими
+    потоками, и может зависнуть. Новый процесс импортирует только parsing и главный модуль как __mp_main__,
+    не запуская бота, поэтому за импорт платит только первая загрузка после запуска.
+
+    Возвращает:
+        ProcessPoolExecutor: Пул процессов или None если разбор выполняется в текущем процессе.
+    """
+    global parse_pool
+    if PARSE_WORKERS < 2:
+        return None
+    with parse_pool_lock:
+        if parse_pool is None:
+            parse_pool = ProcessPoolExecutor(PARSE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return parse_pool
+
+
+def reset_parse_pool() -> None:
+    """
+    Функция сброса сломанного пула, например после аварийного завершения процесса. Следующий разбор создаст новый пул.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    global parse_pool
+    with parse_pool_lock:
+        if parse_pool is not None:
+            parse_pool.shutdown(wait=False, cancel_futures=True)
+            parse_pool = None
+
+
+def submit_schedule_parsing(source: str | bytes, date: dt.date) -> dict:
+    """
+    Функция постановки разбора страниц 10-х и 11-х классов в пул процессов.
+
+    Аргументы:
+        source (str | bytes): Путь файла с расписанием или содержимое файла.
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        dict: Словарь вида {цифра класса: Future с результатом parse_grade}.
+    """
+    pool = get_parse_pool()
+    futures = {}
+    for grade in (10, 11):
+        if pool:
+            try:
+                futures[grade] = pool.submit(parse_grade, source, grade, date.weekday())
+                continue
+            except BrokenProcessPool:
+                reset_parse_pool()
+                pool = None
+        futures[grade] = Future()
+        try:
+            futures[grade].set_result(parse_grade(source, grade, date.weekday()))
+        except Exception as ex:
+            futures[grade].set_exception(ex)
+    return futures
+
+
+def archive_members(data: bytes) -> dict:
+    """
+    Функция распаковки zip архива с файлами расписания в память.
+
+    Служебные файлы архиваторов (папка __MACOSX, скрытые файлы) и папки пропускаются, а вложенные папки
+    не учитываются в именах файлов.
+
+    Аргументы:
+        data (bytes): Содержимое архива.
+
+    Возвращает:
+        dict: Словарь вида {имя файла: содержимое файла} в порядке файлов в архиве.
+    """
+    members = {}
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir() and '__MACOSX' not in info.filename
+                 and not os.path.basename(info.filename).startswith('.')]
+        if len(infos) > ARCHIVE_MAX_FILES:
+            raise ValueError(f'В архиве больше {ARCHIVE_MAX_FILES} файлов')
+        for info in infos:
+            name = os.path.basename(info.filename)
+            if info.file_size > ARCHIVE_MAX_FILE_SIZE:
+                raise ValueError(f'Файл {name} в архиве больше {ARCHIVE_MAX_FILE_SIZE // 1024 // 1024} МБ')
+            if name in members:
+                raise ValueError(f'Файл {name} встречается в архиве несколько раз')
+            members[name] = archive.read(info)
+    return members
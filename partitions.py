@@ -0,0 +1,151 @@
+import logging
+import threading
+import datetime as dt
+from django.db import DatabaseError, connection, transaction
+
+
+# таблицы расписания в PostgreSQL секционированы по дате: одна секция на день и секция по умолчанию
+# (см. миграцию 0006), поэтому устаревшее расписание удаляется сбросом секций, а не построчно
+known_partitions = {}
+partitions_lock = threading.Lock()
+
+
+def partition_name(table: str, date: dt.date) -> str:
+    """
+    Функция, возвращающая имя секции таблицы расписания на дату.
+
+    Аргументы:
+        table (str): Имя секционированной таблицы.
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        str: Имя секции вида <таблица>_pГГГГММДД.
+    """
+    return f'{table}_p{date.strftime("%Y%m%d")}'
+
+
+def partition_children(table: str) -> set:
+    """
+    Функция, читающая секции таблицы из каталога PostgreSQL.
+
+    Аргументы:
+        table (str): Имя таблицы.
+
+    Возвращает:
+        set: Имена секций таблицы или None если таблица не секционирована.
+    """
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [table])
+        if not cursor.fetchone():
+            return None
+        cursor.execute('SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = inhrelid '
+                       'WHERE inhparent = to_regclass(%s)', [table])
+        return {name for name, in cursor.fetchall()}
+
+
+def table_partitions(table: str) -> set:
+    """
+    Функция, возвращающая запомненные секции таблицы или None если таблица не секционирована.
+
+    Результат запоминается, чтобы не читать каталог при каждой загрузке расписания, и может отставать от базы,
+    если секции создаёт или удаляет другой процесс.
+
+    Аргументы:
+        table (str): Имя таблицы.
+
+    Возвращает:
+        set: Имена секций таблицы или None.
+    """
+    with partitions_lock:
+        if table in known_partitions:
+            return known_partitions[table]
+    partitions = partition_children(table)
+    with partitions_lock:
+        known_partitions[table] = partitions
+    return partitions
+
+
+def ensure_partitions(model: type, dates: list) -> None:
+    """
+    Функция создания секций таблицы расписания на даты перед сохранением расписания.
+
+    Если таблица не секционирована, функция ничего не делает. Если строки на дату уже лежат в секции
+    по умолчанию, секция не создаётся и строки остаются в ней. Функцию следует вызывать вне транзакции сохранения:
+    созданная секция запоминается только после фиксации транзакции, в которой она создана.
+
+    Аргументы:
+        model (type): Модель regular_schedule или uday_schedule.
+        dates (list): Даты сохраняемого расписания.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    table = model._meta.db_table
+    partitions = table_partitions(table)
+    if partitions is None:
+        return
+    quote = connection.ops.quote_name
+    for date in dates:
+        name = partition_name(table, date)
+        if name in partitions:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'CREATE TABLE IF NOT EXISTS {quote(name)} PARTITION OF {quote(table)} '
+                               f'FOR VALUES FROM (%s) TO (%s)', [date, date + dt.timedelta(days=1)])
+        except DatabaseError as ex:
+            logging.error(ex)
+            continue
+        # внутри внешней транзакции секция существует только после её фиксации
+        transaction.on_commit(lambda name=name: remember_partition(partitions, name))
+
+
+def remember_partition(partitions: set, name: str) -> None:
+    """
+    Функция, добавляющая созданную секцию к запомненным секциям таблицы.
+
+    Аргументы:
+        partitions (set): Запомненные секции таблицы, см. table_partitions.
+        name (str): Имя созданной секции.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    with partitions_lock:
+        partitions.add(name)
+
+
+def drop_partitions(model: type, before: dt.date) -> int:
+    """
+    Функция удаления секций таблицы расписания на даты раньше before.
+
+    Секции перечитываются из pg_inherits, а не берутся из запомненных в процессе: расписание загружают и бот,
+    и админ-панель, поэтому секции, созданные другим процессом, иначе никогда не были бы удалены. Запомненные
+    секции заменяются прочитанными.
+
+    Аргументы:
+        model (type): Модель regular_schedule или uday_schedule.
+        before (dt.date): Секции на даты раньше этой удаляются.
+
+    Возвращает:
+        int: Количество удалённых секций, 0 если таблица не секционирована.
+    """
+    table = model._meta.db_table
+    partitions = table_partitions(table)
+    if partitions is None:
+        return 0
+    children = partition_children(table) or set()
+    with partitions_lock:
+        partitions.clear()
+        partitions.update(children)
+    expired = [name for name in sorted(children) if name < partition_name(table, before)
+               and name[len(table) + 2:].isdigit()]
+    quote = connection.ops.quote_name
+    for name in expired:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {quote(name)}')
+        with partitions_lock:
+            partitions.discard(name)
+    return len(expired)
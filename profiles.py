@@ -0,0 +1,170 @@
+import threading
+from cachetools import TTLCache
+from db.models import users
+
+
+PROFILE_CACHE_SIZE = 10000
+PROFILE_TTL = 3600
+DRAFT_TTL = 3600
+# ttl ограничивает расхождение с базой данных, если профили меняются другим процессом (admin_panel.py)
+profiles_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_TTL)
+drafts_cache = TTLCache(maxsize=PROFILE_CACHE_SIZE, ttl=DRAFT_TTL)
+profiles_lock = threading.Lock()
+NOT_REGISTERED = object()
+
+
+def get_profile(user_id: int) -> users:
+    """
+    Функция получения профиля пользователя.
+
+    Функция возвращает профиль из кэша, а при его отсутствии читает профиль из базы данных и кэширует результат,
+    в том числе отсутствие профиля у незарегистрированного пользователя.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        users: Профиль пользователя или None если пользователь не зарегистрирован.
+    """
+    with profiles_lock:
+        profile = profiles_cache.get(user_id)
+    if profile is None:
+        profile = users.objects.filter(user_id=user_id).first() or NOT_REGISTERED
+        with profiles_lock:
+            profiles_cache[user_id] = profile
+    return None if profile is NOT_REGISTERED else profile
+
+
+def get_draft(user_id: int) -> users:
+    """
+    Функция получения черновика профиля, заполняемого при регистрации.
+
+    Черновик живёт только в памяти и начинается с копии текущего профиля, поэтому шаги выбора класса и групп
+    не обращаются к базе данных.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        users: Несохранённый профиль пользователя.
+    """
+    with profiles_lock:
+        draft = drafts_cache.get(user_id)
+    if draft is None:
+        draft = new_draft(user_id, get_profile(user_id))
+    return draft
+
+
+def new_draft(user_id: int, profile: users) -> users:
+    """
+    Функция создания черновика профиля из текущего профиля и его сохранения в кэш черновиков.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+        profile (users): Текущий профиль пользователя или None.
+
+    Возвращает:
+        users: Несохранённый профиль пользователя.
+    """
+    draft = users(user_id=user_id, class_letter=profile.class_letter if profile else '',
+                  group_number=profile.group_number if profile else 0,
+                  u_group_number=profile.u_group_number if profile else 0)
+    with profiles_lock:
+        drafts_cache[user_id] = draft
+    return draft
+
+
+def commit_draft(user_id: int) -> users:
+    """
+    Функция сохранения черновика профиля.
+
+    Функция записывает черновик в базу данных одним upsert-запросом и обновляет кэш профилей.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        users: Сохранённый профиль или None если черновика нет.
+    """
+    with profiles_lock:
+        draft = drafts_cache.pop(user_id, None)
+    if draft is None:
+        return None
+    users.objects.bulk_create([draft], update_conflicts=True, unique_fields=['user_id'],
+                              update_fields=['class_letter', 'group_number', 'u_group_number'])
+    with profiles_lock:
+        profiles_cache[user_id] = draft
+    return draft
+
+
+async def aget_profile(user_id: int) -> users:
+    """
+    Асинхронная версия get_profile: профиль читается из базы данных асинхронным запросом django.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        users: Профиль пользователя или None если пользователь не зарегистрирован.
+    """
+    with profiles_lock:
+        profile = profiles_cache.get(user_id)
+    if profile is None:
+        profile = await users.objects.filter(user_id=user_id).afirst() or NOT_REGISTERED
+        with profiles_lock:
+            profiles_cache[user_id] = profile
+    return None if profile is NOT_REGISTERED else profile
+
+
+async def aget_draft(user_id: int) -> users:
+    """
+    Асинхронная версия get_draft.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        users: Несохранённый профиль пользователя.
+    """
+    with profiles_lock:
+        draft = drafts_cache.get(user_id)
+    if draft is None:
+        draft = new_draft(user_id, await aget_profile(user_id))
+    return draft
+
+
+async def acommit_draft(user_id: int) -> users:
+    """
+    Асинхронная версия commit_draft.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        users: Сохранённый профиль или None если черновика нет.
+    """
+    with profiles_lock:
+        draft = drafts_cache.pop(user_id, None)
+    if draft is None:
+        return None
+    await users.objects.abulk_create([draft], update_conflicts=True, unique_fields=['user_id'],
+                                     update_fields=['class_letter', 'group_number', 'u_group_number'])
+    with profiles_lock:
+        profiles_cache[user_id] = draft
+    return draft
+
+
+def forget_profiles(user_ids: list) -> None:
+    """
+    Функция удаления профилей из кэша.
+
+    Аргументы:
+        user_ids (list): Идентификаторы пользователей.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    with profiles_lock:
+        for user_id in user_ids:
+            profiles_cache.pop(user_id, None)
+            drafts_cache.pop(user_id, None)
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import threading
+import datetime as dt
+from django.db import close_old_connections, transaction
+from db.models import regular_schedule
+from db.models import schedule_version
+from db.models import uday_schedule
+from metrics import schedule_stage_seconds
+from partitions import drop_partitions
+
+
+# расписание хранится RETENTION_DAYS дней после даты, на которую оно загружено
+RETENTION_DAYS = int(os.getenv('SCHEDULE_RETENTION_DAYS', 2))
+RETENTION_INTERVAL = float(os.getenv('SCHEDULE_RETENTION_INTERVAL', 3600))
+
+
+def retention_cutoff(today: dt.date = None) -> dt.date:
+    """
+    Функция, возвращающая первую дату, расписание на которую ещё хранится.
+
+    Аргументы:
+        today (dt.date): Текущая дата, по умолчанию сегодня.
+
+    Возвращает:
+        dt.date: Расписание на даты раньше этой считается устаревшим.
+    """
+    return (today or dt.date.today()) - dt.timedelta(days=RETENTION_DAYS)
+
+
+def purge_schedule(before: dt.date) -> dict:
+    """
+    Функция удаления устаревшего расписания.
+
+    В секционированных таблицах PostgreSQL секции устаревших дат удаляются целиком. Остальные строки удаляются
+    по одной дате за транзакцию по индексу, начинающемуся с даты, поэтому таблица не блокируется надолго.
+
+    Аргументы:
+        before (dt.date): Расписание на даты раньше этой удаляется.
+
+    Возвращает:
+        dict: Количество удалённых секций и строк.
+    """
+    stats = {'partitions': 0, 'rows': 0}
+    for model in (regular_schedule, uday_schedule):
+        stats['partitions'] += drop_partitions(model, before)
+        dates = model.objects.filter(date__lt=before).values_list('date', flat=True).distinct().order_by('date')
+        for date in list(dates):
+            with transaction.atomic():
+                stats['rows'] += model.objects.filter(date=date).delete()[0]
+    schedule_version.objects.filter(date__lt=before).delete()
+    return stats
+
+
+def retention_loop(on_purge: callable = None) -> None:
+    """
+    Функция фонового удаления устаревшего расписания раз в RETENTION_INTERVAL секунд.
+
+    Аргументы:
+        on_purge (callable): Функция, вызываемая с датой отсечения после каждого удаления, например сброс кэша.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    while True:
+        close_old_connections()
+        try:
+            before = retention_cutoff()
+            with schedule_stage_seconds.time(stage='retention'):
+                purge_schedule(before)
+            if on_purge:
+                on_purge(before)
+        except Exception as ex:
+            logging.error(ex)
+        time.sleep(RETENTION_INTERVAL)
+
+
+def start_retention(on_purge: callable = None) -> threading.Thread:
+    """
+    Функция запуска фонового удаления устаревшего расписания.
+
+    Аргументы:
+        on_purge (callable): Функция, вызываемая с датой отсечения после каждого удаления.
+
+    Возвращает:
+        threading.Thread: Поток удаления.
+    """
+    worker = threading.Thread(target=retention_loop, args=(on_purge,), daemon=True, name='schedule-retention')
+    worker.start()
+    return worker
+
+
+if __name__ == '__main__':
+    before = retention_cutoff()
+    print(f'Удалено расписание на даты раньше {before}: {purge_schedule(before)}')
@@ -0,0 +1,101 @@
+import inspect
+import telebot
+
+
+class CallbackRouter:
+    """
+    Маршрутизатор нажатий на кнопки.
+
+    callback_data вида 'маршрут=данные' разбирается один раз, а обработчик маршрута находится по словарю, поэтому
+    время выбора обработчика не зависит от количества маршрутов. Обработчик принимает коллбэк и данные после '='.
+
+    Промежуточные обработчики (middleware) - функции вида middleware(название маршрута, обработчик), возвращающие
+    обёрнутый обработчик с той же сигнатурой. Они применяются один раз при регистрации маршрута: общие
+    оборачивают обработчики маршрутов снаружи, а промежуточные обработчики маршрута - внутри, в порядке перечисления.
+
+    Аргументы:
+        middleware (list): Промежуточные обработчики всех маршрутов, включая неизвестный.
+    """
+    def __init__(self, middleware: list = ()) -> None:
+        self.middleware = list(middleware)
+        self.routes = {}
+        self.unknown = self.wrap('unknown', lambda callback, payload: None, ())
+
+    @staticmethod
+    def parse(data: str) -> tuple:
+        """
+        Функция разбора callback_data.
+
+        Аргументы:
+            data (str): callback_data кнопки.
+
+        Возвращает:
+            tuple: Маршрут и данные после первого '=', пустая строка если данных нет.
+        """
+        route, _, payload = (data or '').partition('=')
+        return route, payload
+
+    def wrap(self, name: str, handler: callable, middleware: tuple) -> callable:
+        """
+        Функция, оборачивающая обработчик маршрута промежуточными обработчиками.
+
+        Аргументы:
+            name (str): Название маршрута.
+            handler (callable): Обработчик маршрута.
+            middleware (tuple): Промежуточные обработчики маршрута.
+
+        Возвращает:
+            (callable): Обёрнутый обработчик.
+        """
+        for wrapper in reversed(self.middleware + list(middleware)):
+            handler = wrapper(name, handler)
+        return handler
+
+    def route(self, *keys: str, name: str = None, middleware: tuple = ()) -> callable:
+        """
+        Декоратор регистрации обработчика маршрута.
+
+        Аргументы:
+            keys (str): Маршруты, то есть callback_data до '=', которые обрабатывает обработчик.
+            name (str): Название маршрута в метриках, по умолчанию первый маршрут.
+            middleware (tuple): Промежуточные обработчики маршрута.
+
+        Возвращает:
+            (callable): Декоратор, возвращающий обработчик без изменений.
+        """
+        def decorator(handler: callable) -> callable:
+            wrapped = self.wrap(name or keys[0], handler, middleware)
+            for key in keys:
+                if key in self.routes:
+                    raise ValueError(f'маршрут {key} уже зарегистрирован')
+                self.routes[key] = wrapped
+            return handler
+        return decorator
+
+    def dispatch(self, callback: telebot.types.CallbackQuery):
+        """
+        Функция вызова обработчика маршрута нажатой кнопки.
+
+        Аргументы:
+            callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+
+        Возвращает:
+            Результат обработчика маршрута.
+        """
+        route, payload = self.parse(callback.data)
+        return self.routes.get(route, self.unknown)(callback, payload)
+
+    async def adispatch(self, callback: telebot.types.CallbackQuery):
+        """
+        Функция вызова обработчика маршрута нажатой кнопки в асинхронном боте.
+
+        Обработчики маршрутов асинхронного бота - корутинные функции, результат которых дожидается эта функция.
+
+        Аргументы:
+            callback (telebot.types.CallbackQuery): Коллбэк вызванный нажатием на кнопку.
+
+        Возвращает:
+            Результат обработчика маршрута.
+        """
+        result = self.dispatch(callback)
+        return await result if inspect.isawaitable(result) else result
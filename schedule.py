@@ -0,0 +1,267 @@
+import time
+import threading
+import datetime as dt
+from cachetools import TTLCache
+from django.db.models import F, Value
+from db.models import regular_schedule
+from db.models import uday_schedule
+from db.models import schedule_version
+from db.models import users
+
+
+# ключ кэша включает версию расписания на дату из таблицы schedule_version, которую увеличивает каждая загрузка,
+# поэтому загрузка в другом процессе (admin_panel.py) видна боту не позже чем через VERSION_CHECK_INTERVAL секунд
+schedule_cache = TTLCache(maxsize=4096, ttl=600)
+schedule_cache_lock = threading.Lock()
+VERSION_CHECK_INTERVAL = 5.0
+# {дата: (версия, время проверки по time.monotonic)}
+schedule_versions = {}
+
+
+def is_uday(class_letter: str, date: dt.date) -> bool:
+    """
+    Функция, проверяющая является ли день универ-днём для класса.
+
+    Аргументы:
+        class_letter (str): Класс пользователя, например '10 Μ'.
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        bool: True если в этот день у класса универ-день.
+    """
+    weekday = date.weekday()
+    return class_letter.startswith('11') and weekday == 2 or class_letter.startswith('10') and weekday == 0
+
+
+def render_schedule(uday_lessons: list, regular_lessons: list) -> str:
+    """
+    Функция, собирающая текст расписания из описаний уроков.
+
+    Аргументы:
+        uday_lessons (list): Описания пар универ-дня в порядке номеров.
+        regular_lessons (list): Описания уроков класса в порядке номеров.
+
+    Возвращает:
+        str: Текст расписания, пустая строка если уроков нет.
+    """
+    return '\n\n'.join(part for part in ('\n\n'.join(uday_lessons), '\n\n'.join(regular_lessons)) if part)
+
+
+def cached_version(date: dt.date) -> int:
+    """
+    Функция, возвращающая версию расписания на дату, если она проверялась не раньше VERSION_CHECK_INTERVAL
+    секунд назад.
+
+    Аргументы:
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        int: Версия расписания или None если её нужно прочитать из базы данных.
+    """
+    with schedule_cache_lock:
+        version, checked = schedule_versions.get(date, (None, 0.0))
+    return version if time.monotonic() - checked < VERSION_CHECK_INTERVAL else None
+
+
+def remember_version(date: dt.date, version: int) -> int:
+    """
+    Функция сохранения прочитанной версии расписания на дату.
+
+    Аргументы:
+        date (dt.date): Дата расписания.
+        version (int): Версия расписания, None если расписание на дату ещё не загружалось.
+
+    Возвращает:
+        int: Версия расписания, 0 если расписание на дату ещё не загружалось.
+    """
+    version = version or 0
+    with schedule_cache_lock:
+        schedule_versions[date] = (version, time.monotonic())
+    return version
+
+
+def get_schedule_version(date: dt.date) -> int:
+    """
+    Функция получения версии расписания на дату.
+
+    Аргументы:
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        int: Версия расписания, 0 если расписание на дату ещё не загружалось.
+    """
+    version = cached_version(date)
+    if version is None:
+        version = remember_version(date, schedule_version.objects.filter(date=date)
+                                   .values_list('version', flat=True).first())
+    return version
+
+
+async def aget_schedule_version(date: dt.date) -> int:
+    """
+    Асинхронная версия get_schedule_version.
+
+    Аргументы:
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        int: Версия расписания, 0 если расписание на дату ещё не загружалось.
+    """
+    version = cached_version(date)
+    if version is None:
+        version = remember_version(date, await schedule_version.objects.filter(date=date)
+                                   .values_list('version', flat=True).afirst())
+    return version
+
+
+def bump_schedule_version(date: dt.date) -> int:
+    """
+    Функция увеличения версии расписания на дату. Вызывается в транзакции сохранения расписания.
+
+    Аргументы:
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        int: Новая версия расписания.
+    """
+    if not schedule_version.objects.filter(date=date).update(version=F('version') + 1):
+        schedule_version.objects.create(date=date, version=1)
+    return schedule_version.objects.get(date=date).version
+
+
+def get_schedule_text(user: users, date: dt.date) -> str:
+    """
+    Функция получения текста расписания пользователя на дату.
+
+    Функция возвращает готовый текст из кэша, а при его отсутствии читает расписание из базы данных
+    и сохраняет результат в кэш по ключу (класс, группа, группа универ-дня, дата, версия расписания).
+    Пустой результат не кэшируется, чтобы расписание было видно сразу после загрузки.
+
+    Аргументы:
+        user (users): Пользователь, запросивший расписание.
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        str: Текст расписания, пустая строка если расписание на дату не загружено.
+    """
+    key = (user.class_letter, user.group_number, user.u_group_number, date, get_schedule_version(date))
+    with schedule_cache_lock:
+        text = schedule_cache.get(key)
+    if text is not None:
+        return text
+    uday_lessons, regular_lessons = [], []
+    for kind, _, lesson_info in schedule_lessons(user, date):
+        (regular_lessons if kind else uday_lessons).append(lesson_info)
+    text = render_schedule(uday_lessons, regular_lessons)
+    if text:
+        with schedule_cache_lock:
+            schedule_cache[key] = text
+    return text
+
+
+async def aget_schedule_text(user: users, date: dt.date) -> str:
+    """
+    Асинхронная версия get_schedule_text: при промахе кэша расписание читается асинхронным запросом django.
+
+    Аргументы:
+        user (users): Пользователь, запросивший расписание.
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        str: Текст расписания, пустая строка если расписание на дату не загружено.
+    """
+    key = (user.class_letter, user.group_number, user.u_group_number, date, await aget_schedule_version(date))
+    with schedule_cache_lock:
+        text = schedule_cache.get(key)
+    if text is not None:
+        return text
+    uday_lessons, regular_lessons = [], []
+    async for kind, _, lesson_info in schedule_lessons(user, date):
+        (regular_lessons if kind else uday_lessons).append(lesson_info)
+    text = render_schedule(uday_lessons, regular_lessons)
+    if text:
+        with schedule_cache_lock:
+            schedule_cache[key] = text
+    return text
+
+
+def schedule_lessons(user: users, date: dt.date):
+    """
+    Функция, возвращающая запрос уроков пользователя на дату.
+
+    Пары универ-дня (kind=0) и уроки класса (kind=1) читаются одним упорядоченным запросом.
+
+    Аргументы:
+        user (users): Пользователь, запросивший расписание.
+        date (dt.date): Дата расписания.
+
+    Возвращает:
+        QuerySet: Кортежи (kind, номер урока, информация об уроке) в порядке вывода.
+    """
+    uday_flag = is_uday(user.class_letter, date)
+    gr_num = 0 if uday_flag else user.group_number
+    lessons = regular_schedule.objects.filter(date=date, class_letter=user.class_letter, group_number=gr_num)\
+        .annotate(kind=Value(1)).values_list('kind', 'lesson_number', 'lesson_info').order_by()
+    if uday_flag:
+        lessons = uday_schedule.objects.filter(date=date, group_number=user.u_group_number)\
+            .annotate(kind=Value(0)).values_list('kind', 'lesson_number', 'lesson_info').order_by()\
+            .union(lessons, all=True)
+    return lessons.order_by('kind', 'lesson_number')
+
+
+def invalidate_schedule_cache(date: dt.date = None, before: dt.date = None) -> None:
+    """
+    Функция сброса кэша расписаний.
+
+    Аргументы:
+        date (dt.date): Дата, записи на которую удаляются из кэша.
+        before (dt.date): Записи на даты раньше этой удаляются из кэша.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    with schedule_cache_lock:
+        for key in list(schedule_cache.keys()):
+            if key[3] == date or before and key[3] < before:
+                schedule_cache.pop(key, None)
+        for key in list(schedule_versions):
+            if key == date or before and key < before:
+                schedule_versions.pop(key, None)
+
+
+def fill_schedule_cache(date: dt.date, regular_rows: list, uday_rows: list, version: int) -> None:
+    """
+    Функция заполнения кэша расписаний после загрузки.
+
+    Функция сбрасывает кэш на дату и заранее собирает тексты расписаний для всех комбинаций класса и групп
+    зарегистрированных пользователей из только что сохранённых записей, не обращаясь к таблицам расписания.
+
+    Аргументы:
+        date (dt.date): Дата загруженного расписания.
+        regular_rows (list): Сохранённые записи regular_schedule.
+        uday_rows (list): Сохранённые записи uday_schedule.
+        version (int): Версия расписания на дату после загрузки, см. bump_schedule_version.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    regular_lessons, uday_lessons = {}, {}
+    for row in sorted(regular_rows, key=lambda row: row.lesson_number):
+        regular_lessons.setdefault((row.class_letter, row.group_number), []).append(row.lesson_info)
+    for row in sorted(uday_rows, key=lambda row: row.lesson_number):
+        uday_lessons.setdefault(row.group_number, []).append(row.lesson_info)
+    rendered = {}
+    for class_letter, group_number, u_group_number in users.objects.values_list(
+            'class_letter', 'group_number', 'u_group_number').distinct():
+        if not class_letter:
+            continue
+        uday_flag = is_uday(class_letter, date)
+        gr_num = 0 if uday_flag else group_number
+        text = render_schedule(uday_lessons.get(u_group_number, []) if uday_flag else [],
+                               regular_lessons.get((class_letter, gr_num), []))
+        if text:
+            rendered[(class_letter, group_number, u_group_number, date, version)] = text
+    invalidate_schedule_cache(date)
+    remember_version(date, version)
+    with schedule_cache_lock:
+        schedule_cache.update(rendered)
@@ -0,0 +1,84 @@
+import os
+import sys
+import shutil
+import tempfile
+import pytest
+
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+DATABASE_DIR = tempfile.mkdtemp(prefix='schedule-bot-tests-')
+
+
+def create_database(path: str) -> None:
+    """
+    Функция настройки django на базу SQLite и создания таблиц по текущим моделям.
+
+    В SQLite у varchar должна быть длина, а поле users.class_letter объявлено без неё, как допускает PostgreSQL,
+    поэтому таким полям длина задаётся перед созданием таблиц.
+
+    Аргументы:
+        path (str): Путь файла базы данных.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    import django
+    from django.apps import apps
+    from django.conf import settings
+    from django.db import connection
+    settings.configure(INSTALLED_APPS=['db'],
+                       DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path}})
+    django.setup()
+    with connection.schema_editor() as editor:
+        for model in apps.get_app_config('db').get_models():
+            for field in model._meta.fields:
+                if field.get_internal_type() == 'CharField' and not field.max_length:
+                    field.max_length = 255
+            editor.create_model(model)
+
+
+def pytest_configure(config) -> None:
+    """
+    Функция настройки django на временную базу SQLite до импорта тестовых модулей.
+
+    db/models.py при импорте настраивает django на базу из переменных окружения, только если django ещё
+    не настроен, поэтому база тестов настраивается здесь, до сбора тестов.
+
+    Аргументы:
+        config (pytest.Config): Конфигурация pytest.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    create_database(os.path.join(DATABASE_DIR, 'tests.sqlite3'))
+
+
+def pytest_unconfigure(config) -> None:
+    """
+    Функция удаления временной базы SQLite после тестов.
+
+    Аргументы:
+        config (pytest.Config): Конфигурация pytest.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    from django.db import connections
+    connections.close_all()
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    """
+    Фикстура, очищающая таблицы и кэши процесса после каждого теста.
+    """
+    yield
+    from django.apps import apps
+    from profiles import drafts_cache, profiles_cache
+    from schedule import schedule_cache, schedule_versions
+    for model in apps.get_app_config('db').get_models():
+        model.objects.all().delete()
+    for cache in (schedule_cache, schedule_versions, profiles_cache, drafts_cache):
+        cache.clear()
@@ -0,0 +1,114 @@
+import threading
+from types import SimpleNamespace
+import pytest
+from telebot.apihelper import ApiTelegramException
+import broadcast
+from broadcast import ChatLimiter, TokenBucket
+
+
+class Clock:
+    """
+    Подменяемое время time.monotonic, которое сдвигает только тест.
+    """
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(broadcast, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def fast_limits(monkeypatch):
+    monkeypatch.setattr(broadcast, 'global_bucket', TokenBucket(10 ** 6, 10 ** 6))
+    monkeypatch.setattr(broadcast, 'chat_limiter', ChatLimiter(0))
+
+
+def api_error(error_code, description='', retry_after=None):
+    result_json = {'error_code': error_code, 'description': description}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('sendMessage', SimpleNamespace(status_code=error_code), result_json)
+
+
+def test_token_bucket_reserve_and_refill(clock):
+    bucket = TokenBucket(rate=2, capacity=2)
+
+    assert bucket.reserve() == bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 0.5
+    assert bucket.reserve() == 0
+
+
+def test_token_bucket_pause(clock):
+    bucket = TokenBucket(rate=30, capacity=30)
+
+    bucket.pause(3)
+
+    assert bucket.reserve() == pytest.approx(3)
+    clock.now += 3
+    assert bucket.reserve() == pytest.approx(1 / 30)
+    clock.now += 1
+    assert bucket.reserve() == 0
+
+
+def test_chat_limiter_spaces_messages_to_one_chat(clock):
+    limiter = ChatLimiter(interval=1)
+
+    assert limiter.reserve(1) == 0
+    assert limiter.reserve(1) == pytest.approx(1)
+    assert limiter.reserve(2) == 0
+    clock.now += 2
+    assert limiter.reserve(1) == 0
+
+
+def test_broadcast_counts_results(fast_limits):
+    sent, lock = [], threading.Lock()
+    blocked = []
+
+    def send(chat_id):
+        if chat_id == 2:
+            raise api_error(403, broadcast.BLOCKED_DESCRIPTIONS[0])
+        if chat_id == 3:
+            raise api_error(400, 'Bad Request: chat not found')
+        with lock:
+            sent.append(chat_id)
+
+    stats = broadcast.broadcast([1, 2, 3, 4], send, on_blocked=blocked.extend)
+
+    assert sorted(sent) == [1, 4]
+    assert blocked == [2]
+    assert (stats['sent'], stats['failed'], stats['blocked']) == (2, 1, 1)
+
+
+def test_broadcast_retries_after_429(fast_limits):
+    attempts = []
+
+    def send(chat_id):
+        attempts.append(chat_id)
+        if len(attempts) == 1:
+            raise api_error(429, 'Too Many Requests', retry_after=0)
+
+    stats = broadcast.broadcast([1], send)
+
+    assert attempts == [1, 1]
+    assert stats['sent'] == 1
+
+
+def test_broadcast_gives_up_after_max_retries(fast_limits):
+    attempts = []
+
+    def send(chat_id):
+        attempts.append(chat_id)
+        raise api_error(429, 'Too Many Requests', retry_after=0)
+
+    stats = broadcast.broadcast([1], send)
+
+    assert len(attempts) == broadcast.MAX_RETRIES + 1
+    assert stats['failed'] == 1
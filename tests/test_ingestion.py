@@ -0,0 +1,118 @@
+import datetime as dt
+from db.models import regular_schedule
+from db.models import uday_schedule
+from db.models import schedule_version
+from db.models import users
+from ingestion import REGULAR_LESSON_KEY, UDAY_LESSON_KEY, apply_schedule_diff, save_schedule
+from schedule import get_schedule_text, schedule_cache
+
+
+DATE = dt.date(2030, 9, 3)
+
+
+def lessons(*infos, class_letter='10 Μ', group_number=1):
+    return [regular_schedule(date=DATE, class_letter=class_letter, group_number=group_number, lesson_number=number,
+                             lesson_info=info) for number, info in enumerate(infos, 1)]
+
+
+def stored_lessons():
+    return list(regular_schedule.objects.filter(date=DATE).order_by('lesson_number')
+                .values_list('lesson_number', 'lesson_info'))
+
+
+def test_first_upload_adds_all_lessons():
+    diff = apply_schedule_diff(regular_schedule, DATE, lessons('алгебра', 'физика'), REGULAR_LESSON_KEY)
+
+    assert diff['added'] == [('10 Μ', 1, 1), ('10 Μ', 1, 2)]
+    assert diff['changed'] == diff['removed'] == []
+    assert diff['stored'] == 0
+    assert stored_lessons() == [(1, 'алгебра'), (2, 'физика')]
+
+
+def test_same_upload_changes_nothing():
+    apply_schedule_diff(regular_schedule, DATE, lessons('алгебра', 'физика'), REGULAR_LESSON_KEY)
+    ids = set(regular_schedule.objects.values_list('id', flat=True))
+
+    diff = apply_schedule_diff(regular_schedule, DATE, lessons('алгебра', 'физика'), REGULAR_LESSON_KEY)
+
+    assert diff['added'] == diff['changed'] == diff['removed'] == []
+    assert diff['lessons'] == {}
+    assert set(regular_schedule.objects.values_list('id', flat=True)) == ids
+
+
+def test_diff_updates_inserts_and_deletes_only_changed_lessons():
+    apply_schedule_diff(regular_schedule, DATE, lessons('алгебра', 'физика', 'химия'), REGULAR_LESSON_KEY)
+    kept_id = regular_schedule.objects.get(lesson_number=1).id
+    rows = lessons('алгебра', 'история') + [regular_schedule(date=DATE, class_letter='10 Μ', group_number=2,
+                                                              lesson_number=1, lesson_info='биология')]
+
+    diff = apply_schedule_diff(regular_schedule, DATE, rows, REGULAR_LESSON_KEY)
+
+    assert diff['added'] == [('10 Μ', 2, 1)]
+    assert diff['changed'] == [('10 Μ', 1, 2)]
+    assert diff['removed'] == [('10 Μ', 1, 3)]
+    assert diff['stored'] == 3
+    assert diff['lessons'] == {('10 Μ', 2, 1): 'биология', ('10 Μ', 1, 2): 'история'}
+    assert regular_schedule.objects.get(lesson_number=1, group_number=1).id == kept_id
+    assert set(regular_schedule.objects.values_list('group_number', 'lesson_number', 'lesson_info')) == {
+        (1, 1, 'алгебра'), (1, 2, 'история'), (2, 1, 'биология')}
+
+
+def test_empty_upload_deletes_all_lessons():
+    apply_schedule_diff(regular_schedule, DATE, lessons('алгебра', 'физика'), REGULAR_LESSON_KEY)
+
+    diff = apply_schedule_diff(regular_schedule, DATE, [], REGULAR_LESSON_KEY)
+
+    assert diff['removed'] == [('10 Μ', 1, 1), ('10 Μ', 1, 2)]
+    assert stored_lessons() == []
+
+
+def test_diff_does_not_touch_other_dates():
+    other = regular_schedule(date=DATE + dt.timedelta(days=1), class_letter='10 Μ', group_number=1, lesson_number=1,
+                             lesson_info='алгебра')
+    other.save()
+
+    apply_schedule_diff(regular_schedule, DATE, [], REGULAR_LESSON_KEY)
+    apply_schedule_diff(regular_schedule, DATE, lessons('физика'), REGULAR_LESSON_KEY)
+
+    assert regular_schedule.objects.filter(pk=other.pk).exists()
+
+
+def test_duplicate_keys_replace_date_entirely():
+    apply_schedule_diff(regular_schedule, DATE, lessons('алгебра', 'физика'), REGULAR_LESSON_KEY)
+    rows = lessons('химия') + lessons('биология')
+
+    diff = apply_schedule_diff(regular_schedule, DATE, rows, REGULAR_LESSON_KEY)
+
+    assert diff['removed'] == [('10 Μ', 1, 1), ('10 Μ', 1, 2)]
+    assert diff['added'] == [('10 Μ', 1, 1)]
+    assert sorted(info for _, info in stored_lessons()) == ['биология', 'химия']
+
+
+def test_uday_key_ignores_class():
+    rows = [uday_schedule(date=DATE, group_number=3, lesson_number=1, lesson_info='лекция')]
+    apply_schedule_diff(uday_schedule, DATE, rows, UDAY_LESSON_KEY)
+    rows = [uday_schedule(date=DATE, group_number=3, lesson_number=1, lesson_info='семинар')]
+
+    diff = apply_schedule_diff(uday_schedule, DATE, rows, UDAY_LESSON_KEY)
+
+    assert diff['changed'] == [(3, 1)]
+    assert list(uday_schedule.objects.values_list('lesson_info', flat=True)) == ['семинар']
+
+
+def test_save_schedule_bumps_version_only_on_change():
+    user = users.objects.create(user_id=1, class_letter='10 Μ', group_number=1, u_group_number=1)
+
+    diffs, error = save_schedule({DATE: (lessons('алгебра'), [])})
+    assert error is None
+    assert diffs[DATE]['regular']['added'] == [('10 Μ', 1, 1)]
+    assert schedule_version.objects.get(date=DATE).version == 1
+    assert get_schedule_text(user, DATE) == 'алгебра'
+
+    save_schedule({DATE: (lessons('алгебра'), [])})
+    assert schedule_version.objects.get(date=DATE).version == 1
+
+    save_schedule({DATE: (lessons('физика'), [])})
+    assert schedule_version.objects.get(date=DATE).version == 2
+    assert get_schedule_text(user, DATE) == 'физика'
+    assert all(key[4] == 2 for key in schedule_cache if key[3] == DATE)
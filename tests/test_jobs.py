@@ -0,0 +1,226 @@
+import time
+import threading
+import pytest
+from django.db import connection
+from django.utils import timezone
+import broadcast
+import jobs
+from db.models import broadcast_job
+from db.models import users
+from jobs import cancel_job, claim_job, job_heartbeat, run_job, submit_job
+
+
+class Crash(Exception):
+    """
+    Падение обработчика рассылки посреди задания.
+    """
+
+
+class FakeBot:
+    """
+    Бот, запоминающий отправленные сообщения вместо запросов к Telegram.
+
+    Аргументы:
+        on_progress (callable): Функция, вызываемая при обновлении сообщения с прогрессом рассылки.
+    """
+    def __init__(self, on_progress: callable = None) -> None:
+        self.sent = []
+        self.lock = threading.Lock()
+        self.on_progress = on_progress
+
+    def send_message(self, chat_id, text, reply_markup=None):
+        with self.lock:
+            self.sent.append((chat_id, text))
+
+    def edit_message_text(self, text, chat_id, message_id):
+        if self.on_progress:
+            self.on_progress()
+
+    def recipients(self):
+        return sorted(chat_id for chat_id, _ in self.sent)
+
+
+@pytest.fixture(autouse=True)
+def fast_broadcast(monkeypatch):
+    monkeypatch.setattr(broadcast, 'global_bucket', broadcast.TokenBucket(10 ** 6, 10 ** 6))
+    monkeypatch.setattr(broadcast, 'chat_limiter', broadcast.ChatLimiter(0))
+    monkeypatch.setattr(jobs, 'JOB_CHUNK_SIZE', 3)
+
+
+def make_users(count):
+    users.objects.bulk_create([users(user_id=user_id, class_letter='10 Μ', group_number=user_id % 2,
+                                     u_group_number=1) for user_id in range(1, count + 1)])
+
+
+def make_stale(job):
+    broadcast_job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - jobs.STALE_AFTER * 2)
+
+
+def test_claim_takes_oldest_pending_job_once():
+    first, second = submit_job('all', 'первая'), submit_job('all', 'вторая')
+
+    assert claim_job().pk == first.pk
+    assert claim_job().pk == second.pk
+    assert claim_job() is None
+    assert set(broadcast_job.objects.values_list('status', flat=True)) == {'running'}
+
+
+def test_concurrent_claims_get_job_once():
+    job = submit_job('all', 'текст')
+    barrier = threading.Barrier(8)
+    claimed = []
+
+    def claim():
+        try:
+            barrier.wait()
+            claimed.append(claim_job())
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [claimed_job.pk for claimed_job in claimed if claimed_job] == [job.pk]
+
+
+def test_stale_running_job_is_reclaimed():
+    job = submit_job('all', 'текст')
+    claim_job()
+    assert claim_job() is None
+
+    make_stale(job)
+
+    assert claim_job().pk == job.pk
+
+
+def test_run_job_sends_to_all_recipients():
+    make_users(7)
+    job = submit_job('all', 'текст')
+    bot = FakeBot()
+
+    run_job(bot, claim_job())
+
+    job.refresh_from_db()
+    assert sorted(bot.sent) == [(user_id, 'текст') for user_id in range(1, 8)]
+    assert (job.status, job.cursor, job.sent, job.failed, job.blocked) == ('done', 7, 7, 0, 0)
+
+
+def test_resume_after_crash_continues_from_cursor():
+    make_users(10)
+    job = submit_job('all', 'текст', admin_id=1, progress_message_id=1)
+
+    def crash_after_second_chunk():
+        if len(crashed_bot.sent) >= 6:
+            raise Crash()
+
+    crashed_bot = FakeBot(on_progress=crash_after_second_chunk)
+    with pytest.raises(Crash):
+        run_job(crashed_bot, claim_job())
+    job.refresh_from_db()
+    assert (job.status, job.cursor, job.sent) == ('running', 6, 6)
+    assert claim_job() is None
+
+    make_stale(job)
+    bot = FakeBot()
+    run_job(bot, claim_job())
+
+    job.refresh_from_db()
+    assert crashed_bot.recipients() == list(range(1, 7))
+    assert bot.recipients() == list(range(7, 11))
+    assert (job.status, job.cursor, job.sent) == ('done', 10, 10)
+
+
+def test_heartbeat_runs_while_job_sends(monkeypatch):
+    monkeypatch.setattr(jobs, 'HEARTBEAT_INTERVAL', 0.01)
+    make_users(30)
+    job = submit_job('all', 'текст')
+    bot = FakeBot()
+    send_message = bot.send_message
+
+    def slow_send_message(chat_id, text, reply_markup=None):
+        time.sleep(0.01)
+        send_message(chat_id, text)
+
+    bot.send_message = slow_send_message
+    claimed = claim_job()
+    with job_heartbeat(claimed):
+        run_job(bot, claimed)
+
+    job.refresh_from_db()
+    assert bot.recipients() == list(range(1, 31))
+    assert (job.status, job.cursor, job.sent) == ('done', 30, 30)
+
+
+def test_cancel_stops_after_current_chunk_and_keeps_counters():
+    make_users(10)
+    job = submit_job('all', 'текст', admin_id=1, progress_message_id=1)
+    bot = FakeBot(on_progress=lambda: cancel_job(job.pk))
+
+    run_job(bot, claim_job())
+
+    job.refresh_from_db()
+    assert bot.recipients() == list(range(1, 7))
+    assert (job.status, job.cursor, job.sent) == ('cancelled', 6, 6)
+    assert not cancel_job(job.pk)
+    assert claim_job() is None
+
+
+def test_cancel_pending_job():
+    job = submit_job('all', 'текст')
+
+    assert cancel_job(job.pk)
+
+    assert broadcast_job.objects.get(pk=job.pk).status == 'cancelled'
+    assert claim_job() is None
+
+
+def test_audience_job_sends_profile_texts():
+    make_users(4)
+    job = submit_job('all', audience={('10 Μ', 1, 1): 'нечётным', ('10 Μ', 0, 1): 'чётным', ('11 Μ', 0, 1): 'нет'})
+    bot = FakeBot()
+    assert job.total == 4
+
+    run_job(bot, claim_job())
+
+    assert sorted(bot.sent) == [(1, 'нечётным'), (2, 'чётным'), (3, 'нечётным'), (4, 'чётным')]
+
+
+def test_audience_text_survives_429_retry():
+    make_users(2)
+    submit_job('all', 'общий', audience={('10 Μ', 1, 1): 'нечётным', ('10 Μ', 0, 1): 'чётным'})
+    bot = FakeBot()
+    attempts = []
+
+    def send_message(chat_id, text, reply_markup=None):
+        attempts.append(chat_id)
+        if attempts.count(chat_id) == 1:
+            raise jobs.ApiTelegramException('sendMessage', None, {
+                'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': 0}})
+        FakeBot.send_message(bot, chat_id, text)
+
+    bot.send_message = send_message
+    run_job(bot, claim_job())
+
+    assert sorted(bot.sent) == [(1, 'нечётным'), (2, 'чётным')]
+
+
+def test_blocked_recipients_are_deleted():
+    make_users(3)
+    submit_job('all', 'текст')
+    bot = FakeBot()
+
+    def send_message(chat_id, text, reply_markup=None):
+        if chat_id == 2:
+            raise jobs.ApiTelegramException('sendMessage', None, {
+                'error_code': 403, 'description': broadcast.BLOCKED_DESCRIPTIONS[0]})
+        FakeBot.send_message(bot, chat_id, text)
+
+    bot.send_message = send_message
+    run_job(bot, claim_job())
+
+    job = broadcast_job.objects.get()
+    assert (job.sent, job.blocked) == (2, 1)
+    assert list(users.objects.order_by('user_id').values_list('user_id', flat=True)) == [1, 3]
@@ -0,0 +1,127 @@
+import json
+import queue
+import logging
+from types import SimpleNamespace
+import pytest
+import logs
+from logs import StructuredQueueHandler, WindowedDedup, log_stats, setup_logging, stop_logging
+
+
+def fail_in_schedule():
+    raise ValueError('нет расписания')
+
+
+def fail_in_profile():
+    raise ValueError('нет расписания')
+
+
+def error_record(fail, handler='schedule'):
+    """
+    Функция, собирающая запись вида logging.error(ex) из log_handler_error в metrics.py: все ошибки обработчиков
+    записываются из одной строки.
+    """
+    try:
+        fail()
+    except ValueError as ex:
+        record = logging.LogRecord('root', logging.ERROR, 'metrics.py', 42, ex, None, None)
+    record.handler = handler
+    return record
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(logs, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_repeats_in_window_are_counted(clock):
+    dedup = WindowedDedup(window=60)
+    suppressed = log_stats['suppressed']
+
+    assert dedup.filter(error_record(fail_in_schedule))
+    assert [dedup.filter(error_record(fail_in_schedule)) for _ in range(4)] == [False] * 4
+    assert log_stats['suppressed'] - suppressed == 4
+
+    clock.now += 60
+    record = error_record(fail_in_schedule)
+    assert dedup.filter(record)
+    assert record.suppressed == 4
+    assert dedup.filter(error_record(fail_in_schedule)) is False
+
+
+def test_first_record_in_window_has_no_suppressed_field(clock):
+    dedup = WindowedDedup(window=60)
+    dedup.filter(error_record(fail_in_schedule))
+    clock.now += 60
+
+    record = error_record(fail_in_schedule)
+
+    assert dedup.filter(record)
+    assert not hasattr(record, 'suppressed')
+
+
+def test_different_handlers_are_not_merged(clock):
+    dedup = WindowedDedup(window=60)
+
+    assert dedup.filter(error_record(fail_in_schedule, handler='schedule'))
+    assert dedup.filter(error_record(fail_in_schedule, handler='settings'))
+
+
+def test_different_raise_sites_are_not_merged(clock):
+    dedup = WindowedDedup(window=60)
+    schedule_record, profile_record = error_record(fail_in_schedule), error_record(fail_in_profile)
+
+    assert dedup.filter(schedule_record)
+    assert dedup.filter(profile_record)
+    assert schedule_record.raised_at != profile_record.raised_at
+    assert schedule_record.raised_at.startswith('test_logs.py:')
+
+
+def test_records_without_exception_use_logging_site(clock):
+    dedup = WindowedDedup(window=60)
+
+    def record(lineno):
+        return logging.LogRecord('root', logging.ERROR, 'bot.py', lineno, 'ошибка', None, None)
+
+    assert dedup.filter(record(10))
+    assert not dedup.filter(record(10))
+    assert dedup.filter(record(11))
+    assert not hasattr(record(10), 'raised_at')
+
+
+def test_full_queue_drops_and_reports_count():
+    handler = StructuredQueueHandler(queue.Queue(1))
+    dropped = log_stats['dropped']
+
+    for _ in range(3):
+        handler.handle(logging.LogRecord('root', logging.ERROR, 'bot.py', 10, 'ошибка', None, None))
+    handler.queue.get_nowait()
+    handler.handle(logging.LogRecord('root', logging.ERROR, 'bot.py', 10, 'ошибка', None, None))
+
+    assert log_stats['dropped'] - dropped == 2
+    assert handler.queue.get_nowait().dropped == 2
+
+
+def test_setup_logging_writes_json_lines(tmp_path):
+    filename = tmp_path / 'bot.log'
+    root = logging.getLogger()
+    level = root.level
+    try:
+        setup_logging(str(filename))
+        for _ in range(3):
+            try:
+                fail_in_schedule()
+            except ValueError as ex:
+                logging.error(ex, extra={'handler': 'schedule', 'user_id': 7})
+    finally:
+        stop_logging()
+        root.setLevel(level)
+    stop_logging()
+
+    entries = [json.loads(line) for line in filename.read_text(encoding='utf-8').splitlines()]
+    assert len(entries) == 1
+    assert entries[0]['exc_type'] == 'ValueError'
+    assert entries[0]['handler'] == 'schedule'
+    assert entries[0]['user_id'] == 7
+    assert entries[0]['raised_at'].startswith('test_logs.py:')
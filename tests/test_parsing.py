@@ -0,0 +1,210 @@
+import io
+import zipfile
+import datetime as dt
+from types import SimpleNamespace
+import openpyxl
+import pytest
+import parsing
+from parsing import (archive_members, get_parse_pool, merged_ranges, parse_grade, reset_parse_pool, sheet_values,
+                     submit_schedule_parsing)
+
+
+def read_only_sheet(fill):
+    """
+    Функция, сохраняющая страницу, заполненную функцией fill, и открывающая её в режиме read_only, как при разборе.
+    """
+    workbook = openpyxl.Workbook()
+    fill(workbook.active)
+    data = io.BytesIO()
+    workbook.save(data)
+    return openpyxl.load_workbook(io.BytesIO(data.getvalue()), read_only=True, data_only=True).worksheets[0]
+
+
+def class_headers(sheet):
+    sheet.cell(2, 4, '10 Μ')
+    sheet.merge_cells(start_row=2, start_column=4, end_row=2, end_column=5)
+    sheet.cell(3, 4, 'гр.А')
+    sheet.cell(3, 5, 'гр. Б')
+    sheet.cell(4, 4, 'Общий урок\n\nкаб. 100')
+    sheet.merge_cells(start_row=4, start_column=4, end_row=5, end_column=5)
+
+
+def test_merged_ranges_reads_boundaries():
+    sheet = read_only_sheet(class_headers)
+
+    assert sorted(merged_ranges(sheet)) == [(4, 2, 5, 2), (4, 4, 5, 5)]
+
+
+def test_merged_ranges_without_merges():
+    assert merged_ranges(read_only_sheet(lambda sheet: sheet.cell(1, 1, 'x'))) == []
+
+
+def test_merged_ranges_requires_sheet_xml():
+    with pytest.raises(RuntimeError):
+        merged_ranges(SimpleNamespace())
+
+
+def test_sheet_values_copies_parent_value_into_merged_cells():
+    values = sheet_values(read_only_sheet(class_headers))
+
+    assert values[(2, 4)] == values[(2, 5)] == '10 Μ'
+    assert values[(3, 4)] == 'гр.А' and values[(3, 5)] == 'гр. Б'
+    assert {values[(row, col)] for row in (4, 5) for col in (4, 5)} == {'Общий урок\n\nкаб. 100'}
+    assert len(values) == 8
+
+
+def test_sheet_values_clips_to_grid():
+    def fill(sheet):
+        sheet.cell(3, 3, 'на границе')
+        sheet.merge_cells(start_row=3, start_column=3, end_row=6, end_column=6)
+        sheet.cell(1, 7, 'за сеткой')
+        sheet.cell(7, 1, 'под сеткой')
+        sheet.merge_cells(start_row=7, start_column=1, end_row=8, end_column=2)
+
+    values = sheet_values(read_only_sheet(fill), max_row=4, max_col=4)
+
+    assert values == {(3, 3): 'на границе', (3, 4): 'на границе', (4, 3): 'на границе', (4, 4): 'на границе'}
+
+
+def test_sheet_values_skips_empty_cells():
+    def fill(sheet):
+        sheet.cell(1, 1, 'урок')
+        sheet.cell(1, 2, None)
+        sheet.cell(2, 2, 0)
+
+    assert sheet_values(read_only_sheet(fill)) == {(1, 1): 'урок', (2, 2): 0}
+
+
+def grade_workbook(grades=(10, 11), lessons=2):
+    """
+    Функция, собирающая файл с обычным расписанием в раскладке реальных файлов: на странице параллели десять
+    классов по две группы, заголовок класса объединён над группами, первый урок общий для обеих групп,
+    остальные уроки только у группы А.
+    """
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for grade in grades:
+        sheet = workbook.create_sheet(str(grade))
+        for i in range(lessons):
+            sheet.cell(4 + i, 2, i + 1)
+            sheet.cell(4 + i, 3, f'{8 + i}:30-\n{9 + i}:15')
+        for k in range(10):
+            col = 4 + 2 * k
+            sheet.cell(2, col, f'{grade} {k}')
+            sheet.merge_cells(start_row=2, start_column=col, end_row=2, end_column=col + 1)
+            sheet.cell(3, col, 'гр.А')
+            sheet.cell(3, col + 1, 'гр. Б')
+            sheet.cell(4, col, f'Общий урок\n\nкаб. {k}')
+            sheet.merge_cells(start_row=4, start_column=col, end_row=4, end_column=col + 1)
+            for i in range(1, lessons):
+                sheet.cell(4 + i, col, f'Урок {i + 1}\n\nкаб. {k}')
+    data = io.BytesIO()
+    workbook.save(data)
+    return data.getvalue()
+
+
+def test_parse_grade_regular_day():
+    regular_rows, uday_rows = parse_grade(grade_workbook(), 10, 1)
+
+    assert uday_rows == []
+    assert len(regular_rows) == 10 * 3
+    assert [row for row in regular_rows if row['class_letter'] == '10 0'] == [
+        {'lesson_number': 0, 'lesson_info': '8:30-9:15\nОбщий урок\nкаб. 0', 'class_letter': '10 0', 'group_number': 0},
+        {'lesson_number': 1, 'lesson_info': '9:30-10:15\nУрок 2\nкаб. 0', 'class_letter': '10 0', 'group_number': 0},
+        {'lesson_number': 0, 'lesson_info': '8:30-9:15\nОбщий урок\nкаб. 0', 'class_letter': '10 0', 'group_number': 1},
+    ]
+
+
+def test_parse_grade_finds_sheet_by_name():
+    data = grade_workbook()
+
+    assert {row['class_letter'] for row in parse_grade(data, 11, 1)[0]} == {f'11 {k}' for k in range(10)}
+    assert {row['class_letter'] for row in parse_grade(data, 10, 4)[0]} == {f'10 {k}' for k in range(10)}
+
+
+def test_parse_grade_reads_file_path(tmp_path):
+    path = tmp_path / '10.09.xlsx'
+    path.write_bytes(grade_workbook())
+
+    assert parse_grade(str(path), 10, 1) == parse_grade(path.read_bytes(), 10, 1)
+
+
+@pytest.fixture
+def parse_workers(monkeypatch):
+    def set_workers(workers):
+        monkeypatch.setattr(parsing, 'PARSE_WORKERS', workers)
+    reset_parse_pool()
+    yield set_workers
+    reset_parse_pool()
+
+
+def test_parse_pool_spawns_workers(parse_workers):
+    parse_workers(2)
+    data = grade_workbook()
+    date = dt.date(2030, 9, 3)
+
+    futures = submit_schedule_parsing(data, date)
+
+    assert get_parse_pool()._mp_context.get_start_method() == 'spawn'
+    assert {grade: future.result(timeout=60) for grade, future in futures.items()} == {
+        grade: parse_grade(data, grade, date.weekday()) for grade in (10, 11)}
+
+
+def test_parsing_in_process_without_pool(parse_workers):
+    parse_workers(0)
+
+    futures = submit_schedule_parsing(b'not a workbook', dt.date(2030, 9, 3))
+
+    assert get_parse_pool() is None
+    assert all(future.done() and future.exception() for future in futures.values())
+
+
+def make_archive(files):
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+    return data.getvalue()
+
+
+def test_archive_members_in_archive_order():
+    data = make_archive([('10.09.xlsx', b'tuesday'), ('09.09.xlsx', b'monday')])
+
+    members = archive_members(data)
+
+    assert list(members.items()) == [('10.09.xlsx', b'tuesday'), ('09.09.xlsx', b'monday')]
+
+
+def test_archive_skips_service_files_and_folders():
+    data = make_archive([('schedule/', b''), ('schedule/09.09.xlsx', b'monday'),
+                         ('__MACOSX/schedule/._09.09.xlsx', b'resource fork'), ('schedule/.DS_Store', b'finder')])
+
+    assert archive_members(data) == {'09.09.xlsx': b'monday'}
+
+
+def test_archive_file_count_limit(monkeypatch):
+    monkeypatch.setattr(parsing, 'ARCHIVE_MAX_FILES', 2)
+
+    assert len(archive_members(make_archive([('1.xlsx', b''), ('2.xlsx', b''), ('.hidden', b'')]))) == 2
+    with pytest.raises(ValueError, match='больше 2 файлов'):
+        archive_members(make_archive([('1.xlsx', b''), ('2.xlsx', b''), ('3.xlsx', b'')]))
+
+
+def test_archive_file_size_limit(monkeypatch):
+    monkeypatch.setattr(parsing, 'ARCHIVE_MAX_FILE_SIZE', 1024 * 1024)
+
+    assert archive_members(make_archive([('1.xlsx', b'x' * 1024 * 1024)]))
+    with pytest.raises(ValueError, match='1.xlsx'):
+        archive_members(make_archive([('1.xlsx', b'x' * (1024 * 1024 + 1))]))
+
+
+def test_archive_duplicate_names():
+    data = make_archive([('monday/09.09.xlsx', b'first'), ('copy/09.09.xlsx', b'second')])
+
+    with pytest.raises(ValueError, match='несколько раз'):
+        archive_members(data)
+
+
+def test_archive_not_zip():
+    with pytest.raises(zipfile.BadZipFile):
+        archive_members(b'not a zip archive')
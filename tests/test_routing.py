@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from routing import CallbackRouter
+
+
+def press(data):
+    return SimpleNamespace(data=data)
+
+
+def recording(calls, label):
+    def middleware(name, handler):
+        def wrapped(callback, payload):
+            calls.append((label, name))
+            return handler(callback, payload)
+        return wrapped
+    return middleware
+
+
+@pytest.mark.parametrize('data, parsed', [
+    ('lesson=10 Μ=1', ('lesson', '10 Μ=1')),
+    ('menu', ('menu', '')),
+    ('menu=', ('menu', '')),
+    ('', ('', '')),
+    (None, ('', '')),
+])
+def test_parse(data, parsed):
+    assert CallbackRouter.parse(data) == parsed
+
+
+def test_dispatch_calls_route_with_payload():
+    router = CallbackRouter()
+
+    @router.route('class', 'group')
+    def choose(callback, payload):
+        return callback.data, payload
+
+    assert router.dispatch(press('class=10 Μ')) == ('class=10 Μ', '10 Μ')
+    assert router.dispatch(press('group=2')) == ('group=2', '2')
+
+
+def test_unknown_route_goes_through_middleware():
+    calls = []
+    router = CallbackRouter([recording(calls, 'global')])
+
+    @router.route('menu')
+    def menu(callback, payload):
+        return 'menu'
+
+    assert router.dispatch(press('missing=1')) is None
+    assert router.dispatch(press(None)) is None
+    assert calls == [('global', 'unknown'), ('global', 'unknown')]
+
+
+def test_middleware_order_and_route_name():
+    calls = []
+    router = CallbackRouter([recording(calls, 'outer'), recording(calls, 'inner')])
+
+    @router.route('day', 'week', name='schedule', middleware=(recording(calls, 'route'),))
+    def show(callback, payload):
+        calls.append(('handler', payload))
+
+    router.dispatch(press('week=5'))
+
+    assert calls == [('outer', 'schedule'), ('inner', 'schedule'), ('route', 'schedule'), ('handler', '5')]
+
+
+def test_route_returns_handler_unchanged():
+    router = CallbackRouter([recording([], 'global')])
+
+    def handler(callback, payload):
+        return payload
+
+    assert router.route('menu')(handler) is handler
+
+
+def test_duplicate_route_is_rejected():
+    router = CallbackRouter()
+    router.route('menu')(lambda callback, payload: None)
+
+    with pytest.raises(ValueError):
+        router.route('back', 'menu')(lambda callback, payload: None)
+
+
+def test_adispatch_awaits_coroutine_handlers():
+    router = CallbackRouter()
+
+    @router.route('async')
+    async def async_handler(callback, payload):
+        await asyncio.sleep(0)
+        return f'async {payload}'
+
+    @router.route('sync')
+    def sync_handler(callback, payload):
+        return f'sync {payload}'
+
+    assert asyncio.run(router.adispatch(press('async=1'))) == 'async 1'
+    assert asyncio.run(router.adispatch(press('sync=2'))) == 'sync 2'
+    assert asyncio.run(router.adispatch(press('missing'))) is None
@@ -0,0 +1,58 @@
+import asyncio
+import datetime as dt
+import schedule
+from db.models import regular_schedule
+from db.models import schedule_version
+from db.models import users
+from schedule import aget_schedule_text, bump_schedule_version, get_schedule_text, schedule_cache
+
+
+DATE = dt.date(2030, 9, 3)
+
+
+def make_user():
+    return users.objects.create(user_id=1, class_letter='10 Μ', group_number=1, u_group_number=1)
+
+
+def add_lesson(info):
+    regular_schedule.objects.create(date=DATE, class_letter='10 Μ', group_number=1, lesson_number=0,
+                                    lesson_info=info)
+
+
+def test_empty_schedule_is_not_cached():
+    user = make_user()
+
+    assert get_schedule_text(user, DATE) == ''
+    assert not schedule_cache
+    add_lesson('алгебра')
+    assert get_schedule_text(user, DATE) == 'алгебра'
+
+
+def test_bump_schedule_version_counts_uploads():
+    assert bump_schedule_version(DATE) == 1
+    assert bump_schedule_version(DATE) == 2
+    assert schedule_version.objects.get(date=DATE).version == 2
+
+
+def test_version_from_other_process_invalidates_cache(monkeypatch):
+    user = make_user()
+    add_lesson('алгебра')
+    assert get_schedule_text(user, DATE) == 'алгебра'
+
+    # загрузка в другом процессе меняет уроки и версию, не трогая кэш этого процесса
+    regular_schedule.objects.filter(date=DATE).update(lesson_info='физика')
+    bump_schedule_version(DATE)
+    assert get_schedule_text(user, DATE) == 'алгебра'
+
+    monkeypatch.setattr(schedule, 'VERSION_CHECK_INTERVAL', 0)
+    assert get_schedule_text(user, DATE) == 'физика'
+
+
+def test_async_text_uses_version(monkeypatch):
+    monkeypatch.setattr(schedule, 'VERSION_CHECK_INTERVAL', 0)
+    user = make_user()
+    add_lesson('алгебра')
+    bump_schedule_version(DATE)
+
+    assert asyncio.run(aget_schedule_text(user, DATE)) == 'алгебра'
+    assert list(schedule_cache) == [('10 Μ', 1, 1, DATE, 1)]
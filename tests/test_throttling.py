@@ -0,0 +1,129 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import throttling
+from throttling import GlobalBucket, RateLimiter, throttled
+
+
+class Clock:
+    """
+    Подменяемое время time.monotonic, которое сдвигает только тест.
+    """
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttling, 'time', clock)
+    return clock
+
+
+def message(user_id):
+    return SimpleNamespace(from_user=SimpleNamespace(id=user_id))
+
+
+def test_burst_then_refill(clock):
+    limiter = RateLimiter(user_rate=1, user_burst=3)
+
+    assert [limiter.allow(1) for _ in range(4)] == [True, True, True, False]
+    clock.now += 0.5
+    assert not limiter.allow(1)
+    clock.now += 0.5
+    assert limiter.allow(1)
+    assert not limiter.allow(1)
+    clock.now += 100
+    assert [limiter.allow(1) for _ in range(4)] == [True, True, True, False]
+    assert limiter.stats() == {'allowed': 7, 'dropped_user': 4, 'dropped_global': 0, 'tracked_users': 1}
+
+
+def test_users_have_separate_buckets(clock):
+    limiter = RateLimiter(user_rate=0.2, user_burst=1)
+
+    assert limiter.allow(1)
+    assert not limiter.allow(1)
+    assert limiter.allow(2)
+
+
+def test_global_bucket_is_shared(clock):
+    bucket = GlobalBucket(rate=1, burst=2)
+    commands, callbacks = RateLimiter(10, 10, bucket), RateLimiter(10, 10, bucket)
+
+    assert commands.allow(1)
+    assert callbacks.allow(2)
+    assert not callbacks.allow(3)
+    assert callbacks.stats()['dropped_global'] == 1
+    clock.now += 1
+    assert commands.allow(4)
+
+
+def test_dropped_by_global_bucket_does_not_spend_user_token(clock):
+    limiter = RateLimiter(user_rate=1, user_burst=1, global_bucket=GlobalBucket(rate=1, burst=1))
+
+    assert limiter.allow(1)
+    clock.now += 1
+    assert limiter.allow(2)
+    assert not limiter.allow(1)
+    assert limiter.stats()['dropped_global'] == 1
+    clock.now += 1
+    assert limiter.allow(1)
+
+
+def test_sweep_forgets_full_buckets(clock):
+    limiter = RateLimiter(user_rate=0.1, user_burst=2)
+    limiter.allow(1)
+    clock.now += throttling.SWEEP_INTERVAL - 1
+    limiter.allow(2)
+
+    clock.now += 1
+    limiter.allow(3)
+
+    assert set(limiter.buckets) == {2, 3}
+
+
+def test_throttled_calls_on_drop(clock, monkeypatch):
+    monkeypatch.delenv('ADMIN_ID', raising=False)
+    dropped = []
+
+    @throttled(RateLimiter(user_rate=1, user_burst=1), on_drop=dropped.append)
+    def handler(update):
+        return 'handled'
+
+    first, second = message(1), message(1)
+    assert handler(first) == 'handled'
+    assert handler(second) is None
+    assert dropped == [second]
+
+
+def test_throttled_exempts_admin(clock, monkeypatch):
+    monkeypatch.setenv('ADMIN_ID', '7')
+    limiter = RateLimiter(user_rate=1, user_burst=1)
+
+    @throttled(limiter)
+    def handler(update):
+        return 'handled'
+
+    assert [handler(message(7)) for _ in range(5)] == ['handled'] * 5
+    assert limiter.stats()['allowed'] == 0
+
+
+def test_throttled_async_handler(clock, monkeypatch):
+    monkeypatch.delenv('ADMIN_ID', raising=False)
+    dropped = []
+
+    async def on_drop(update):
+        dropped.append(update)
+
+    @throttled(RateLimiter(user_rate=1, user_burst=1), on_drop=on_drop)
+    async def handler(update):
+        return 'handled'
+
+    async def press_twice():
+        return await handler(message(1)), await handler(message(1))
+
+    assert asyncio.run(press_twice()) == ('handled', None)
+    assert len(dropped) == 1
@@ -0,0 +1,219 @@
+import os
+import time
+import inspect
+import threading
+from functools import wraps
+
+
+SWEEP_INTERVAL = 60
+
+
+class GlobalBucket:
+    """
+    Общая корзина token bucket, ограничивающая суммарную частоту запросов всех пользователей.
+
+    Аргументы:
+        rate (float): Скорость пополнения корзины, запросов в секунду.
+        burst (float): Ёмкость корзины.
+    """
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> bool:
+        """
+        Функция, забирающая токен из корзины без ожидания.
+
+        Возвращает:
+            bool: True если токен был в корзине, иначе False.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class RateLimiter:
+    """
+    Ограничитель частоты запросов пользователей по алгоритму token bucket.
+
+    Для каждого активного пользователя хранится только пара (токены, время обновления). Корзина, простоявшая
+    достаточно долго, чтобы заполниться, ничем не отличается от новой, поэтому такие записи периодически удаляются.
+    Помимо пользовательских лимитов ограничитель может соблюдать общий лимит на все запросы.
+
+    Аргументы:
+        user_rate (float): Скорость пополнения корзины пользователя, запросов в секунду.
+        user_burst (float): Ёмкость корзины пользователя.
+        global_bucket (GlobalBucket): Общая корзина, которую могут делить несколько ограничителей,
+            None чтобы не ограничивать общую частоту.
+    """
+    def __init__(self, user_rate: float, user_burst: float, global_bucket: GlobalBucket = None) -> None:
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.global_bucket = global_bucket
+        self.buckets = {}
+        self.swept = time.monotonic()
+        self.counters = {'allowed': 0, 'dropped_user': 0, 'dropped_global': 0}
+        self.lock = threading.Lock()
+
+    def allow(self, user_id: int) -> bool:
+        """
+        Функция проверки, можно ли обработать запрос пользователя.
+
+        Аргументы:
+            user_id (int): Идентификатор пользователя.
+
+        Возвращает:
+            bool: True если запрос укладывается в лимиты, иначе False.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now - self.swept >= SWEEP_INTERVAL:
+                self.sweep(now)
+            tokens, updated = self.buckets.get(user_id, (self.user_burst, now))
+            tokens = min(self.user_burst, tokens + (now - updated) * self.user_rate)
+            if tokens < 1:
+                self.buckets[user_id] = (tokens, now)
+                self.counters['dropped_user'] += 1
+                return False
+            if self.global_bucket and not self.global_bucket.take():
+                self.buckets[user_id] = (tokens, now)
+                self.counters['dropped_global'] += 1
+                return False
+            self.buckets[user_id] = (tokens - 1, now)
+            self.counters['allowed'] += 1
+            return True
+
+    def sweep(self, now: float) -> None:
+        """
+        Функция удаления корзин пользователей, успевших заполниться.
+
+        Аргументы:
+            now (float): Текущее время time.monotonic().
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        self.buckets = {user_id: (tokens, updated) for user_id, (tokens, updated) in self.buckets.items()
+                        if tokens + (now - updated) * self.user_rate < self.user_burst}
+        self.swept = now
+
+    def stats(self) -> dict:
+        """
+        Функция, возвращающая счётчики ограничителя.
+
+        Возвращает:
+            dict: Количество пропущенных и отброшенных запросов и число отслеживаемых пользователей.
+        """
+        with self.lock:
+            return {**self.counters, 'tracked_users': len(self.buckets)}
+
+
+def env_float(name: str, default: float) -> float:
+    """
+    Функция чтения числового параметра из переменных окружения.
+
+    Аргументы:
+        name (str): Имя переменной окружения.
+        default (float): Значение по умолчанию.
+
+    Возвращает:
+        float: Значение параметра.
+    """
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# команды: как и раньше, не чаще одной в 5 секунд;
+# нажатия кнопок: всплеск до 8 нажатий, чтобы пройти регистрацию целиком, затем одно в секунду.
+# Общий лимит включается только переменной THROTTLE_GLOBAL_RATE: утренний наплыв запросов расписания не должен
+# отбрасываться, а ответы бота и так ограничены лимитами Bot API
+GLOBAL_RATE = env_float('THROTTLE_GLOBAL_RATE', 0)
+global_bucket = GlobalBucket(GLOBAL_RATE, env_float('THROTTLE_GLOBAL_BURST', 2 * GLOBAL_RATE)) if GLOBAL_RATE else None
+commands_limiter = RateLimiter(env_float('THROTTLE_COMMAND_RATE', 0.2), env_float('THROTTLE_COMMAND_BURST', 1),
+                               global_bucket)
+callbacks_limiter = RateLimiter(env_float('THROTTLE_CALLBACK_RATE', 1), env_float('THROTTLE_CALLBACK_BURST', 8),
+                                global_bucket)
+
+
+def is_exempt(user_id: int) -> bool:
+    """
+    Функция проверки, освобождён ли пользователь от ограничений частоты запросов.
+
+    Аргументы:
+        user_id (int): Идентификатор пользователя.
+
+    Возвращает:
+        bool: True для админа бота, иначе False.
+    """
+    return str(user_id) == os.getenv('ADMIN_ID')
+
+
+def throttled(limiter: RateLimiter, on_drop: callable = None) -> callable:
+    """
+    Декоратор, ограничивающий частоту запросов пользователя к обработчику.
+
+    Если запрос пользователя не укладывается в лимиты ограничителя, обработчик не вызывается, а вызывается on_drop,
+    например чтобы ответить на коллбэк и не оставлять кнопку в состоянии загрузки. Запросы админа не ограничиваются.
+
+    Аргументы:
+        limiter (RateLimiter): Ограничитель частоты запросов.
+        on_drop (callable): Функция, принимающая отброшенное сообщение или коллбэк. Для асинхронных обработчиков -
+            корутинная функция.
+
+    Возвращает:
+        (callable): Декоратор обработчика, принимающего сообщение или коллбэк пользователя.
+    """
+    def decorator(func: callable) -> callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapped_async(update, *args, **kwargs):
+                if is_exempt(update.from_user.id) or limiter.allow(update.from_user.id):
+                    return await func(update, *args, **kwargs)
+                if on_drop:
+                    await on_drop(update)
+            return wrapped_async
+
+        @wraps(func)
+        def wrapped(update, *args, **kwargs):
+            if is_exempt(update.from_user.id) or limiter.allow(update.from_user.id):
+                return func(update, *args, **kwargs)
+            if on_drop:
+                on_drop(update)
+        return wrapped
+    return decorator
+
+
+def throttling_stats() -> dict:
+    """
+    Функция, возвращающая счётчики всех ограничителей.
+
+    Возвращает:
+        dict: Счётчики ограничителей команд и нажатий кнопок.
+    """
+    return {'commands': commands_limiter.stats(), 'callbacks': callbacks_limiter.stats()}
+
+
+def throttling_metrics() -> list:
+    """
+    Функция вывода счётчиков ограничителей в текстовом формате Prometheus для сервера метрик.
+
+    Возвращает:
+        list: Строки метрик.
+    """
+    lines = ['# HELP bot_throttled_requests_total Запросы, прошедшие через ограничители частоты',
+             '# TYPE bot_throttled_requests_total counter']
+    tracked = ['# HELP bot_throttled_users Пользователи, отслеживаемые ограничителями',
+               '# TYPE bot_throttled_users gauge']
+    for name, counters in throttling_stats().items():
+        for result in ('allowed', 'dropped_user', 'dropped_global'):
+            lines.append(f'bot_throttled_requests_total{{limiter="{name}",result="{result}"}} {counters[result]}')
+        tracked.append(f'bot_throttled_users{{limiter="{name}"}} {counters["tracked_users"]}')
+    return lines + tracked
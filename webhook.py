@@ -0,0 +1,220 @@
+import json
+import queue
+import logging
+import argparse
+import threading
+import urllib.error
+import urllib.request
+import telebot
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+WEBHOOK_WORKERS = 8
+WEBHOOK_QUEUE_SIZE = 1024
+# очередь соединений сервера: Telegram открывает до 40 параллельных соединений, а по умолчанию очередь вмещает 5
+WEBHOOK_BACKLOG = 128
+
+
+def update_chat_id(update: telebot.types.Update) -> int:
+    """
+    Функция, определяющая чат, к которому относится обновление.
+
+    Аргументы:
+        update (telebot.types.Update): Обновление от Telegram.
+
+    Возвращает:
+        int: Идентификатор чата или update_id, если обновление не относится к чату.
+    """
+    if update.message:
+        return update.message.chat.id
+    if update.callback_query:
+        return update.callback_query.from_user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """
+    Диспетчер обновлений, распределяющий их по пулу обработчиков.
+
+    Обновления одного чата всегда попадают в одну очередь, поэтому обрабатываются по порядку, что важно для
+    пошаговых обработчиков. Очереди ограничены, и при переполнении обновление не принимается.
+
+    Аргументы:
+        bot (telebot.TeleBot): Бот, обрабатывающий обновления.
+        workers (int): Количество обработчиков.
+        queue_size (int): Суммарная ёмкость очередей обработчиков.
+    """
+    def __init__(self, bot: telebot.TeleBot, workers: int = WEBHOOK_WORKERS,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE) -> None:
+        self.bot = bot
+        self.queues = [queue.Queue(maxsize=max(1, queue_size // workers)) for _ in range(workers)]
+        self.threads = [threading.Thread(target=self.work, args=(updates,), daemon=True, name=f'webhook-worker-{i}')
+                        for i, updates in enumerate(self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, update: telebot.types.Update) -> bool:
+        """
+        Функция постановки обновления в очередь обработчика.
+
+        Аргументы:
+            update (telebot.types.Update): Обновление от Telegram.
+
+        Возвращает:
+            bool: False если очередь обработчика переполнена.
+        """
+        try:
+            self.queues[update_chat_id(update) % len(self.queues)].put_nowait(update)
+            return True
+        except queue.Full:
+            return False
+
+    def work(self, updates: queue.Queue) -> None:
+        """
+        Функция обработчика, последовательно обрабатывающего обновления своей очереди.
+
+        Аргументы:
+            updates (queue.Queue): Очередь обработчика.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        while True:
+            update = updates.get()
+            if update is None:
+                return
+            try:
+                self.bot.process_new_updates([update])
+            except Exception as ex:
+                logging.error(ex)
+
+    def stop(self) -> None:
+        """
+        Функция остановки обработчиков: каждый обработчик дообрабатывает свою очередь и завершается.
+
+        Возвращает:
+            None: Функция ничего не возвращает.
+        """
+        for updates in self.queues:
+            updates.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class WebhookServer(ThreadingHTTPServer):
+    request_queue_size = WEBHOOK_BACKLOG
+    daemon_threads = True
+
+
+def make_request_handler(dispatcher: UpdateDispatcher, secret_token: str = None) -> type:
+    """
+    Функция, создающая обработчик http-запросов вебхука.
+
+    Аргументы:
+        dispatcher (UpdateDispatcher): Диспетчер обновлений.
+        secret_token (str): Секрет, который Telegram передаёт в заголовке X-Telegram-Bot-Api-Secret-Token.
+
+    Возвращает:
+        type: Класс обработчика запросов для http.server.
+    """
+    class WebhookRequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:
+            if secret_token and self.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+                self.send_response(403)
+                self.end_headers()
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                update = telebot.types.Update.de_json(body.decode('utf-8'))
+            except (ValueError, KeyError, TypeError):
+                self.send_response(400)
+                self.end_headers()
+                return
+            # при переполнении очереди отвечаем 503, и Telegram повторит доставку позже
+            if dispatcher.submit(update):
+                self.send_response(200)
+            else:
+                self.send_response(503)
+                self.send_header('Retry-After', '1')
+            self.end_headers()
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return WebhookRequestHandler
+
+
+def serve_webhook(bot: telebot.TeleBot, host: str, port: int, workers: int = WEBHOOK_WORKERS,
+                  queue_size: int = WEBHOOK_QUEUE_SIZE, url: str = None, secret_token: str = None) -> None:
+    """
+    Функция запуска бота в режиме вебхука.
+
+    Функция поднимает локальный http-сервер, принимающий обновления, и пул обработчиков. Если передан url,
+    вебхук регистрируется в Telegram, иначе сервер можно наполнять обновлениями локально функцией replay_updates.
+
+    Аргументы:
+        bot (telebot.TeleBot): Бот, обрабатывающий обновления.
+        host (str): Адрес, на котором слушает сервер.
+        port (int): Порт сервера.
+        workers (int): Количество обработчиков.
+        queue_size (int): Суммарная ёмкость очередей обработчиков.
+        url (str): Публичный адрес вебхука.
+        secret_token (str): Секрет для проверки запросов от Telegram.
+
+    Возвращает:
+        None: Функция ничего не возвращает.
+    """
+    # обновления обрабатывает собственный пул, а не пул потоков telebot
+    bot.threaded = False
+    dispatcher = UpdateDispatcher(bot, workers, queue_size)
+    # при перезапуске после ошибки создаётся новый диспетчер, поэтому обработчики старого останавливаются
+    try:
+        if url:
+            bot.remove_webhook()
+            bot.set_webhook(url=url, secret_token=secret_token)
+        server = WebhookServer((host, port), make_request_handler(dispatcher, secret_token))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    finally:
+        dispatcher.stop()
+
+
+def replay_updates(path: str, url: str, secret_token: str = None) -> dict:
+    """
+    Функция, отправляющая записанные обновления на локальный вебхук.
+
+    Аргументы:
+        path (str): Файл с обновлениями, по одному json-объекту на строку.
+        url (str): Адрес вебхука.
+        secret_token (str): Секрет, передаваемый в заголовке X-Telegram-Bot-Api-Secret-Token.
+
+    Возвращает:
+        dict: Количество обновлений по http-статусам ответа.
+    """
+    statuses = {}
+    headers = {'Content-Type': 'application/json'}
+    if secret_token:
+        headers['X-Telegram-Bot-Api-Secret-Token'] = secret_token
+    with open(path, encoding='utf-8') as updates:
+        for line in updates:
+            if not line.strip():
+                continue
+            request = urllib.request.Request(url, data=line.strip().encode('utf-8'), headers=headers)
+            try:
+                with urllib.request.urlopen(request) as response:
+                    status = response.status
+            except urllib.error.HTTPError as ex:
+                status = ex.code
+            statuses[status] = statuses.get(status, 0) + 1
+    return statuses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Отправка записанных обновлений на локальный вебхук')
+    parser.add_argument('path', help='файл с обновлениями, по одному json-объекту на строку')
+    parser.add_argument('--url', default='http://127.0.0.1:8443/')
+    parser.add_argument('--secret-token', default=None)
+    args = parser.parse_args()
+    print(json.dumps(replay_updates(args.path, args.url, args.secret_token)))